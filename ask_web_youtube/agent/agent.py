@@ -3,88 +3,1022 @@
 This module defines an Agent class that utilizes various services to perform tasks.
 """
 
-from jinja2 import Environment, FileSystemLoader
-from typing import Dict
+import asyncio
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
 
-from agent.services.serper_search_handler import SerperSearchHandler
-from agent.services.youtube_handler import YouTubeHandler
-from agent.services.llm_handler.groq_handler import GroqHandler
+from agent.context_compactor import ContextCompactor
+from agent.services.local_index import WEB, YOUTUBE, LocalIndex, get_local_index
+from agent.services.serper_search_handler import AsyncSerperSearchHandler
+from agent.services.transcript import Transcript
+from agent.services.web_result import parse_fields, render_web_results, to_web_results
+from agent.services.llm_handler.groq_handler import AsyncGroqHandler
+from utils.cache import normalize_query
+from utils.deadline import Deadline, use_deadline
+from utils.event_loop import iterate_async, run_coroutine
 from utils.log_config import setup_logger
+from utils.metrics import Trace, activate_trace, get_registry, metrics_enabled, span
+from utils.rate_limit import BATCH, use_priority
+from utils.resilience import get_policy
+from utils.single_flight import AsyncSingleFlight
 
+if TYPE_CHECKING:
+    from agent.services.youtube_handler import AsyncYouTubeHandler
 
-class Agent:
+# The upstream each retrieval source depends on, to consult its circuit breaker.
+SOURCE_UPSTREAMS = {"web_search": "serper", "youtube_search": "youtube"}
+
+# The local index source that can stand in for each retrieval source.
+SOURCE_INDEXES = {"web_search": WEB, "youtube_search": YOUTUBE}
+
+# How a request's deadline is split: retrieval gets this share of the budget and
+# the LLM the rest. Handlers aim to finish within HANDLER_BUDGET_SHARE of the
+# retrieval slice, so they can return partial results before being cut off.
+RETRIEVAL_BUDGET_SHARE = 0.6
+HANDLER_BUDGET_SHARE = 0.9
+
+# Prompts being built, shared by every agent: identical requests that arrive
+# while one is retrieving wait for its prompt instead of retrieving again.
+_prompt_flights = AsyncSingleFlight("agent.prompt")
+
+
+def _to_json(value: Any) -> Any:
+    """Serialize values json.dumps cannot handle, such as transcripts."""
+    if isinstance(value, Transcript):
+        return value.to_prompt()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _web_from_passages(passages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape indexed web passages like a Serper response."""
+    return {
+        "organic": [
+            {
+                "title": passage["title"],
+                "link": passage["link"],
+                "snippet": passage["text"],
+            }
+            for passage in passages
+        ]
+    }
+
+
+def _videos_from_passages(
+    passages: List[Dict[str, Any]], window_seconds: float
+) -> List[Dict[str, Any]]:
+    """Shape indexed transcript chunks like the videos of a YouTube search."""
+    chunks_by_video: Dict[str, List[Dict[str, Any]]] = {}
+    titles = {}
+    for passage in passages:
+        chunks_by_video.setdefault(passage["doc_id"], []).append(passage)
+        titles.setdefault(passage["doc_id"], passage["title"])
+    videos = []
+    for video_id, chunks in chunks_by_video.items():
+        # Each chunk becomes one segment spanning its window, so the compactor
+        # chunks the transcript back into the same passages.
+        transcript = Transcript.from_segments(
+            {"text": chunk["text"], "start": chunk["start"], "duration": window_seconds}
+            for chunk in sorted(chunks, key=lambda chunk: chunk["start"])
+        )
+        videos.append(
+            {
+                "video_id": video_id,
+                "title": titles[video_id],
+                "transcript": transcript,
+                "transcripts_available": True,
+                "duration": transcript.duration,
+            }
+        )
+    return videos
+
+
+@lru_cache(maxsize=None)
+def get_template_environment(template_dir: str) -> Environment:
     """
-    An Agent class that integrates multiple services to perform complex tasks.
+    Return the process-wide Jinja2 environment for a template directory.
 
-    This class acts as a coordinator, utilizing the SerperSearchHandler,
-    YouTubeHandler, and GroqHandler to perform searches, retrieve YouTube data,
-    and interact with a language model.
+    Compiled templates are kept in the environment's cache, so each template is
+    parsed once per process. Two environment variables tune this:
+
+        AGENT_TEMPLATE_CACHE_DIR   Also persist compiled bytecode in this
+                                   directory, so restarts skip compilation.
+        AGENT_DEV_MODE             Re-check template files for changes on every
+                                   render ("1", "true" or "yes").
+
+    Args:
+        template_dir (str): The directory holding the templates.
+
+    Returns:
+        Environment: The shared environment.
+    """
+    cache_dir = os.getenv("AGENT_TEMPLATE_CACHE_DIR")
+    bytecode_cache = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    dev_mode = os.getenv("AGENT_DEV_MODE", "").lower() in ("1", "true", "yes")
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        bytecode_cache=bytecode_cache,
+        auto_reload=dev_mode,
+    )
+
+
+class AsyncAgent:
+    """
+    An asyncio-native Agent that runs the retrieval services concurrently.
+
+    Web search and YouTube retrieval are independent of each other, so they are
+    started together and awaited as a group. The wall time of a request is
+    therefore max(web, youtube) + LLM instead of their sum.
+
+    A request can be given a deadline. Retrieval then gets a share of it and the
+    LLM the remainder; sources that miss their slice are cancelled and the
+    answer is built from the context that arrived in time.
+
+    With a local index, every web result and transcript fetched is indexed. In
+    local-first mode a source is answered from the index when its passages are
+    fresh and cover the question, and only fetched otherwise.
     """
 
     def __init__(
-        self, template_path="agent/templates/agent_input_template.jinja2"
+        self,
+        template_path="agent/templates/agent_input_template.jinja2",
+        context_token_budget: Optional[int] = 4000,
+        default_deadline: Optional[float] = None,
+        local_index: Optional[LocalIndex] = None,
+        local_first: Optional[bool] = None,
+        web_result_fields: Optional[Sequence[str]] = None,
     ) -> None:
-        """Initialize the Agent with its service handlers."""
+        """
+        Initialize the AsyncAgent with its asynchronous service handlers.
+
+        Args:
+            template_path (str): The file path to the Jinja2 prompt template.
+            context_token_budget (Optional[int]): The estimated tokens of retrieved
+                context kept in the prompt. None disables compaction.
+            default_deadline (Optional[float]): Seconds a request may take when
+                the caller gives no deadline. Defaults to the environment
+                variable `AGENT_DEADLINE_SECONDS`; unset means no limit.
+            local_index (Optional[LocalIndex]): The index of fetched passages.
+                Defaults to the process-wide index if the environment variable
+                `LOCAL_INDEX_PATH` is set; otherwise nothing is indexed.
+            local_first (Optional[bool]): Whether requests consult the local
+                index before the upstreams by default. Defaults to the
+                environment variable `AGENT_LOCAL_FIRST` ("1", "true" or "yes").
+            web_result_fields (Optional[Sequence[str]]): The fields of each web
+                result written into the prompt. Defaults to the comma-separated
+                environment variable `AGENT_WEB_RESULT_FIELDS`, or all of title,
+                link, snippet, date and position.
+        """
         self.template_path = template_path
-        self.serper_handler = SerperSearchHandler()
-        self.youtube_handler = YouTubeHandler()
-        self.llm_handler = GroqHandler()
+        if default_deadline is None and os.getenv("AGENT_DEADLINE_SECONDS"):
+            default_deadline = float(os.getenv("AGENT_DEADLINE_SECONDS"))
+        self.default_deadline = default_deadline
+        if local_first is None:
+            local_first = os.getenv("AGENT_LOCAL_FIRST", "").lower() in (
+                "1",
+                "true",
+                "yes",
+            )
+        self.local_first = local_first
+        self._local_index = local_index
+        self.web_result_fields = parse_fields(
+            web_result_fields
+            if web_result_fields is not None
+            else os.getenv("AGENT_WEB_RESULT_FIELDS")
+        )
+        self.compactor = (
+            ContextCompactor(token_budget=context_token_budget)
+            if context_token_budget is not None
+            else None
+        )
+        # Handlers are built on first use, so constructing the agent is cheap and
+        # web-only requests never import the YouTube client libraries.
+        self._serper_handler: Optional[AsyncSerperSearchHandler] = None
+        self._youtube_handler: Optional["AsyncYouTubeHandler"] = None
+        self._llm_handler: Optional[AsyncGroqHandler] = None
         self.logger = setup_logger(__name__)
         self.logger.info("Agent initialized with template path: %s", self.template_path)
 
+    @property
+    def serper_handler(self) -> AsyncSerperSearchHandler:
+        """The web search handler, built on first use."""
+        if self._serper_handler is None:
+            self._serper_handler = AsyncSerperSearchHandler()
+        return self._serper_handler
+
+    @serper_handler.setter
+    def serper_handler(self, handler: AsyncSerperSearchHandler) -> None:
+        """Replace the web search handler."""
+        self._serper_handler = handler
+
+    @property
+    def youtube_handler(self) -> "AsyncYouTubeHandler":
+        """The YouTube handler, built (and its module imported) on first use."""
+        if self._youtube_handler is None:
+            from agent.services.youtube_handler import AsyncYouTubeHandler
+
+            self._youtube_handler = AsyncYouTubeHandler()
+        return self._youtube_handler
+
+    @youtube_handler.setter
+    def youtube_handler(self, handler: "AsyncYouTubeHandler") -> None:
+        """Replace the YouTube handler."""
+        self._youtube_handler = handler
+
+    @property
+    def local_index(self) -> Optional[LocalIndex]:
+        """The index of fetched passages, or None if indexing is off."""
+        if self._local_index is None and os.getenv("LOCAL_INDEX_PATH"):
+            self._local_index = get_local_index()
+        return self._local_index
+
+    @local_index.setter
+    def local_index(self, index: Optional[LocalIndex]) -> None:
+        """Replace the local index."""
+        self._local_index = index
+
+    @property
+    def llm_handler(self) -> AsyncGroqHandler:
+        """The language model handler, built on first use."""
+        if self._llm_handler is None:
+            self._llm_handler = AsyncGroqHandler()
+        return self._llm_handler
+
+    @llm_handler.setter
+    def llm_handler(self, handler: AsyncGroqHandler) -> None:
+        """Replace the language model handler."""
+        self._llm_handler = handler
+
+    async def warm_up(self) -> None:
+        """Resolve slow, cacheable dependencies (such as the LLM model) up front."""
+        await self.llm_handler.warm_up()
+
+    def _get_template(self) -> Template:
+        """Return the compiled prompt template from the shared environment."""
+        # Extract the directory and template file name from self.template_path
+        template_dir, template_file = self.template_path.rsplit("/", 1)
+        return get_template_environment(template_dir).get_template(template_file)
+
     def generate_from_template(self, data: dict) -> str:
         """
         Generate content from a Jinja2 template.
 
         Args:
-            template_path (str): The file path to the Jinja2 template.
             data (dict): The data to render the template with.
 
         Returns:
             str: The rendered template content.
         """
-        self.logger.info("Generating content from template with data: %s", data)
-        # Extract the directory and template file name from self.template_path
-        template_dir, template_file = self.template_path.rsplit("/", 1)
+        self.logger.debug("Rendering template with fields: %s", ", ".join(data))
+        return "".join(self._get_template().generate({"data": data}))
+
+    def render_template_into(self, data: dict, buffer: TextIO) -> None:
+        """
+        Render the Jinja2 template straight into a text buffer.
+
+        Args:
+            data (dict): The data to render the template with.
+            buffer (TextIO): The buffer (e.g. io.StringIO) to write to.
+        """
+        self.logger.debug("Rendering template with fields: %s", ", ".join(data))
+        for chunk in self._get_template().generate({"data": data}):
+            buffer.write(chunk)
+
+    async def _search_web(self, input_text: str) -> dict:
+        """Run the web search."""
+        with span("agent.web_search"):
+            return await self.serper_handler.search(input_text)
+
+    async def _search_youtube(self, input_text: str) -> list:
+        """Run the YouTube search, including transcripts."""
+        with span("agent.youtube_search"):
+            return await self.youtube_handler.fetch_videos(input_text)
 
-        # Set up the Jinja2 environment
-        env = Environment(loader=FileSystemLoader(template_dir))
+    def _start_deadline(
+        self, deadline: Optional[Union[float, Deadline]]
+    ) -> Optional[Deadline]:
+        """Turn a request's time budget (or the default one) into a Deadline."""
+        if deadline is None:
+            deadline = self.default_deadline
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return Deadline.after(deadline)
 
-        # Load the template
-        template = env.get_template(template_file)
+    @property
+    def _window_seconds(self) -> float:
+        """The length of the transcript chunks that are indexed and prompted."""
+        return self.compactor.window_seconds if self.compactor is not None else 60.0
 
-        # Render the template with the provided data
-        response = template.render({"data": data})
-        return response
+    def _search_local(self, input_text: str, sources: List[str]) -> Dict[str, Any]:
+        """Answer the sources the local index covers well enough; blocking."""
+        results: Dict[str, Any] = {}
+        for source in sources:
+            passages = self.local_index.lookup(input_text, SOURCE_INDEXES[source])
+            if metrics_enabled():
+                get_registry().increment(
+                    "agent_local_index_lookups_total",
+                    source=source,
+                    outcome="miss" if passages is None else "hit",
+                )
+            if passages is None:
+                continue
+            if source == "web_search":
+                results[source] = _web_from_passages(passages)
+            else:
+                results[source] = _videos_from_passages(
+                    passages, self._window_seconds
+                )
+        return results
+
+    def _index_results(self, results: Dict[str, Any]) -> None:
+        """Add freshly fetched web results and transcripts to the local index."""
+        try:
+            if results.get("web_search"):
+                self.local_index.add_web_results(results["web_search"])
+            for video in results.get("youtube_search") or []:
+                if video.get("transcript") is not None:
+                    self.local_index.add_transcript(
+                        video["video_id"],
+                        video["title"],
+                        video["transcript"],
+                        self._window_seconds,
+                    )
+        except Exception as e:
+            # The index only saves future calls; never fail a request over it.
+            self.logger.warning("Could not update the local index: %s", e)
+
+    async def _retrieve(
+        self,
+        input_text: str,
+        enable_web: bool,
+        enable_youtube: bool,
+        deadline: Optional[Deadline] = None,
+        local_first: bool = False,
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Fetch the enabled retrieval sources concurrently.
+
+        Sources whose upstream circuit is open are skipped, a source that fails
+        is dropped, and a source still running when the retrieval slice of the
+        deadline runs out is cancelled. The answer is built from the rest.
+        In local-first mode, sources the local index covers are not fetched.
+
+        Args:
+            input_text (str): The user's question.
+            enable_web (bool): Whether to include web search results.
+            enable_youtube (bool): Whether to include YouTube transcripts.
+            deadline (Optional[Deadline]): The deadline of the whole request.
+            local_first (bool): Whether to consult the local index first.
+
+        Returns:
+            Tuple[Dict[str, Any], List[str]]: The raw results per source that
+            delivered, and the names of the sources that were dropped.
+        """
+        searches = {}
+        if enable_web:
+            searches["web_search"] = self._search_web
+        if enable_youtube:
+            searches["youtube_search"] = self._search_youtube
+
+        local: Dict[str, Any] = {}
+        if local_first and searches and self.local_index is not None:
+            with span("agent.local_index") as stage:
+                local = await asyncio.to_thread(
+                    self._search_local, input_text, list(searches)
+                )
+                stage.set(sources=len(local))
+            for source in local:
+                del searches[source]
+
+        retrieval = deadline.portion(RETRIEVAL_BUDGET_SHARE) if deadline else None
+        dropped: List[str] = []
+        tasks: Dict[str, asyncio.Task] = {}
+        # Tasks copy the context they are created in, so the handlers see the
+        # slightly shorter handler deadline.
+        handler_deadline = retrieval and retrieval.portion(HANDLER_BUDGET_SHARE)
+        with use_deadline(handler_deadline):
+            for source, search in searches.items():
+                upstream = SOURCE_UPSTREAMS[source]
+                if get_policy(upstream).breaker.is_open:
+                    reason = f"the {upstream} circuit is open"
+                    self._record_dropped(dropped, source, reason)
+                    continue
+                tasks[source] = asyncio.ensure_future(search(input_text))
+
+        if tasks:
+            await asyncio.wait(
+                tasks.values(), timeout=retrieval.remaining() if retrieval else None
+            )
+
+        results = {}
+        for source, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                self._record_dropped(dropped, source, "it missed the deadline")
+            elif task.cancelled():
+                raise asyncio.CancelledError()
+            elif task.exception() is not None:
+                error = task.exception()
+                reason = f"{type(error).__name__}: {error}"
+                self._record_dropped(dropped, source, reason)
+            else:
+                results[source] = task.result()
+        if results and self.local_index is not None:
+            await asyncio.to_thread(self._index_results, results)
+        return {**local, **results}, dropped
+
+    def _record_dropped(self, dropped: List[str], source: str, reason: str) -> None:
+        """Log, count and remember a retrieval source left out of a request."""
+        self.logger.warning("Answering without %s: %s", source, reason)
+        dropped.append(source)
+        if metrics_enabled():
+            get_registry().increment("agent_degraded_sources_total", source=source)
+
+    async def _build_prompt(
+        self,
+        input_text: str,
+        enable_web: bool,
+        enable_youtube: bool,
+        deadline: Optional[Deadline] = None,
+        local_first: bool = False,
+    ) -> Tuple[str, List[str]]:
+        """
+        Fetch the enabled retrieval sources concurrently and render the prompt.
+
+        Args:
+            input_text (str): The user's question.
+            enable_web (bool): Whether to include web search results.
+            enable_youtube (bool): Whether to include YouTube transcripts.
+            deadline (Optional[Deadline]): The deadline of the whole request.
+            local_first (bool): Whether to consult the local index first.
+
+        Returns:
+            Tuple[str, List[str]]: The rendered prompt and the dropped sources.
+        """
+        data = {"question": input_text}
+        results, dropped = await self._retrieve(
+            input_text, enable_web, enable_youtube, deadline, local_first
+        )
+
+        if self.compactor is not None:
+            # Keep only the passages most relevant to the question, within the
+            # token budget, instead of inlining whole responses and transcripts.
+            with span("agent.compaction"):
+                web, youtube = self.compactor.compact(
+                    input_text,
+                    web_results=results.get("web_search"),
+                    videos=results.get("youtube_search"),
+                )
+            if "web_search" in results:
+                results["web_search"] = web
+            if "youtube_search" in results:
+                results["youtube_search"] = youtube
+
+        with span("agent.template") as stage:
+            for key, value in results.items():
+                if key == "web_search":
+                    # Numbered plain-text blocks of the projected fields cost far
+                    # fewer tokens than the JSON of whole results.
+                    data[key] = render_web_results(
+                        to_web_results(value), self.web_result_fields
+                    )
+                    continue
+                data[key] = json.dumps(
+                    value, ensure_ascii=False, separators=(",", ":"), default=_to_json
+                )
+            prompt = self.generate_from_template(data)
+            stage.set(bytes_out=len(prompt))
+        return prompt, dropped
+
+    async def _shared_prompt(
+        self,
+        input_text: str,
+        enable_web: bool,
+        enable_youtube: bool,
+        deadline: Optional[Deadline],
+        use_cache: bool,
+        local_first: bool = False,
+    ) -> Tuple[str, List[str]]:
+        """
+        Build the prompt, joining an identical request that is already retrieving.
+
+        Requests are identical when they reach the same agent and their
+        normalized question, sources and prompt settings match. Callers
+        bypassing the cache, or passing anything but a plain string, build
+        their own.
+
+        Returns:
+            Tuple[str, List[str]]: The rendered prompt and the dropped sources.
+        """
+        if not use_cache or not isinstance(input_text, str):
+            return await self._build_prompt(
+                input_text, enable_web, enable_youtube, deadline, local_first
+            )
+        # The group is shared by every agent, and agents differ in handlers.
+        key = (
+            id(self),
+            normalize_query(input_text),
+            enable_web,
+            enable_youtube,
+            local_first,
+            self.template_path,
+            self.compactor.token_budget if self.compactor is not None else None,
+            self.web_result_fields,
+        )
+        (prompt, dropped), shared = await _prompt_flights.do(
+            key,
+            lambda: self._build_prompt(
+                input_text, enable_web, enable_youtube, deadline, local_first
+            ),
+        )
+        if shared:
+            self.logger.info("Joined an identical request that was already retrieving.")
+        return prompt, list(dropped)
+
+    async def process_request(
+        self,
+        input_text: str,
+        enable_web: bool = True,
+        enable_youtube: bool = False,
+        use_cache: bool = True,
+        trace: Optional[Trace] = None,
+        deadline: Optional[Union[float, Deadline]] = None,
+        local_first: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """
+        Process input text using the language model.
+
+        Enabled retrieval sources are fetched concurrently before the prompt is
+        rendered and sent to the language model.
+
+        Args:
+            input_text (str): The input text to process.
+            enable_web (bool): Whether to include web search results.
+            enable_youtube (bool): Whether to include YouTube transcripts.
+            use_cache (bool): Set to False to bypass the LLM response cache and
+                to not share work with identical requests in flight.
+            trace (Optional[Trace]): If given, receives a span per pipeline stage.
+            deadline (Optional[Union[float, Deadline]]): Seconds the whole request
+                may take, or a Deadline. Defaults to `default_deadline`.
+            local_first (Optional[bool]): Whether to answer sources from the
+                local index when it covers them. Defaults to `local_first`.
+
+        Returns:
+            Dict[str, Any]: The output of the language model, plus
+            `dropped_sources`: the enabled sources the answer had to do without.
+
+        Raises:
+            DeadlineExceeded: If the language model did not answer in time.
+        """
+        request_deadline = self._start_deadline(deadline)
+        with activate_trace(trace), use_deadline(request_deadline), span(
+            "agent.request"
+        ):
+            input, dropped = await self._shared_prompt(
+                input_text,
+                enable_web,
+                enable_youtube,
+                request_deadline,
+                use_cache,
+                self.local_first if local_first is None else local_first,
+            )
+            # Process the input text using the language model
+            response = await self.llm_handler.query(
+                [{"role": "user", "content": input}], use_cache=use_cache
+            )
+            # Copy, so a cached response is not changed for later requests.
+            return {**response, "dropped_sources": dropped}
+
+    async def process_request_stream(
+        self,
+        input_text: str,
+        enable_web: bool = True,
+        enable_youtube: bool = False,
+        use_cache: bool = True,
+        timings: Optional[Dict[str, float]] = None,
+        trace: Optional[Trace] = None,
+        deadline: Optional[Union[float, Deadline]] = None,
+        dropped_sources: Optional[List[str]] = None,
+        local_first: Optional[bool] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Process input text and stream the language model's answer.
+
+        Args:
+            input_text (str): The input text to process.
+            enable_web (bool): Whether to include web search results.
+            enable_youtube (bool): Whether to include YouTube transcripts.
+            use_cache (bool): Set to False to bypass the LLM response cache and
+                to not share work with identical requests in flight.
+            timings (Optional[Dict[str, float]]): If given, filled with the seconds
+                spent on `retrieval`, the request's `time_to_first_token` and its
+                `total` latency, all measured from the start of the request.
+            trace (Optional[Trace]): If given, receives a span per pipeline stage.
+            deadline (Optional[Union[float, Deadline]]): Seconds until the answer
+                must start streaming, or a Deadline. Defaults to
+                `default_deadline`. Tokens already streaming are not cut off.
+            dropped_sources (Optional[List[str]]): If given, extended with the
+                enabled sources the answer had to do without.
+            local_first (Optional[bool]): Whether to answer sources from the
+                local index when it covers them. Defaults to `local_first`.
+
+        Yields:
+            str: Answer tokens as they are generated.
+        """
+        started_at = time.perf_counter()
+        request_deadline = self._start_deadline(deadline)
+        # Each step of an async generator may run in a different task (and
+        # context), so the trace is activated around every step instead of
+        # across the yields.
+        with activate_trace(trace):
+            request = span("agent.request_stream").start()
+        tokens = None
+        try:
+            with activate_trace(trace), use_deadline(request_deadline):
+                input, dropped = await self._shared_prompt(
+                    input_text,
+                    enable_web,
+                    enable_youtube,
+                    request_deadline,
+                    use_cache,
+                    self.local_first if local_first is None else local_first,
+                )
+            if dropped_sources is not None:
+                dropped_sources.extend(dropped)
+            retrieval = time.perf_counter() - started_at
+
+            first_token_at = None
+            tokens = self.llm_handler.query_stream(
+                [{"role": "user", "content": input}], use_cache=use_cache
+            )
+            while True:
+                with activate_trace(trace), use_deadline(request_deadline):
+                    try:
+                        token = await tokens.__anext__()
+                    except StopAsyncIteration:
+                        break
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                yield token
+        except BaseException as e:
+            request.finish(e)
+            raise
+        finally:
+            if tokens is not None:
+                await tokens.aclose()
+        request.finish()
+
+        total = time.perf_counter() - started_at
+        time_to_first_token = (
+            first_token_at - started_at if first_token_at is not None else total
+        )
+        self.logger.info(
+            "Streamed answer: retrieval %.3fs, first token %.3fs, total %.3fs",
+            retrieval,
+            time_to_first_token,
+            total,
+        )
+        if timings is not None:
+            timings["retrieval"] = retrieval
+            timings["time_to_first_token"] = time_to_first_token
+            timings["total"] = total
+
+    async def process_batch(
+        self,
+        requests: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        concurrency: int = 4,
+        enable_web: bool = True,
+        enable_youtube: bool = False,
+        use_cache: bool = True,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer many questions, yielding each result as soon as it is ready.
+
+        Requests are read lazily and at most `concurrency` are processed at
+        once, so memory use does not grow with the size of the input. A request
+        whose normalized question and sources repeat an earlier one is not run
+        again; its result names the original in `duplicate_of`. Identical
+        retrieval across different requests is shared as in process_request.
+        Upstream calls are made at batch priority: rate limits and quotas
+        serve interactive requests first and keep a reserve for them.
+
+        Args:
+            requests (Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]]):
+                Requests with a `query` and optionally `id`, `web` and
+                `youtube`. The `id` defaults to the request's position; any
+                other field is copied to the result.
+            concurrency (int): Requests processed at once.
+            enable_web (bool): Whether to use web search when a request does not say.
+            enable_youtube (bool): Whether to use YouTube when a request does not say.
+            use_cache (bool): Set to False to bypass the LLM response cache and
+                to not share work with identical requests in flight.
+            deadline (Optional[float]): Seconds each request may take.
+
+        Yields:
+            Dict[str, Any]: Results in completion order: the request's fields plus
+            `model`, `data`, `dropped_sources` and `elapsed`, or `error` if it
+            failed, or `duplicate_of` if it repeats an earlier request.
+        """
+        concurrency = max(1, concurrency)
+        # Digests keep the memory per distinct question small and constant.
+        seen: Dict[bytes, Any] = {}
+        pending: set = set()
+
+        async def answer(request: Dict[str, Any]) -> Dict[str, Any]:
+            started_at = time.perf_counter()
+            try:
+                response = await self.process_request(
+                    request["query"],
+                    enable_web=request["web"],
+                    enable_youtube=request["youtube"],
+                    use_cache=use_cache,
+                    deadline=deadline,
+                )
+            except Exception as e:
+                self.logger.warning("Batch request %r failed: %s", request["id"], e)
+                return {**request, "error": f"{type(e).__name__}: {e}"}
+            return {
+                **request,
+                **response,
+                "elapsed": round(time.perf_counter() - started_at, 3),
+            }
+
+        try:
+            async for position, request in _enumerate_requests(requests):
+                request = {
+                    "id": position,
+                    **request,
+                    "web": request.get("web", enable_web),
+                    "youtube": request.get("youtube", enable_youtube),
+                }
+                query = request.get("query")
+                if not isinstance(query, str) or not query.strip():
+                    error = "ValueError: 'query' must be a non-empty string."
+                    yield {**request, "error": error}
+                    continue
+                key = hashlib.blake2b(
+                    json.dumps(
+                        [normalize_query(query), request["web"], request["youtube"]]
+                    ).encode("utf-8"),
+                    digest_size=16,
+                ).digest()
+                if key in seen:
+                    yield {**request, "duplicate_of": seen[key]}
+                    continue
+                seen[key] = request["id"]
+
+                while len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield task.result()
+                with use_priority(BATCH):
+                    pending.add(asyncio.ensure_future(answer(request)))
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+async def _enumerate_requests(
+    requests: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Pair each request of a sync or async iterable with its position."""
+    position = 0
+    if isinstance(requests, AsyncIterable):
+        async for request in requests:
+            yield position, request
+            position += 1
+    else:
+        for request in requests:
+            yield position, request
+            position += 1
+
+
+class Agent:
+    """
+    An Agent class that integrates multiple services to perform complex tasks.
+
+    This class acts as a coordinator, utilizing the SerperSearchHandler,
+    YouTubeHandler, and GroqHandler to perform searches, retrieve YouTube data,
+    and interact with a language model. It is a thin synchronous wrapper around
+    AsyncAgent for callers such as the Streamlit app that cannot await.
+    """
+
+    def __init__(
+        self,
+        template_path="agent/templates/agent_input_template.jinja2",
+        context_token_budget: Optional[int] = 4000,
+        default_deadline: Optional[float] = None,
+        local_index: Optional[LocalIndex] = None,
+        local_first: Optional[bool] = None,
+        web_result_fields: Optional[Sequence[str]] = None,
+    ) -> None:
+        """
+        Initialize the Agent with its service handlers.
+
+        Args:
+            template_path (str): The file path to the Jinja2 prompt template.
+            context_token_budget (Optional[int]): The estimated tokens of retrieved
+                context kept in the prompt. None disables compaction.
+            default_deadline (Optional[float]): Seconds a request may take when
+                the caller gives no deadline (see AsyncAgent).
+            local_index (Optional[LocalIndex]): The index of fetched passages
+                (see AsyncAgent).
+            local_first (Optional[bool]): Whether requests consult the local
+                index before the upstreams by default (see AsyncAgent).
+            web_result_fields (Optional[Sequence[str]]): The fields of each web
+                result written into the prompt (see AsyncAgent).
+        """
+        self.async_agent = AsyncAgent(
+            template_path=template_path,
+            context_token_budget=context_token_budget,
+            default_deadline=default_deadline,
+            local_index=local_index,
+            local_first=local_first,
+            web_result_fields=web_result_fields,
+        )
+
+    @property
+    def template_path(self) -> str:
+        """The path of the Jinja2 template used to build prompts."""
+        return self.async_agent.template_path
+
+    def warm_up(self) -> None:
+        """Resolve slow, cacheable dependencies (such as the LLM model) up front."""
+        run_coroutine(self.async_agent.warm_up())
+
+    def generate_from_template(self, data: dict) -> str:
+        """
+        Generate content from a Jinja2 template.
+
+        Args:
+            data (dict): The data to render the template with.
+
+        Returns:
+            str: The rendered template content.
+        """
+        return self.async_agent.generate_from_template(data)
+
+    def render_template_into(self, data: dict, buffer: TextIO) -> None:
+        """
+        Render the Jinja2 template straight into a text buffer.
+
+        Args:
+            data (dict): The data to render the template with.
+            buffer (TextIO): The buffer (e.g. io.StringIO) to write to.
+        """
+        self.async_agent.render_template_into(data, buffer)
 
     def process_request(
-        self, input_text: str, enable_web: bool = True, enable_youtube: bool = False
-    ) -> Dict[str, str]:
+        self,
+        input_text: str,
+        enable_web: bool = True,
+        enable_youtube: bool = False,
+        use_cache: bool = True,
+        trace: Optional[Trace] = None,
+        deadline: Optional[Union[float, Deadline]] = None,
+        local_first: Optional[bool] = None,
+    ) -> Dict[str, Any]:
         """
         Process input text using the language model.
 
         Args:
             input_text (str): The input text to process.
+            enable_web (bool): Whether to include web search results.
+            enable_youtube (bool): Whether to include YouTube transcripts.
+            use_cache (bool): Set to False to bypass the LLM response cache and
+                to not share work with identical requests in flight.
+            trace (Optional[Trace]): If given, receives a span per pipeline stage.
+            deadline (Optional[Union[float, Deadline]]): Seconds the whole request
+                may take, or a Deadline.
+            local_first (Optional[bool]): Whether to answer sources from the
+                local index when it covers them.
 
         Returns:
-            str: The processed output from the language model.
+            Dict[str, Any]: The output of the language model and the
+            `dropped_sources` the answer had to do without.
         """
-        data = {"question": input_text}
+        return run_coroutine(
+            self.async_agent.process_request(
+                input_text,
+                enable_web=enable_web,
+                enable_youtube=enable_youtube,
+                use_cache=use_cache,
+                trace=trace,
+                deadline=deadline,
+                local_first=local_first,
+            )
+        )
 
-        if enable_web:
-            # Perform a web search using Serper
-            search_results = self.serper_handler.search(input_text)
-            import json
+    def process_request_stream(
+        self,
+        input_text: str,
+        enable_web: bool = True,
+        enable_youtube: bool = False,
+        use_cache: bool = True,
+        timings: Optional[Dict[str, float]] = None,
+        trace: Optional[Trace] = None,
+        deadline: Optional[Union[float, Deadline]] = None,
+        dropped_sources: Optional[List[str]] = None,
+        local_first: Optional[bool] = None,
+    ) -> Iterator[str]:
+        """
+        Process input text and stream the language model's answer.
 
-            data["web_search"] = json.dumps(search_results)
+        Args:
+            input_text (str): The input text to process.
+            enable_web (bool): Whether to include web search results.
+            enable_youtube (bool): Whether to include YouTube transcripts.
+            use_cache (bool): Set to False to bypass the LLM response cache and
+                to not share work with identical requests in flight.
+            timings (Optional[Dict[str, float]]): If given, filled with
+                `retrieval`, `time_to_first_token` and `total` seconds.
+            trace (Optional[Trace]): If given, receives a span per pipeline stage.
+            deadline (Optional[Union[float, Deadline]]): Seconds until the answer
+                must start streaming, or a Deadline.
+            dropped_sources (Optional[List[str]]): If given, extended with the
+                enabled sources the answer had to do without.
+            local_first (Optional[bool]): Whether to answer sources from the
+                local index when it covers them.
 
-        if enable_youtube:
-            # Perform a YouTube search
-            youtube_results = self.youtube_handler.fetch_videos(input_text)
-            import json
+        Yields:
+            str: Answer tokens as they are generated.
+        """
+        yield from iterate_async(
+            self.async_agent.process_request_stream(
+                input_text,
+                enable_web=enable_web,
+                enable_youtube=enable_youtube,
+                use_cache=use_cache,
+                timings=timings,
+                trace=trace,
+                deadline=deadline,
+                dropped_sources=dropped_sources,
+                local_first=local_first,
+            )
+        )
 
-            data["youtube_search"] = json.dumps(youtube_results)
+    def process_batch(
+        self,
+        requests: Iterable[Dict[str, Any]],
+        concurrency: int = 4,
+        enable_web: bool = True,
+        enable_youtube: bool = False,
+        use_cache: bool = True,
+        deadline: Optional[float] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Answer many questions, yielding each result as soon as it is ready.
 
-        input = self.generate_from_template(data)
-        # Process the input text using the language model
-        return self.llm_handler.query([{"role": "user", "content": input}])
+        Args:
+            requests (Iterable[Dict[str, Any]]): Requests with a `query` and
+                optionally `id`, `web` and `youtube` (see AsyncAgent).
+            concurrency (int): Requests processed at once.
+            enable_web (bool): Whether to use web search when a request does not say.
+            enable_youtube (bool): Whether to use YouTube when a request does not say.
+            use_cache (bool): Set to False to bypass the LLM response cache.
+            deadline (Optional[float]): Seconds each request may take.
+
+        Yields:
+            Dict[str, Any]: Results in completion order.
+        """
+        yield from iterate_async(
+            self.async_agent.process_batch(
+                requests,
+                concurrency=concurrency,
+                enable_web=enable_web,
+                enable_youtube=enable_youtube,
+                use_cache=use_cache,
+                deadline=deadline,
+            )
+        )
@@ -0,0 +1,172 @@
+"""Context compaction module.
+
+Whole transcripts and full Serper responses easily exceed the context window of
+the language model, and input tokens dominate LLM latency. This module splits
+transcripts into time windows, scores those chunks and the web snippets against
+the question with BM25 (vectorized with NumPy), and keeps only the best ones that
+fit in a token budget. Chunk start times are preserved so the model can still
+cite `https://youtu.be/<video_id>?t=<start>` links.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agent.services.web_result import WebResult
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return _WORD_RE.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in a text.
+
+    Uses the common heuristic of roughly four characters per token, which is
+    close enough for budgeting without loading a tokenizer.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return len(text) // 4 + 1
+
+
+def bm25_scores(
+    query: str, documents: Sequence[str], k1: float = 1.5, b: float = 0.75
+) -> np.ndarray:
+    """
+    Score documents against a query with Okapi BM25.
+
+    Only the query terms can contribute to a score, so the term-frequency
+    matrix is built over the query vocabulary (documents x query terms) and
+    every score is computed in a single vectorized pass.
+
+    Args:
+        query (str): The query text.
+        documents (Sequence[str]): The documents to score.
+        k1 (float): Term frequency saturation parameter.
+        b (float): Document length normalization parameter.
+
+    Returns:
+        np.ndarray: One score per document.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not documents or not terms:
+        return np.zeros(len(documents))
+
+    term_index = {term: column for column, term in enumerate(terms)}
+    frequencies = np.zeros((len(documents), len(terms)))
+    lengths = np.zeros(len(documents))
+    for row, document in enumerate(documents):
+        tokens = tokenize(document)
+        lengths[row] = len(tokens)
+        for term, count in Counter(tokens).items():
+            column = term_index.get(term)
+            if column is not None:
+                frequencies[row, column] = count
+
+    document_frequency = np.count_nonzero(frequencies, axis=0)
+    idf = np.log1p(
+        (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5)
+    )
+    average_length = lengths.mean() or 1.0
+    norm = k1 * (1 - b + b * lengths / average_length)
+    weights = frequencies * (k1 + 1) / (frequencies + norm[:, None])
+    return weights @ idf
+
+
+class ContextCompactor:
+    """
+    Select the most relevant web snippets and transcript chunks for a question.
+
+    Attributes:
+        token_budget (int): The maximum estimated tokens of context to keep.
+        window_seconds (float): The length of transcript chunks in seconds.
+    """
+
+    def __init__(self, token_budget: int = 4000, window_seconds: float = 60.0) -> None:
+        """Initialize the compactor with its budget and chunking window."""
+        self.token_budget = token_budget
+        self.window_seconds = window_seconds
+
+    def compact(
+        self,
+        question: str,
+        web_results: Optional[Dict[str, Any]] = None,
+        videos: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[List[WebResult], List[Dict[str, Any]]]:
+        """
+        Rank all candidate passages together and keep the best within the budget.
+
+        Args:
+            question (str): The user's question.
+            web_results (Optional[Dict[str, Any]]): A Serper response.
+            videos (Optional[List[Dict[str, Any]]]): Videos from YouTubeHandler,
+                with their Transcript under "transcript".
+
+        Returns:
+            Tuple[List[WebResult], List[Dict[str, Any]]]: The kept web results in
+            search rank order, and the kept videos with their chunks in time order.
+        """
+        passages: List[Tuple[str, Any, Dict[str, Any]]] = []
+        for rank, result in enumerate((web_results or {}).get("organic", [])):
+            passages.append(("web", rank, WebResult.from_organic(result)))
+        for video_rank, video in enumerate(videos or []):
+            transcript = video.get("transcript")
+            if transcript is None:
+                continue
+            for start, text in transcript.chunks(self.window_seconds):
+                chunk = {"start": start, "text": text}
+                passages.append(("youtube", (video_rank, start), chunk))
+
+        if not passages:
+            return [], []
+
+        documents = [
+            " ".join(str(value) for value in passage.values())
+            for _, _, passage in passages
+        ]
+        scores = bm25_scores(question, documents)
+
+        kept = []
+        used = 0
+        # Stable sort keeps search/time order among equally scored passages.
+        for index in np.argsort(-scores, kind="stable"):
+            cost = estimate_tokens(documents[index])
+            if used + cost > self.token_budget:
+                continue
+            kept.append(passages[index])
+            used += cost
+
+        web = [
+            passage
+            for _, _, passage in sorted(
+                (entry for entry in kept if entry[0] == "web"),
+                key=lambda entry: entry[1],
+            )
+        ]
+
+        chunks_by_video: Dict[int, List[Dict[str, Any]]] = {}
+        for _, (video_rank, _), chunk in sorted(
+            (entry for entry in kept if entry[0] == "youtube"),
+            key=lambda entry: entry[1],
+        ):
+            chunks_by_video.setdefault(video_rank, []).append(chunk)
+        youtube = [
+            {
+                "video_id": videos[video_rank]["video_id"],
+                "title": videos[video_rank]["title"],
+                "chunks": chunks,
+            }
+            for video_rank, chunks in chunks_by_video.items()
+        ]
+        return web, youtube
@@ -1,11 +1,182 @@
 """GroqHandler class for interacting with Groq's API using a third-party package."""
 
-from typing import Any, Dict, Optional
-from groq import Groq
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from groq import AsyncGroq, Groq
 import httpx
 import os
+import weakref
 
+from agent.context_compactor import estimate_tokens
+from utils.cache import Cache, build_cache
+from utils.http_client import get_async_http_client, get_http_client
 from utils.log_config import setup_logger
+from utils.metrics import span
+from utils.resilience import UpstreamPolicy, get_policy
+from utils.single_flight import AsyncSingleFlight, SingleFlight
+
+_response_cache: Optional[Cache] = None
+
+# Completions in flight, keyed like the response cache. Callers that accept a
+# cached answer (use_cache=True) also accept one shared with a concurrent caller.
+_completion_flights = SingleFlight("groq.completion")
+_async_completion_flights = AsyncSingleFlight("groq.completion")
+_response_cache_lock = threading.Lock()
+
+# Tokens a chat message adds beyond its content (role and separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Completion tokens budgeted for a request that does not cap them.
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Estimate the prompt tokens of a chat completion request.
+
+    Args:
+        messages (List[Dict[str, str]]): The conversation.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return sum(
+        estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+def completion_budget(params: Dict[str, Any]) -> int:
+    """
+    Return the completion tokens a request may generate.
+
+    Args:
+        params (Dict[str, Any]): The sampling parameters of the request.
+
+    Returns:
+        int: Its `max_completion_tokens` or `max_tokens`, else
+        DEFAULT_COMPLETION_TOKENS.
+    """
+    budget = params.get("max_completion_tokens") or params.get("max_tokens")
+    return int(budget) if budget else DEFAULT_COMPLETION_TOKENS
+
+
+def get_response_cache() -> Cache:
+    """
+    Return the process-wide LLM response cache, building it on first use.
+
+    The cache is shared by every handler (and therefore every Agent) in the
+    process. It is configured with the GROQ_RESPONSE_CACHE_* environment
+    variables (see `utils.cache.build_cache`) and keeps 256 responses for ten
+    minutes by default.
+
+    Returns:
+        Cache: The shared response cache.
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = build_cache("GROQ_RESPONSE", maxsize=256, ttl=10 * 60)
+        return _response_cache
+
+
+class ModelCatalog:
+    """
+    A process-wide cache of the model lists returned by the Groq models endpoint.
+
+    Lists are kept per API key. Once an entry is older than `ttl` it is still
+    served, but a refresh is started on a background thread so the request
+    path never waits on model discovery after the first fetch.
+
+    Attributes:
+        ttl (float): Seconds after which a model list is refreshed.
+    """
+
+    def __init__(self, ttl: float = 60 * 60) -> None:
+        """Initialize an empty catalog."""
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self.logger = setup_logger(__name__)
+
+    def peek(
+        self, api_key: str, fetch: Callable[[], List[Dict[str, Any]]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return the cached model list, refreshing it in the background if stale.
+
+        Args:
+            api_key (str): The API key the list belongs to.
+            fetch (Callable[[], List[Dict[str, Any]]]): Fetches a fresh list.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: The cached list, or None if never fetched.
+        """
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                return None
+            fetched_at, models = entry
+            stale = time.monotonic() - fetched_at >= self.ttl
+            if stale and api_key not in self._refreshing:
+                self._refreshing.add(api_key)
+                threading.Thread(
+                    target=self._refresh,
+                    args=(api_key, fetch),
+                    name="groq-model-refresh",
+                    daemon=True,
+                ).start()
+            return models
+
+    def get(
+        self, api_key: str, fetch: Callable[[], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the model list, fetching it synchronously only on the first call.
+
+        Args:
+            api_key (str): The API key the list belongs to.
+            fetch (Callable[[], List[Dict[str, Any]]]): Fetches a fresh list.
+
+        Returns:
+            List[Dict[str, Any]]: The model list.
+        """
+        models = self.peek(api_key, fetch)
+        if models is None:
+            models = fetch()
+            self.store(api_key, models)
+        return models
+
+    def store(self, api_key: str, models: List[Dict[str, Any]]) -> None:
+        """Store a freshly fetched model list."""
+        with self._lock:
+            self._entries[api_key] = (time.monotonic(), models)
+
+    def clear(self) -> None:
+        """Forget every cached model list."""
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(
+        self, api_key: str, fetch: Callable[[], List[Dict[str, Any]]]
+    ) -> None:
+        """Refresh a stale entry; on failure the stale list keeps being served."""
+        try:
+            self.store(api_key, fetch())
+            self.logger.info("Refreshed Groq model catalog in the background.")
+        except Exception as e:
+            self.logger.warning(f"Background refresh of Groq models failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(api_key)
+
+
+_model_catalog = ModelCatalog(ttl=float(os.getenv("GROQ_MODELS_TTL", str(60 * 60))))
 
 
 class GroqHandler:
@@ -13,12 +184,24 @@ class GroqHandler:
     A handler class to interact with Groq's API using the `groq` package.
 
     Attributes:
+        models_url (str): The endpoint listing the models available to the account.
+        default_model (str): The model used when none is configured explicitly.
         api_key (str): The API key for authenticating with Groq.
-        client (Groq): The Groq client instance for API interaction.
+        client (Groq): The Groq client instance for API interaction, backed by the pooled HTTP client.
+        cache_responses (bool): Whether identical prompts are answered from the
+            process-wide response cache.
+        policy (UpstreamPolicy): Timeout, retries, hedging and circuit breaker
+            applied to every API call. The SDK's own retries are turned off.
     """
 
+    default_model = "llama3-8b-8192"
+
     def __init__(
-        self, api_key: Optional[str] = None, model: Optional[str] = None
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        cache_responses: Optional[bool] = None,
+        policy: Optional[UpstreamPolicy] = None,
     ) -> None:
         """
         Initialize the GroqHandler with the provided API key and optional model.
@@ -26,6 +209,8 @@ class GroqHandler:
         Args:
             api_key (Optional[str]): The API key for Groq. If not provided, it will be fetched from the environment variable `GROQ_API_KEY`.
             model (Optional[str]): The model to use (e.g., "llama3-8b-8192").
+            cache_responses (Optional[bool]): Opt in to the response cache. Defaults to the environment variable `GROQ_CACHE_RESPONSES`.
+            policy (Optional[UpstreamPolicy]): The resilience policy. Defaults to the process-wide policy for "groq".
         """
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         if not self.api_key:
@@ -34,13 +219,188 @@ class GroqHandler:
             )
 
         self.model = model
+        if cache_responses is None:
+            cache_responses = os.getenv("GROQ_CACHE_RESPONSES", "").lower() in (
+                "1",
+                "true",
+                "yes",
+            )
+        self.cache_responses = cache_responses
+        self.policy = policy or get_policy("groq")
         self.logger = setup_logger(__name__)
-        self.client = Groq(api_key=self.api_key)
+        self._client: Optional[Groq] = None
+
+    @property
+    def client(self) -> Groq:
+        """The Groq SDK client, created on first use over the pooled HTTP client."""
+        if self._client is None:
+            self._client = Groq(
+                api_key=self.api_key,
+                http_client=get_http_client("groq"),
+                max_retries=0,
+            )
+        return self._client
+
+    @property
+    def models_url(self) -> str:
+        """The models endpoint, under 'GROQ_BASE_URL' like the SDK's own requests."""
+        base_url = os.getenv("GROQ_BASE_URL") or "https://api.groq.com"
+        return f"{base_url.rstrip('/')}/openai/v1/models"
+
+    def _build_headers(self) -> Dict[str, str]:
+        """Build the request headers for the Groq REST API."""
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    @staticmethod
+    def _response_cache_key(
+        model: str, messages: list[Dict[str, str]], params: Dict[str, Any]
+    ) -> str:
+        """Hash the model, messages and sampling parameters into a cache key."""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _select_model(self, available_models: list[Dict[str, Any]]) -> str:
+        """
+        Pick the model to use from the list returned by the models endpoint.
+
+        Args:
+            available_models (list[Dict[str, Any]]): The `data` entries of the models response.
+
+        Returns:
+            str: The identifier of the selected model.
+
+        Raises:
+            ValueError: If no models are available or the hardcoded model is missing.
+        """
+        if not available_models:
+            raise ValueError("No models available in Groq API.")
+        self.logger.info(
+            f"Checking if hardcoded model '{self.default_model}' is available..."
+        )
+        if not any(
+            model.get("id") == self.default_model for model in available_models
+        ):
+            raise ValueError(
+                f"Hardcoded model '{self.default_model}' is not available in Groq API. "
+                "Please update the hardcoded model to an appropriate one."
+            )
+        return self.default_model
+
+    def _request_models(self) -> httpx.Response:
+        """Make one request to the models endpoint, raising on an error status."""
+        response = get_http_client("groq").get(
+            self.models_url,
+            headers=self._build_headers(),
+            timeout=self.policy.attempt_timeout(),
+        )
+        response.raise_for_status()
+        return response
+
+    def _fetch_models(self) -> List[Dict[str, Any]]:
+        """Fetch the list of available models from the Groq API."""
+        self.logger.info("Fetching available models from Groq API...")
+        return (
+            self.policy.call(self._request_models, cost=0).json().get("data", [])
+        )
+
+    def resolve_model(self) -> str:
+        """
+        Resolve the model to use, consulting the process-wide model catalog.
+
+        Only the first handler in the process (or the first after the catalog
+        expires without a successful background refresh) waits for the models
+        endpoint.
+
+        Returns:
+            str: The identifier of the model.
+        """
+        if not self.model:
+            try:
+                models = _model_catalog.get(self.api_key, self._fetch_models)
+                self.model = self._select_model(models)
+            except httpx.RequestError as e:
+                self.logger.error(f"HTTP request error while fetching models: {e}")
+                raise
+            except Exception as e:
+                self.logger.error(f"Error fetching models from Groq API: {e}")
+                raise
+        return self.model
+
+    def warm_up(self) -> str:
+        """
+        Resolve the model ahead of the first query, e.g. at deployment startup.
+
+        Returns:
+            str: The identifier of the model.
+        """
+        return self.resolve_model()
+
+    def _cached_response(
+        self, messages: list[Dict[str, str]], use_cache: bool, params: Dict[str, Any]
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Look up a prompt in the response cache.
+
+        Returns:
+            Tuple[Optional[str], Optional[Dict[str, Any]]]: The cache key (None when
+            caching is off for this call) and the cached response, if any.
+        """
+        if not (self.cache_responses and use_cache):
+            return None, None
+        cache_key = self._response_cache_key(self.model, messages, params)
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            self.logger.info("Serving Groq response from the response cache.")
+            return cache_key, dict(cached)
+        return cache_key, None
+
+    def _record_usage(self, stage: Any, response: Any, cost: int) -> None:
+        """
+        Attach the token usage reported by the API to a metrics span.
+
+        The tokens charged to the quota up front (`cost`) are corrected to
+        the reported usage.
+        """
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            tokens_in = getattr(usage, "prompt_tokens", 0) or 0
+            tokens_out = getattr(usage, "completion_tokens", 0) or 0
+            stage.set(tokens_in=tokens_in, tokens_out=tokens_out)
+            if tokens_in or tokens_out:
+                self.policy.settle_cost(cost, tokens_in + tokens_out)
+
+    def _record_stream_timings(
+        self,
+        timings: Optional[Dict[str, float]],
+        started_at: float,
+        first_token_at: Optional[float],
+    ) -> None:
+        """Log and optionally report time-to-first-token and total stream latency."""
+        total = time.perf_counter() - started_at
+        time_to_first_token = (
+            first_token_at - started_at if first_token_at is not None else total
+        )
+        self.logger.info(
+            f"Stream finished: first token after {time_to_first_token:.3f}s, "
+            f"total {total:.3f}s."
+        )
+        if timings is not None:
+            timings["time_to_first_token"] = time_to_first_token
+            timings["total"] = total
 
     def query(
         self,
         messages: list[Dict[str, str]],
-        timeout: Optional[int] = 10,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        **params: Any,
     ) -> Dict[str, Any]:
         """
         Query the Groq Chat Completion API.
@@ -48,64 +408,382 @@ class GroqHandler:
         Args:
             model (str): The model to use (e.g., "llama3-8b-8192").
             messages (list[Dict[str, str]]): A list of message dictionaries for the conversation.
-            timeout (Optional[int]): The timeout for the request in seconds.
+            timeout (Optional[float]): The timeout for the request in seconds. Defaults to the policy's timeout; either is clipped to the active deadline.
+            use_cache (bool): Set to False to bypass the response cache for this call,
+                and to not share the completion of an identical concurrent call.
+            **params (Any): Sampling parameters forwarded to the API (e.g. temperature).
 
         Returns:
             Dict[str, Any]: The response from the Groq API.
         """
-        kwargs: Dict[str, Any] = dict(
-            messages=messages,
-            timeout=timeout,
-        )
+        kwargs: Dict[str, Any] = dict(messages=messages)
 
-        if not self.model:
-            url = "https://api.groq.com/openai/v1/models"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
+        kwargs["model"] = self.resolve_model()
+        kwargs.update(params)
+        # Charged against the tokens-per-minute quota, if one is configured.
+        cost = estimate_prompt_tokens(messages) + completion_budget(params)
+
+        with span("groq.query", model=kwargs["model"]) as stage:
+            cache_key, cached = self._cached_response(messages, use_cache, params)
+            if cache_key is not None:
+                stage.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
 
             try:
-                self.logger.info("Fetching available models from Groq API...")
-                response = httpx.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
+                self.logger.info("Querying Groq Chat Completion API...")
 
-                available_models = response.json().get("data", [])
+                def create() -> Any:
+                    return self.policy.call(
+                        lambda: self.client.chat.completions.create(
+                            timeout=self.policy.attempt_timeout(timeout), **kwargs
+                        ),
+                        cost=cost,
+                    )
 
-                if not available_models:
-                    raise ValueError("No models available in Groq API.")
-                hardcoded_model = "llama3-8b-8192"
-                self.logger.info(
-                    f"Checking if hardcoded model '{hardcoded_model}' is available..."
-                )
-                if not any(
-                    model.get("id") == hardcoded_model for model in available_models
-                ):
-                    raise ValueError(
-                        f"Hardcoded model '{hardcoded_model}' is not available in Groq API. "
-                        "Please update the hardcoded model to an appropriate one."
+                if use_cache:
+                    flight_key = cache_key or self._response_cache_key(
+                        self.model, messages, params
                     )
+                    response, shared = _completion_flights.do(flight_key, create)
+                else:
+                    response, shared = create(), False
+                self.logger.info("Query successful.")
+                if shared:
+                    stage.set(coalesced=True)
+                else:
+                    self._record_usage(stage, response, cost)
+
+                return_data = {
+                    "model": self.model,
+                    "data": response.choices[0].message.content,
+                }
+                if cache_key is not None:
+                    get_response_cache().set(cache_key, return_data)
+                return dict(return_data)
+            except Exception as e:
+                self.logger.error(f"Error querying Groq API: {e}")
+                raise
+
+    def query_stream(
+        self,
+        messages: list[Dict[str, str]],
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        timings: Optional[Dict[str, float]] = None,
+        **params: Any,
+    ) -> Iterator[str]:
+        """
+        Stream a Groq chat completion token by token.
+
+        Args:
+            messages (list[Dict[str, str]]): A list of message dictionaries for the conversation.
+            timeout (Optional[float]): The timeout for the request in seconds. Defaults to the policy's timeout; either is clipped to the active deadline.
+            use_cache (bool): Set to False to bypass the response cache for this call.
+            timings (Optional[Dict[str, float]]): If given, filled with
+                `time_to_first_token` and `total` seconds once the stream ends.
+            **params (Any): Sampling parameters forwarded to the API (e.g. temperature).
+
+        Yields:
+            str: Content tokens as they are generated. A cached response is
+            yielded as a single chunk.
+        """
+        started_at = time.perf_counter()
+        model = self.resolve_model()
+        prompt_tokens = estimate_prompt_tokens(messages)
+        cost = prompt_tokens + completion_budget(params)
+        with span("groq.stream", model=model) as stage:
+            cache_key, cached = self._cached_response(messages, use_cache, params)
+            if cache_key is not None:
+                stage.set(cache_hit=cached is not None)
+            if cached is not None:
+                yield cached["data"]
+                self._record_stream_timings(timings, started_at, None)
+                return
+
+            first_token_at = None
+            parts: List[str] = []
+            try:
+                self.logger.info("Streaming from Groq Chat Completion API...")
+                # Only opening the stream is retried; tokens already yielded
+                # cannot be taken back. Streams are never hedged.
+                stream = self.policy.call(
+                    lambda: self.client.chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        timeout=self.policy.attempt_timeout(timeout),
+                        stream=True,
+                        **params,
+                    ),
+                    hedge=False,
+                    cost=cost,
+                )
+                # Closing the stream when the consumer stops early (a rerun, a
+                # disconnect, a deadline) returns its pooled connection.
+                with stream:
+                    for chunk in stream:
+                        token = (
+                            chunk.choices[0].delta.content if chunk.choices else None
+                        )
+                        if not token:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        parts.append(token)
+                        yield token
+            except Exception as e:
+                self.logger.error(f"Error streaming from Groq API: {e}")
+                raise
+
+            self._record_stream_timings(timings, started_at, first_token_at)
+            # Groq sends one token per content chunk.
+            stage.set(tokens_out=len(parts))
+            self.policy.settle_cost(cost, prompt_tokens + len(parts))
+            if first_token_at is not None:
+                stage.set(time_to_first_token=round(first_token_at - started_at, 6))
+            if cache_key is not None:
+                response = {"model": model, "data": "".join(parts)}
+                get_response_cache().set(cache_key, response)
+
+
+class AsyncGroqHandler(GroqHandler):
+    """
+    An asyncio variant of the GroqHandler built on `groq.AsyncGroq`.
+
+    Model discovery and chat completions are awaited instead of blocking, so
+    the LLM call can share an event loop with the retrieval handlers.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        cache_responses: Optional[bool] = None,
+        policy: Optional[UpstreamPolicy] = None,
+    ) -> None:
+        """
+        Initialize the AsyncGroqHandler with the provided API key and optional model.
+
+        Args:
+            api_key (Optional[str]): The API key for Groq. If not provided, it will be fetched from the environment variable `GROQ_API_KEY`.
+            model (Optional[str]): The model to use (e.g., "llama3-8b-8192").
+            cache_responses (Optional[bool]): Opt in to the response cache. Defaults to the environment variable `GROQ_CACHE_RESPONSES`.
+            policy (Optional[UpstreamPolicy]): The resilience policy. Defaults to the process-wide policy for "groq".
+        """
+        super().__init__(
+            api_key=api_key,
+            model=model,
+            cache_responses=cache_responses,
+            policy=policy,
+        )
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> AsyncGroq:
+        """The async Groq SDK client bound to the running event loop's connection pool."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncGroq(
+                api_key=self.api_key,
+                http_client=get_async_http_client("groq"),
+                max_retries=0,
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def resolve_model(self) -> str:
+        """
+        Resolve the model to use without blocking the event loop.
 
-                self.model = hardcoded_model
+        Returns:
+            str: The identifier of the model.
+        """
+        if not self.model:
+            try:
+                models = _model_catalog.peek(self.api_key, self._fetch_models)
+                if models is None:
+                    self.logger.info("Fetching available models from Groq API...")
+                    response = await self.policy.call_async(
+                        self._request_models_async, cost=0
+                    )
+                    models = response.json().get("data", [])
+                    _model_catalog.store(self.api_key, models)
+                self.model = self._select_model(models)
             except httpx.RequestError as e:
                 self.logger.error(f"HTTP request error while fetching models: {e}")
                 raise
             except Exception as e:
                 self.logger.error(f"Error fetching models from Groq API: {e}")
                 raise
+        return self.model
 
-        kwargs["model"] = self.model
+    async def _request_models_async(self) -> httpx.Response:
+        """Make one request to the models endpoint without blocking the loop."""
+        response = await get_async_http_client("groq").get(
+            self.models_url,
+            headers=self._build_headers(),
+            timeout=self.policy.attempt_timeout(),
+        )
+        response.raise_for_status()
+        return response
 
-        try:
-            self.logger.info("Querying Groq Chat Completion API...")
-            response = self.client.chat.completions.create(**kwargs)
-            self.logger.info("Query successful.")
-
-            return_data = {
-                "model": self.model,
-                "data": response.choices[0].message.content,
-            }
-            return return_data
-        except Exception as e:
-            self.logger.error(f"Error querying Groq API: {e}")
-            raise
+    async def warm_up(self) -> str:
+        """
+        Resolve the model ahead of the first query, e.g. at deployment startup.
+
+        Returns:
+            str: The identifier of the model.
+        """
+        return await self.resolve_model()
+
+    async def query(
+        self,
+        messages: list[Dict[str, str]],
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """
+        Query the Groq Chat Completion API without blocking the event loop.
+
+        Args:
+            messages (list[Dict[str, str]]): A list of message dictionaries for the conversation.
+            timeout (Optional[float]): The timeout for the request in seconds. Defaults to the policy's timeout; either is clipped to the active deadline.
+            use_cache (bool): Set to False to bypass the response cache for this call,
+                and to not share the completion of an identical concurrent call.
+            **params (Any): Sampling parameters forwarded to the API (e.g. temperature).
+
+        Returns:
+            Dict[str, Any]: The response from the Groq API.
+        """
+        kwargs: Dict[str, Any] = dict(messages=messages)
+
+        kwargs["model"] = await self.resolve_model()
+        kwargs.update(params)
+        # Charged against the tokens-per-minute quota, if one is configured.
+        cost = estimate_prompt_tokens(messages) + completion_budget(params)
+
+        with span("groq.query", model=kwargs["model"]) as stage:
+            cache_key, cached = self._cached_response(messages, use_cache, params)
+            if cache_key is not None:
+                stage.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+            try:
+                self.logger.info("Querying Groq Chat Completion API...")
+
+                async def create() -> Any:
+                    return await self.policy.call_async(
+                        lambda: self.client.chat.completions.create(
+                            timeout=self.policy.attempt_timeout(timeout), **kwargs
+                        ),
+                        cost=cost,
+                    )
+
+                if use_cache:
+                    flight_key = cache_key or self._response_cache_key(
+                        self.model, messages, params
+                    )
+                    response, shared = await _async_completion_flights.do(
+                        flight_key, create
+                    )
+                else:
+                    response, shared = await create(), False
+                self.logger.info("Query successful.")
+                if shared:
+                    stage.set(coalesced=True)
+                else:
+                    self._record_usage(stage, response, cost)
+
+                return_data = {
+                    "model": self.model,
+                    "data": response.choices[0].message.content,
+                }
+                if cache_key is not None:
+                    get_response_cache().set(cache_key, return_data)
+                return dict(return_data)
+            except Exception as e:
+                self.logger.error(f"Error querying Groq API: {e}")
+                raise
+
+    async def query_stream(
+        self,
+        messages: list[Dict[str, str]],
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        timings: Optional[Dict[str, float]] = None,
+        **params: Any,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a Groq chat completion token by token without blocking the loop.
+
+        Args:
+            messages (list[Dict[str, str]]): A list of message dictionaries for the conversation.
+            timeout (Optional[float]): The timeout for the request in seconds. Defaults to the policy's timeout; either is clipped to the active deadline.
+            use_cache (bool): Set to False to bypass the response cache for this call.
+            timings (Optional[Dict[str, float]]): If given, filled with
+                `time_to_first_token` and `total` seconds once the stream ends.
+            **params (Any): Sampling parameters forwarded to the API (e.g. temperature).
+
+        Yields:
+            str: Content tokens as they are generated. A cached response is
+            yielded as a single chunk.
+        """
+        started_at = time.perf_counter()
+        model = await self.resolve_model()
+        prompt_tokens = estimate_prompt_tokens(messages)
+        cost = prompt_tokens + completion_budget(params)
+        with span("groq.stream", model=model) as stage:
+            cache_key, cached = self._cached_response(messages, use_cache, params)
+            if cache_key is not None:
+                stage.set(cache_hit=cached is not None)
+            if cached is not None:
+                yield cached["data"]
+                self._record_stream_timings(timings, started_at, None)
+                return
+
+            first_token_at = None
+            parts: List[str] = []
+            try:
+                self.logger.info("Streaming from Groq Chat Completion API...")
+                # Only opening the stream is retried; tokens already yielded
+                # cannot be taken back. Streams are never hedged.
+                stream = await self.policy.call_async(
+                    lambda: self.client.chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        timeout=self.policy.attempt_timeout(timeout),
+                        stream=True,
+                        **params,
+                    ),
+                    hedge=False,
+                    cost=cost,
+                )
+                # Closing the stream when the consumer stops early (a rerun, a
+                # disconnect, a deadline) returns its pooled connection.
+                async with stream:
+                    async for chunk in stream:
+                        token = (
+                            chunk.choices[0].delta.content if chunk.choices else None
+                        )
+                        if not token:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        parts.append(token)
+                        yield token
+            except Exception as e:
+                self.logger.error(f"Error streaming from Groq API: {e}")
+                raise
+
+            self._record_stream_timings(timings, started_at, first_token_at)
+            # Groq sends one token per content chunk.
+            stage.set(tokens_out=len(parts))
+            self.policy.settle_cost(cost, prompt_tokens + len(parts))
+            if first_token_at is not None:
+                stage.set(time_to_first_token=round(first_token_at - started_at, 6))
+            if cache_key is not None:
+                response = {"model": model, "data": "".join(parts)}
+                get_response_cache().set(cache_key, response)
@@ -0,0 +1,328 @@
+"""
+Local retrieval index module.
+
+Recurring questions keep paying Serper and the YouTube Data API for passages
+that were already fetched. Every web result and transcript chunk the agent
+retrieves is therefore added to a SQLite FTS5 full-text index on disk. In
+local-first mode the agent searches this index before the upstreams and only
+calls a source when its indexed passages do not answer the question well
+enough: too few passages, too few of the question's terms covered, or
+passages older than `max_age`.
+
+Passages are stored in a plain table keyed by (source, document, start) and
+mirrored into an external-content FTS5 table by triggers, so re-fetching a
+passage refreshes it instead of adding a duplicate. Stale passages are pruned
+when the index is opened.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from agent.context_compactor import tokenize
+from agent.services.transcript import Transcript
+from utils.log_config import setup_logger
+
+WEB = "web"
+YOUTUBE = "youtube"
+
+# Words that carry no topic; they neither drive the search nor count towards
+# coverage.
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or "
+    "the this to was what when where which who why will with you your".split()
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    start INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL DEFAULT '',
+    link TEXT NOT NULL DEFAULT '',
+    text TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    UNIQUE (source, doc_id, start)
+);
+CREATE INDEX IF NOT EXISTS passages_fetched_at ON passages (fetched_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(
+    title, text, content='passages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS passages_insert AFTER INSERT ON passages BEGIN
+    INSERT INTO passages_fts (rowid, title, text)
+    VALUES (new.id, new.title, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS passages_delete AFTER DELETE ON passages BEGIN
+    INSERT INTO passages_fts (passages_fts, rowid, title, text)
+    VALUES ('delete', old.id, old.title, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS passages_update AFTER UPDATE ON passages BEGIN
+    INSERT INTO passages_fts (passages_fts, rowid, title, text)
+    VALUES ('delete', old.id, old.title, old.text);
+    INSERT INTO passages_fts (rowid, title, text)
+    VALUES (new.id, new.title, new.text);
+END;
+"""
+
+
+def query_terms(query: str) -> List[str]:
+    """
+    Return the distinct topic terms of a question.
+
+    Args:
+        query (str): The question.
+
+    Returns:
+        List[str]: Its lowercase word tokens without stopwords, in order.
+    """
+    return [
+        term for term in dict.fromkeys(tokenize(query)) if term not in _STOPWORDS
+    ]
+
+
+def coverage(query: str, passages: Iterable[Dict[str, Any]]) -> float:
+    """
+    Measure how many of a question's terms occur in a set of passages.
+
+    Args:
+        query (str): The question.
+        passages (Iterable[Dict[str, Any]]): Passages with a title and text.
+
+    Returns:
+        float: The covered share of the question's terms, from 0 to 1.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return 0.0
+    found = set()
+    for passage in passages:
+        found.update(tokenize(f"{passage['title']} {passage['text']}"))
+    return sum(term in found for term in terms) / len(terms)
+
+
+class LocalIndex:
+    """
+    A SQLite FTS5 index of previously fetched web results and transcript chunks.
+
+    Attributes:
+        path (str): The path of the SQLite database file.
+        max_age (float): Seconds a passage is fresh enough to answer from.
+        min_results (int): Passages a source needs to be answered locally.
+        min_coverage (float): The share of the question's terms they must cover.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_age: Optional[float] = None,
+        min_results: Optional[int] = None,
+        min_coverage: Optional[float] = None,
+    ) -> None:
+        """
+        Open (or create) a local index and prune its stale passages.
+
+        Args:
+            path (Optional[str]): The database path. Defaults to the environment
+                variable 'LOCAL_INDEX_PATH' or "local_index.db".
+            max_age (Optional[float]): The freshness limit in seconds. Defaults
+                to the environment variable 'LOCAL_INDEX_MAX_AGE' or one week.
+            min_results (Optional[int]): Defaults to the environment variable
+                'LOCAL_INDEX_MIN_RESULTS' or 3.
+            min_coverage (Optional[float]): Defaults to the environment variable
+                'LOCAL_INDEX_MIN_COVERAGE' or 0.75.
+        """
+        self.path = path or os.getenv("LOCAL_INDEX_PATH", "local_index.db")
+        self.max_age = float(
+            max_age
+            if max_age is not None
+            else os.getenv("LOCAL_INDEX_MAX_AGE", str(7 * 24 * 60 * 60))
+        )
+        self.min_results = int(
+            min_results
+            if min_results is not None
+            else os.getenv("LOCAL_INDEX_MIN_RESULTS", "3")
+        )
+        self.min_coverage = float(
+            min_coverage
+            if min_coverage is not None
+            else os.getenv("LOCAL_INDEX_MIN_COVERAGE", "0.75")
+        )
+        self.logger = setup_logger(__name__)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.prune()
+
+    def _upsert(self, rows: List[tuple]) -> int:
+        """Insert or refresh passages in one transaction and return their count."""
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO passages"
+                    " (source, doc_id, start, title, link, text, fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (source, doc_id, start) DO UPDATE SET"
+                    " title = excluded.title, link = excluded.link,"
+                    " text = excluded.text, fetched_at = excluded.fetched_at",
+                    rows,
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    def add_web_results(self, response: Dict[str, Any]) -> int:
+        """
+        Index the organic results of a Serper response.
+
+        Args:
+            response (Dict[str, Any]): The (merged) Serper response.
+
+        Returns:
+            int: The number of passages added or refreshed.
+        """
+        now = time.time()
+        rows = []
+        for result in response.get("organic", []):
+            title = result.get("title") or ""
+            link = result.get("link") or ""
+            text = result.get("snippet") or ""
+            if link or title:
+                rows.append((WEB, link or title, 0, title, link, text, now))
+        return self._upsert(rows)
+
+    def add_transcript(
+        self,
+        video_id: str,
+        title: str,
+        transcript: Transcript,
+        window_seconds: float = 60.0,
+    ) -> int:
+        """
+        Index the chunks of a video's transcript.
+
+        Args:
+            video_id (str): The ID of the video.
+            title (str): The title of the video.
+            transcript (Transcript): Its transcript.
+            window_seconds (float): The length of the indexed chunks in seconds.
+
+        Returns:
+            int: The number of passages added or refreshed.
+        """
+        now = time.time()
+        link = f"https://youtu.be/{video_id}"
+        rows = [
+            (YOUTUBE, video_id, start, title, link, text, now)
+            for start, text in transcript.chunks(window_seconds)
+        ]
+        return self._upsert(rows)
+
+    def search(
+        self, query: str, source: str, limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the fresh passages of a source that best match a question.
+
+        Args:
+            query (str): The question.
+            source (str): WEB or YOUTUBE.
+            limit (int): The most passages to return.
+
+        Returns:
+            List[Dict[str, Any]]: Passages (doc_id, start, title, link, text and
+            fetched_at), best match first.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.doc_id, p.start, p.title, p.link, p.text, p.fetched_at"
+                " FROM passages_fts JOIN passages AS p ON p.id = passages_fts.rowid"
+                " WHERE passages_fts MATCH ? AND p.source = ? AND p.fetched_at >= ?"
+                " ORDER BY bm25(passages_fts) LIMIT ?",
+                (match, source, time.time() - self.max_age, limit),
+            ).fetchall()
+        columns = ("doc_id", "start", "title", "link", "text", "fetched_at")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def lookup(
+        self, query: str, source: str, limit: int = 20
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Answer a source from the index if its passages are good enough.
+
+        Args:
+            query (str): The question.
+            source (str): WEB or YOUTUBE.
+            limit (int): The most passages to return.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: The passages, or None if there are
+            fewer than `min_results` or they cover less than `min_coverage` of
+            the question's terms, in which case the upstream should be called.
+        """
+        passages = self.search(query, source, limit)
+        if len(passages) < self.min_results:
+            return None
+        if coverage(query, passages) < self.min_coverage:
+            return None
+        return passages
+
+    def prune(self) -> int:
+        """
+        Delete the passages that are too old to answer from.
+
+        Returns:
+            int: The number of passages deleted.
+        """
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM passages WHERE fetched_at < ?",
+                (time.time() - self.max_age,),
+            ).rowcount
+        if deleted:
+            self.logger.info(f"Pruned {deleted} stale passages from the local index.")
+        return deleted
+
+    def __len__(self) -> int:
+        """Return the number of indexed passages."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_default_index: Optional[LocalIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_local_index() -> LocalIndex:
+    """
+    Return the process-wide local index, opening it on first use.
+
+    Returns:
+        LocalIndex: The shared index configured from the environment.
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = LocalIndex()
+        return _default_index
@@ -1,13 +1,182 @@
 """serper search handler module.
 
 This module provides a class to handle search queries using the Serper API.
+Result pages are requested concurrently and their organic results are merged
+into a single ranked, deduplicated list. Pages are reduced to their organic
+results as soon as they are parsed (see `agent.services.web_result`), so
+neither the search cache nor a request keeps the rest of the payload.
 """
 
+import asyncio
+import contextvars
 import httpx
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import os
+import threading
 
+from agent.services.web_result import WebResult
+from utils.cache import Cache, build_cache, normalize_query
+from utils.deadline import DeadlineExceeded, remaining_time
+from utils.http_client import get_async_http_client, get_http_client
 from utils.log_config import setup_logger
+from utils.metrics import span
+from utils.resilience import CircuitOpenError, UpstreamPolicy, get_policy
+from utils.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL so that trivially different links compare equal.
+
+    The scheme and host are lowercased, a leading "www." is dropped, as are
+    fragments, trailing slashes and tracking parameters (``utm_*``). The
+    remaining query parameters are sorted.
+
+    Args:
+        url (str): The URL to normalize.
+
+    Returns:
+        str: The normalized URL.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith("utm_")
+        )
+    )
+    path = parts.path.rstrip("/")
+    return urlunsplit((parts.scheme.lower(), host, path, query, ""))
+
+
+def compact_page(response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a Serper page to the fields of its organic results.
+
+    Args:
+        response (Dict[str, Any]): The raw Serper JSON of a page.
+
+    Returns:
+        Dict[str, Any]: A page with only "organic", each result projected to the
+        WebResult fields as a plain (cacheable) dict.
+    """
+    return {
+        "organic": [
+            WebResult.from_organic(result).project()
+            for result in response.get("organic", [])
+        ]
+    }
+
+
+class SearchResultMerger:
+    """
+    Merge organic results from several Serper pages into one ranked list.
+
+    Results are deduplicated by normalized URL. When the same link appears on
+    more than one page, the best (lowest page, lowest position) rank is kept.
+
+    Attributes:
+        max_results (Optional[int]): Number of unique results after which the
+            fan-out can stop early. None means fetch every page.
+    """
+
+    def __init__(self, max_results: Optional[int] = None) -> None:
+        """Initialize an empty merger."""
+        self.max_results = max_results
+        self._ranked: Dict[str, Tuple[Tuple[int, int], WebResult]] = {}
+        self._pages_received = 0
+
+    @property
+    def pages_received(self) -> int:
+        """The number of pages added so far."""
+        return self._pages_received
+
+    @property
+    def done(self) -> bool:
+        """Whether enough unique results have been collected to stop early."""
+        return self.max_results is not None and len(self._ranked) >= self.max_results
+
+    def add_page(self, page: int, response: Dict[str, Any]) -> List[WebResult]:
+        """
+        Add a page response and return the results not seen before.
+
+        Args:
+            page (int): The 1-based page number of the response.
+            response (Dict[str, Any]): The Serper JSON for that page.
+
+        Returns:
+            List[WebResult]: The newly discovered organic results, in page order.
+        """
+        self._pages_received += 1
+        new_results = []
+        for index, organic in enumerate(response.get("organic", [])):
+            result = WebResult.from_organic(organic)
+            if not result.link:
+                continue
+            key = normalize_url(result.link)
+            rank = (page, result.position or index + 1)
+            if key not in self._ranked:
+                new_results.append(result)
+                self._ranked[key] = (rank, result)
+            elif rank < self._ranked[key][0]:
+                self._ranked[key] = (rank, result)
+        return new_results
+
+    def merged(self) -> Dict[str, Any]:
+        """
+        Build the merged response.
+
+        Organic results are ordered by rank and renumbered from 1. The other
+        sections of a Serper page (knowledge graph, related searches, ...) are
+        not kept.
+
+        Returns:
+            Dict[str, Any]: A Serper-shaped response whose "organic" list holds
+            WebResult objects, or an empty dict if no page was received.
+        """
+        if not self._pages_received:
+            return {}
+        ranked = sorted(self._ranked.values(), key=lambda entry: entry[0])
+        if self.max_results is not None:
+            ranked = ranked[: self.max_results]
+        return {
+            "organic": [
+                result.with_position(position)
+                for position, (_, result) in enumerate(ranked, start=1)
+            ]
+        }
+
+
+_search_cache: Optional[Cache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> Cache:
+    """
+    Return the process-wide Serper result cache, building it on first use.
+
+    The backend, size and TTL are configured with the SERPER_CACHE_* environment
+    variables (see `utils.cache.build_cache`). Entries live for an hour by default.
+
+    Returns:
+        Cache: The shared search result cache.
+    """
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = build_cache("SERPER", maxsize=1024, ttl=60 * 60)
+        return _search_cache
+
+
+# Page requests in flight, keyed like the cache, shared by every handler.
+_page_flights = SingleFlight("serper.page")
+_async_page_flights = AsyncSingleFlight("serper.page")
 
 
 class SerperSearchHandler:
@@ -18,70 +187,415 @@ class SerperSearchHandler:
     It includes robust logging, error handling, and static typing to ensure reliability.
 
     Attributes:
-        base_url (str): The base URL for the Serper API.
+        base_url (str): The search endpoint, under 'SERPER_BASE_URL' if set
+            (e.g. a local stand-in for benchmarks).
         api_key (str): The API key for authenticating with the Serper API.
+        client (httpx.Client): The pooled HTTP client used for requests.
+        cache (Cache): The cache of page responses, keyed by normalized query,
+            page and locale.
+        gl (Optional[str]): The country code sent to Serper, e.g. "us".
+        hl (Optional[str]): The interface language sent to Serper, e.g. "en".
+        policy (UpstreamPolicy): Timeout, retries, hedging and circuit breaker
+            applied to every page request.
     """
 
-    def __init__(self, api_key: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        client: Optional[httpx.Client] = None,
+        cache: Optional[Cache] = None,
+        gl: Optional[str] = None,
+        hl: Optional[str] = None,
+        policy: Optional[UpstreamPolicy] = None,
+    ) -> None:
         """
         Initialize the SerperSearchHandler with the base API URL and API key.
 
         Args:
             api_key (Optional[str]): The API key for the Serper API. If not provided, it will be fetched from the environment variable 'SERPER_API_KEY'.
+            client (Optional[httpx.Client]): The HTTP client to use. Defaults to the process-wide pooled client for Serper.
+            cache (Optional[Cache]): The result cache to use. Defaults to the process-wide search cache.
+            gl (Optional[str]): The country to search from, e.g. "us".
+            hl (Optional[str]): The language of the results, e.g. "en".
+            policy (Optional[UpstreamPolicy]): The resilience policy. Defaults to the process-wide policy for "serper".
         """
-        self.base_url = "https://google.serper.dev/search"
+        serper_base_url = os.getenv("SERPER_BASE_URL") or "https://google.serper.dev"
+        self.base_url = f"{serper_base_url.rstrip('/')}/search"
         self.api_key = api_key or os.getenv("SERPER_API_KEY")
         if not self.api_key:
             raise ValueError(
                 "API key must be provided either as an argument or via the 'SERPER_API_KEY' environment variable."
             )
 
+        self._client = client
+        self.cache = cache if cache is not None else get_search_cache()
+        self.gl = gl
+        self.hl = hl
+        self.policy = policy or get_policy("serper")
         self.logger = setup_logger(__name__)
 
-    def search(self, query: str, max_pages: int = 3) -> list:
+    @property
+    def client(self) -> httpx.Client:
+        """The HTTP client used for requests, shared process-wide by default."""
+        return self._client or get_http_client("serper")
+
+    def _build_headers(self) -> dict:
+        """Build the request headers for the Serper API."""
+        return {
+            "X-API-KEY": self.api_key,
+            "Content-Type": "application/json",
+        }
+
+    def _build_payload(self, query: str, page: int) -> Dict[str, str]:
+        """Build the request body for one result page."""
+        payload = {"q": query, "page": str(page)}
+        if self.gl:
+            payload["gl"] = self.gl
+        if self.hl:
+            payload["hl"] = self.hl
+        return payload
+
+    def _cache_key(self, query: str, page: int) -> str:
+        """Build the cache key of a page from the normalized query and locale."""
+        return "|".join(
+            (normalize_query(query), str(page), self.gl or "", self.hl or "")
+        )
+
+    def _validate_query(self, query: str) -> None:
+        """
+        Reject empty queries before any request is made.
+
+        Raises:
+            ValueError: If the query is empty or invalid.
+        """
+        if not query.strip():
+            self.logger.error("Search query cannot be empty.")
+            raise ValueError("Search query cannot be empty.")
+
+    def _log_request_error(self, error: Exception) -> None:
+        """Log a failed page request; failed pages are skipped, not raised."""
+        if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+            self.logger.warning(f"Skipping Serper request: {error}")
+        elif isinstance(error, httpx.TimeoutException):
+            self.logger.error("The request timed out.")
+        elif isinstance(error, httpx.RequestError):
+            self.logger.error(f"An error occurred while making the request: {error}")
+        elif isinstance(error, ValueError):
+            self.logger.error(f"Error parsing response: {error}")
+        else:
+            self.logger.error(f"An unexpected error occurred: {error}")
+
+    def _post_page(self, query: str, page: int) -> httpx.Response:
+        """Make one request for a result page, raising on an error status."""
+        self.logger.debug(f"Sending request to Serper API: {self.base_url}")
+        response = self.client.post(
+            self.base_url,
+            headers=self._build_headers(),
+            json=self._build_payload(query, page),
+            timeout=self.policy.attempt_timeout(),
+        )
+        response.raise_for_status()
+        return response
+
+    def _log_deadline(self, merger: SearchResultMerger, max_pages: int) -> None:
+        """Log that the deadline cut the fan-out short."""
+        self.logger.warning(
+            f"Search deadline reached with {merger.pages_received} of "
+            f"{max_pages} pages; using the results received so far."
+        )
+
+    def _fetch_page(self, query: str, page: int) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a single result page.
+
+        Transient failures are retried (and slow requests optionally hedged) by
+        the upstream policy; a page that still fails is skipped.
+
+        Args:
+            query (str): The search query string.
+            page (int): The 1-based page number.
+
+        Returns:
+            Optional[Dict[str, Any]]: The compacted page (see `compact_page`), or
+            None if the request failed.
+        """
+        with span("serper.page", page=page) as stage:
+            cache_key = self._cache_key(query, page)
+            cached = self.cache.get(cache_key)
+            stage.set(cache_hit=cached is not None)
+            if cached is not None:
+                self.logger.debug(f"Serving page {page} from the search cache.")
+                return cached
+
+            def download() -> Dict[str, Any]:
+                response = self.policy.call(lambda: self._post_page(query, page))
+                stage.set(bytes_in=len(response.content))
+                self.logger.debug("Request successful, parsing response.")
+                return compact_page(response.json())
+
+            try:
+                # Concurrent searches for the same page share one request.
+                result, shared = _page_flights.do(cache_key, download)
+            except Exception as e:
+                stage.fail(e)
+                self._log_request_error(e)
+                return None
+
+            if shared:
+                stage.set(coalesced=True)
+            else:
+                self.cache.set(cache_key, result)
+            return result
+
+    def _stream_pages(
+        self, query: str, max_pages: int, merger: SearchResultMerger
+    ) -> Iterator[WebResult]:
+        """
+        Request all pages concurrently and yield new results as pages arrive.
+
+        Pages still outstanding when the active deadline passes are abandoned.
+        """
+        executor = ThreadPoolExecutor(
+            max_workers=max_pages, thread_name_prefix="serper-page"
+        )
+        try:
+            # Run each page in a copy of the caller's context so its span joins
+            # the caller's trace.
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run, self._fetch_page, query, page
+                ): page
+                for page in range(1, max_pages + 1)
+            }
+            try:
+                for future in as_completed(futures, timeout=remaining_time()):
+                    response = future.result()
+                    if response is None:
+                        continue
+                    yield from merger.add_page(futures[future], response)
+                    if merger.done:
+                        self.logger.debug("Collected enough results, stopping fan-out.")
+                        break
+            except TimeoutError:
+                self._log_deadline(merger, max_pages)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_results(
+        self, query: str, max_pages: int = 3, max_results: Optional[int] = None
+    ) -> Iterator[WebResult]:
+        """
+        Yield unique organic results as soon as their page arrives.
+
+        Args:
+            query (str): The search query string.
+            max_pages (int): Number of result pages to request concurrently.
+            max_results (Optional[int]): Stop once this many unique results are in hand.
+
+        Yields:
+            WebResult: Organic results in arrival order, deduplicated by URL.
+
+        Raises:
+            ValueError: If the query is empty or invalid.
+        """
+        self._validate_query(query)
+        yield from self._stream_pages(
+            query, max_pages, SearchResultMerger(max_results=max_results)
+        )
+
+    def search(
+        self, query: str, max_pages: int = 3, max_results: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Perform a search query using the Serper API.
 
+        All pages are requested concurrently. Their organic results are merged
+        into one ranked list, deduplicated by normalized URL.
+
         Args:
             query (str): The search query string.
+            max_pages (int): Number of result pages to request concurrently.
+            max_results (Optional[int]): Stop once this many unique results are in hand.
 
         Returns:
-            list: A list of search results.
+            Dict[str, Any]: {"organic": [WebResult, ...]} with the merged results,
+            or an empty dict if every page failed.
 
         Raises:
             ValueError: If the query is empty or invalid.
         """
-        if not query.strip():
-            self.logger.error("Search query cannot be empty.")
-            raise ValueError("Search query cannot be empty.")
+        self._validate_query(query)
+        merger = SearchResultMerger(max_results=max_results)
+        for _ in self._stream_pages(query, max_pages, merger):
+            pass
+        return merger.merged()
 
-        headers = {
-            "X-API-KEY": self.api_key,
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "q": query,
-        }
 
-        results = []
-        for page in range(1, max_pages + 1):
-            payload["page"] = str(page)
-            try:
-                self.logger.debug(f"Sending request to Serper API: {self.base_url}")
-                with httpx.Client() as client:
-                    response = client.post(
-                        self.base_url, headers=headers, json=payload, timeout=10
-                    )
-                response.raise_for_status()
+class AsyncSerperSearchHandler(SerperSearchHandler):
+    """
+    An asyncio variant of the SerperSearchHandler.
+
+    Shares configuration with the synchronous handler but performs requests
+    with `httpx.AsyncClient`, so searches can run concurrently with other
+    retrieval work on the same event loop.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[Cache] = None,
+        gl: Optional[str] = None,
+        hl: Optional[str] = None,
+        policy: Optional[UpstreamPolicy] = None,
+    ) -> None:
+        """
+        Initialize the AsyncSerperSearchHandler with the base API URL and API key.
+
+        Args:
+            api_key (Optional[str]): The API key for the Serper API. If not provided, it will be fetched from the environment variable 'SERPER_API_KEY'.
+            client (Optional[httpx.AsyncClient]): The HTTP client to use. Defaults to the pooled client of the running event loop.
+            cache (Optional[Cache]): The result cache to use. Defaults to the process-wide search cache.
+            gl (Optional[str]): The country to search from, e.g. "us".
+            hl (Optional[str]): The language of the results, e.g. "en".
+            policy (Optional[UpstreamPolicy]): The resilience policy. Defaults to the process-wide policy for "serper".
+        """
+        super().__init__(api_key=api_key, cache=cache, gl=gl, hl=hl, policy=policy)
+        self._async_client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The async HTTP client used for requests on the running event loop."""
+        return self._async_client or get_async_http_client("serper")
+
+    async def _post_page(self, query: str, page: int) -> httpx.Response:
+        """Make one request for a result page, raising on an error status."""
+        self.logger.debug(f"Sending request to Serper API: {self.base_url}")
+        response = await self.client.post(
+            self.base_url,
+            headers=self._build_headers(),
+            json=self._build_payload(query, page),
+            timeout=self.policy.attempt_timeout(),
+        )
+        response.raise_for_status()
+        return response
+
+    async def _fetch_page(self, query: str, page: int) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a single result page without blocking the loop.
+
+        Args:
+            query (str): The search query string.
+            page (int): The 1-based page number.
+
+        Returns:
+            Optional[Dict[str, Any]]: The compacted page (see `compact_page`), or
+            None if the request failed.
+        """
+        with span("serper.page", page=page) as stage:
+            cache_key = self._cache_key(query, page)
+            cached = self.cache.get(cache_key)
+            stage.set(cache_hit=cached is not None)
+            if cached is not None:
+                self.logger.debug(f"Serving page {page} from the search cache.")
+                return cached
+
+            async def download() -> Dict[str, Any]:
+                response = await self.policy.call_async(
+                    lambda: self._post_page(query, page)
+                )
+                stage.set(bytes_in=len(response.content))
                 self.logger.debug("Request successful, parsing response.")
-                return response.json()
-            except httpx.TimeoutException:
-                self.logger.error("The request timed out.")
-            except httpx.RequestError as e:
-                self.logger.error(f"An error occurred while making the request: {e}")
-            except ValueError as e:
-                self.logger.error(f"Error parsing response: {e}")
+                return compact_page(response.json())
+
+            try:
+                result, shared = await _async_page_flights.do(cache_key, download)
             except Exception as e:
-                self.logger.error(f"An unexpected error occurred: {e}")
+                stage.fail(e)
+                self._log_request_error(e)
+                return None
+
+            if shared:
+                stage.set(coalesced=True)
+            else:
+                self.cache.set(cache_key, result)
+            return result
+
+    async def _stream_pages(
+        self, query: str, max_pages: int, merger: SearchResultMerger
+    ) -> AsyncIterator[WebResult]:
+        """
+        Request all pages concurrently and yield new results as pages arrive.
+
+        Pages still outstanding when the active deadline passes are cancelled.
+        """
+
+        async def fetch(page: int) -> Tuple[int, Optional[Dict[str, Any]]]:
+            return page, await self._fetch_page(query, page)
+
+        tasks = [
+            asyncio.ensure_future(fetch(page)) for page in range(1, max_pages + 1)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=remaining_time()):
+                try:
+                    page, response = await next_done
+                except TimeoutError:
+                    self._log_deadline(merger, max_pages)
+                    break
+                if response is None:
+                    continue
+                for result in merger.add_page(page, response):
+                    yield result
+                if merger.done:
+                    self.logger.debug("Collected enough results, stopping fan-out.")
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def iter_results(
+        self, query: str, max_pages: int = 3, max_results: Optional[int] = None
+    ) -> AsyncIterator[WebResult]:
+        """
+        Yield unique organic results as soon as their page arrives.
+
+        Args:
+            query (str): The search query string.
+            max_pages (int): Number of result pages to request concurrently.
+            max_results (Optional[int]): Stop once this many unique results are in hand.
+
+        Yields:
+            WebResult: Organic results in arrival order, deduplicated by URL.
 
-        return results
+        Raises:
+            ValueError: If the query is empty or invalid.
+        """
+        self._validate_query(query)
+        merger = SearchResultMerger(max_results=max_results)
+        async for result in self._stream_pages(query, max_pages, merger):
+            yield result
+
+    async def search(
+        self, query: str, max_pages: int = 3, max_results: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Perform a search query using the Serper API without blocking the loop.
+
+        Args:
+            query (str): The search query string.
+            max_pages (int): Number of result pages to request concurrently.
+            max_results (Optional[int]): Stop once this many unique results are in hand.
+
+        Returns:
+            Dict[str, Any]: {"organic": [WebResult, ...]} with the merged results,
+            or an empty dict if every page failed.
+
+        Raises:
+            ValueError: If the query is empty or invalid.
+        """
+        self._validate_query(query)
+        merger = SearchResultMerger(max_results=max_results)
+        async for _ in self._stream_pages(query, max_pages, merger):
+            pass
+        return merger.merged()
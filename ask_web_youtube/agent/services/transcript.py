@@ -0,0 +1,184 @@
+"""
+Transcript module.
+
+A video transcript has thousands of short segments. Keeping each one as a
+Python dict costs far more memory than its text, so `Transcript` stores them
+column-wise instead: the segment texts joined into one string with an index of
+end offsets, and the start times and durations as contiguous arrays of doubles.
+The same columns are what the TranscriptStore persists, so loading a stored
+transcript does not rebuild per-segment objects.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterable, Iterator, List, Mapping, NamedTuple, Tuple
+
+
+class Segment(NamedTuple):
+    """A single transcript segment."""
+
+    text: str
+    start: float
+    duration: float
+
+
+class Transcript:
+    """
+    A column-oriented, immutable video transcript.
+
+    Segments are expected in increasing start time order, as returned by the
+    transcript API.
+
+    Attributes:
+        text (str): The segment texts joined together.
+        ends (array): The end offset of each segment in `text` ('I' array).
+        starts (array): The start time of each segment in seconds ('d' array).
+        durations (array): The duration of each segment in seconds ('d' array).
+    """
+
+    __slots__ = ("text", "ends", "starts", "durations")
+
+    def __init__(self, text: str, ends: array, starts: array, durations: array) -> None:
+        """Wrap already built columns; use `from_segments` to build them."""
+        if not len(ends) == len(starts) == len(durations):
+            raise ValueError("Transcript columns must have the same length.")
+        self.text = text
+        self.ends = ends
+        self.starts = starts
+        self.durations = durations
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Mapping[str, Any]]) -> "Transcript":
+        """
+        Build a transcript from segment mappings.
+
+        Args:
+            segments (Iterable[Mapping[str, Any]]): Segments with text, start and
+                duration, as returned by youtube_transcript_api.
+
+        Returns:
+            Transcript: The column-oriented transcript.
+        """
+        texts = []
+        ends = array("I")
+        starts = array("d")
+        durations = array("d")
+        position = 0
+        for segment in segments:
+            text = segment["text"]
+            texts.append(text)
+            position += len(text)
+            ends.append(position)
+            starts.append(float(segment["start"]))
+            durations.append(float(segment["duration"]))
+        return cls("".join(texts), ends, starts, durations)
+
+    def __len__(self) -> int:
+        """Return the number of segments."""
+        return len(self.ends)
+
+    def _text_at(self, index: int) -> str:
+        """Return the text of the segment at a (non-negative) index."""
+        begin = self.ends[index - 1] if index else 0
+        return self.text[begin : self.ends[index]]
+
+    def __getitem__(self, index: int) -> Segment:
+        """Return the segment at an index."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Transcript segment index out of range.")
+        return Segment(self._text_at(index), self.starts[index], self.durations[index])
+
+    def __iter__(self) -> Iterator[Segment]:
+        """Iterate over the segments."""
+        for index in range(len(self)):
+            yield Segment(self._text_at(index), self.starts[index], self.durations[index])
+
+    def __eq__(self, other: object) -> bool:
+        """Return True if both transcripts hold the same segments."""
+        if not isinstance(other, Transcript):
+            return NotImplemented
+        return (
+            self.text == other.text
+            and self.ends == other.ends
+            and self.starts == other.starts
+            and self.durations == other.durations
+        )
+
+    def __repr__(self) -> str:
+        """Return a short description of the transcript."""
+        return f"Transcript(segments={len(self)}, duration={self.duration:.1f}s)"
+
+    @property
+    def duration(self) -> float:
+        """The total duration of the segments in seconds."""
+        return sum(self.durations)
+
+    def to_segments(self) -> List[dict]:
+        """Return the segments as dicts, the shape used by the transcript API."""
+        return [segment._asdict() for segment in self]
+
+    def slice(self, start: float, end: float) -> "Transcript":
+        """
+        Return the segments starting within a time range.
+
+        Args:
+            start (float): The range start in seconds (inclusive).
+            end (float): The range end in seconds (exclusive).
+
+        Returns:
+            Transcript: A transcript holding only the matching segments.
+        """
+        first = bisect_left(self.starts, start)
+        last = bisect_left(self.starts, end, lo=first)
+        offset = self.ends[first - 1] if first else 0
+        ends = array("I", (value - offset for value in self.ends[first:last]))
+        text_end = self.ends[last - 1] if last > first else offset
+        return Transcript(
+            self.text[offset:text_end],
+            ends,
+            self.starts[first:last],
+            self.durations[first:last],
+        )
+
+    def chunks(self, window_seconds: float = 60.0) -> List[Tuple[int, str]]:
+        """
+        Group consecutive segments into time windows.
+
+        Args:
+            window_seconds (float): The length of each window in seconds.
+
+        Returns:
+            List[Tuple[int, str]]: The start (whole seconds) of each window's first
+            segment and the window's segment texts joined by spaces.
+        """
+        chunks = []
+        first = 0
+        count = len(self)
+        while first < count:
+            window_start = self.starts[first]
+            last = bisect_left(self.starts, window_start + window_seconds, lo=first + 1)
+            texts = [self._text_at(index).strip() for index in range(first, last)]
+            text = " ".join(text for text in texts if text)
+            if text:
+                chunks.append((int(window_start), text))
+            first = last
+        return chunks
+
+    def to_prompt(self, window_seconds: float = 60.0) -> str:
+        """
+        Serialize the transcript compactly for an LLM prompt.
+
+        Each window becomes one line prefixed with its start time in seconds,
+        which is what `?t=` citation links need, e.g. "[120] some text".
+
+        Args:
+            window_seconds (float): The length of each window in seconds.
+
+        Returns:
+            str: The serialized transcript.
+        """
+        return "\n".join(
+            f"[{start}] {text}" for start, text in self.chunks(window_seconds)
+        )
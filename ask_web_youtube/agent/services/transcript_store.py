@@ -0,0 +1,272 @@
+"""
+Persistent transcript store module.
+
+Transcripts are effectively immutable, so once fetched they are kept in a
+local SQLite database keyed by video_id. Each row stores the columns of a
+Transcript: the joined segment texts as a zlib-compressed buffer, its offset
+index, and the start/duration values as packed arrays of doubles, which keeps
+rows compact and decoding cheap.
+
+Videos without transcripts are negatively cached with their own TTL, and the
+store evicts least recently used transcripts once it grows past its size limit.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from typing import Any, Dict, Optional
+
+from agent.services.transcript import Transcript
+from utils.log_config import setup_logger
+
+# Returned by TranscriptStore.get for videos known to have no transcript.
+TRANSCRIPT_UNAVAILABLE = object()
+
+_STATUS_AVAILABLE = 1
+_STATUS_UNAVAILABLE = 0
+
+# Reads refresh a row's LRU timestamp at most this often (in seconds), so hot
+# transcripts are not rewritten on every lookup.
+_TOUCH_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    video_id TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    text BLOB,
+    offsets BLOB,
+    starts BLOB,
+    durations BLOB,
+    size INTEGER NOT NULL DEFAULT 0,
+    expires_at REAL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_last_access ON transcripts (last_access);
+"""
+
+
+class TranscriptStore:
+    """
+    A SQLite-backed, size-bounded LRU store for YouTube transcripts.
+
+    Attributes:
+        path (str): The path of the SQLite database file.
+        max_bytes (int): The total stored size above which LRU eviction starts.
+        negative_ttl (float): Seconds a "no transcript" entry stays valid.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        negative_ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Open (or create) a transcript store.
+
+        Args:
+            path (Optional[str]): The database path. Defaults to the environment
+                variable 'TRANSCRIPT_STORE_PATH' or "transcripts.db".
+            max_bytes (Optional[int]): The size limit in bytes. Defaults to the
+                environment variable 'TRANSCRIPT_STORE_MAX_BYTES' or 256 MiB.
+            negative_ttl (Optional[float]): The TTL for missing transcripts. Defaults
+                to the environment variable 'TRANSCRIPT_STORE_NEGATIVE_TTL' or one day.
+        """
+        self.path = path or os.getenv("TRANSCRIPT_STORE_PATH", "transcripts.db")
+        self.max_bytes = int(
+            max_bytes
+            if max_bytes is not None
+            else os.getenv("TRANSCRIPT_STORE_MAX_BYTES", str(256 * 1024 * 1024))
+        )
+        self.negative_ttl = float(
+            negative_ttl
+            if negative_ttl is not None
+            else os.getenv("TRANSCRIPT_STORE_NEGATIVE_TTL", str(24 * 60 * 60))
+        )
+        self.logger = setup_logger(__name__)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM transcripts"
+        ).fetchone()[0]
+
+    @staticmethod
+    def _encode(transcript: Transcript) -> Dict[str, bytes]:
+        """Pack a transcript's columns for storage."""
+        return {
+            "text": zlib.compress(transcript.text.encode("utf-8")),
+            "offsets": transcript.ends.tobytes(),
+            "starts": transcript.starts.tobytes(),
+            "durations": transcript.durations.tobytes(),
+        }
+
+    @staticmethod
+    def _decode(
+        text: bytes, offsets: bytes, starts: bytes, durations: bytes
+    ) -> Transcript:
+        """Rebuild a transcript from the stored columns."""
+        ends = array("I")
+        ends.frombytes(offsets)
+        start_values = array("d")
+        start_values.frombytes(starts)
+        duration_values = array("d")
+        duration_values.frombytes(durations)
+        return Transcript(
+            zlib.decompress(text).decode("utf-8"), ends, start_values, duration_values
+        )
+
+    def get(self, video_id: str) -> Any:
+        """
+        Look up a transcript.
+
+        Args:
+            video_id (str): The ID of the video.
+
+        Returns:
+            Any: The Transcript on a hit, TRANSCRIPT_UNAVAILABLE if the
+            video is known to have no transcript, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, text, offsets, starts, durations, expires_at, last_access"
+                " FROM transcripts WHERE video_id = ?",
+                (video_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            status, text, offsets, starts, durations, expires_at, last_access = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute(
+                    "DELETE FROM transcripts WHERE video_id = ?", (video_id,)
+                )
+                return None
+            if now - last_access >= _TOUCH_INTERVAL:
+                self._conn.execute(
+                    "UPDATE transcripts SET last_access = ? WHERE video_id = ?",
+                    (now, video_id),
+                )
+
+        if status == _STATUS_UNAVAILABLE:
+            return TRANSCRIPT_UNAVAILABLE
+        return self._decode(text, offsets, starts, durations)
+
+    def put(self, video_id: str, transcript: Transcript) -> None:
+        """
+        Store the transcript of a video.
+
+        Args:
+            video_id (str): The ID of the video.
+            transcript (Transcript): The transcript to store.
+        """
+        columns = self._encode(transcript)
+        size = sum(len(value) for value in columns.values())
+        self._write(
+            video_id, _STATUS_AVAILABLE, columns, size=size, expires_at=None
+        )
+
+    def put_unavailable(self, video_id: str) -> None:
+        """
+        Record that a video has no transcript, for `negative_ttl` seconds.
+
+        A `negative_ttl` of 0 turns negative caching off.
+
+        Args:
+            video_id (str): The ID of the video.
+        """
+        if self.negative_ttl <= 0:
+            return
+        columns = {"text": None, "offsets": None, "starts": None, "durations": None}
+        self._write(
+            video_id,
+            _STATUS_UNAVAILABLE,
+            columns,
+            size=0,
+            expires_at=time.time() + self.negative_ttl,
+        )
+
+    def _write(
+        self,
+        video_id: str,
+        status: int,
+        columns: Dict[str, Optional[bytes]],
+        size: int,
+        expires_at: Optional[float],
+    ) -> None:
+        """Insert or replace a row and keep the store within its size limit."""
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM transcripts WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts"
+                " (video_id, status, text, offsets, starts, durations, size,"
+                " expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    video_id,
+                    status,
+                    columns["text"],
+                    columns["offsets"],
+                    columns["starts"],
+                    columns["durations"],
+                    size,
+                    expires_at,
+                    time.time(),
+                ),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used rows until the store is at 90% of its limit."""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT video_id, size FROM transcripts ORDER BY last_access"
+        )
+        evicted = []
+        for video_id, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((video_id,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM transcripts WHERE video_id = ?", evicted)
+        self.logger.info(f"Evicted {len(evicted)} transcripts from the store.")
+
+    @property
+    def total_bytes(self) -> int:
+        """The total size of the stored transcript columns in bytes."""
+        with self._lock:
+            return self._total_bytes
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[TranscriptStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    """
+    Return the process-wide transcript store, opening it on first use.
+
+    Returns:
+        TranscriptStore: The shared store configured from the environment.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = TranscriptStore()
+        return _default_store
@@ -0,0 +1,201 @@
+"""
+Compact web search result module.
+
+A Serper page carries far more than the answer ever cites: knowledge graphs,
+"people also ask" boxes, sitelinks, image URLs and per-result attributes. Only
+the fields of `WebResult` are kept from each organic result, as soon as a page
+is parsed, and stored in slots rather than a dict. Results stay readable like
+the dicts they replace (`result["link"]`, `result.get("date")`), listing only
+the fields that are set.
+
+For the prompt, `render_web_results` writes a projection of the results as
+numbered plain-text blocks instead of JSON, which spends no tokens on quotes,
+braces and repeated key names:
+
+    1. Python (Programming Language) (Apr 1, 2024)
+    https://python.org
+    Python is a programming language that lets you work quickly...
+"""
+
+from collections.abc import Mapping
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Every field a result can hold, and the default projection for prompts.
+WEB_RESULT_FIELDS = ("title", "link", "snippet", "date", "position")
+
+
+def parse_fields(value: Union[str, Sequence[str], None]) -> Tuple[str, ...]:
+    """
+    Parse a projection such as "title,link,snippet" or ["title", "link"].
+
+    Args:
+        value (Union[str, Sequence[str], None]): The fields, comma-separated or
+            as a sequence. None or empty means all of them.
+
+    Returns:
+        Tuple[str, ...]: The fields, in the given order.
+
+    Raises:
+        ValueError: If a field is unknown.
+    """
+    if not value:
+        return WEB_RESULT_FIELDS
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = tuple(field.strip() for field in value if field.strip())
+    unknown = [field for field in fields if field not in WEB_RESULT_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Unknown web result fields {unknown}; use {', '.join(WEB_RESULT_FIELDS)}."
+        )
+    return fields
+
+
+class WebResult(Mapping):
+    """
+    One organic web search result, reduced to the fields answers can cite.
+
+    Attributes:
+        title (str): The page title.
+        link (str): The URL.
+        snippet (str): The text excerpt shown by the search engine.
+        date (Optional[str]): The publication date, if the engine shows one.
+        position (Optional[int]): The 1-based rank in the results.
+    """
+
+    __slots__ = WEB_RESULT_FIELDS
+
+    def __init__(
+        self,
+        title: str = "",
+        link: str = "",
+        snippet: str = "",
+        date: Optional[str] = None,
+        position: Optional[int] = None,
+    ) -> None:
+        """Initialize a result; use `from_organic` to build one from Serper JSON."""
+        self.title = title
+        self.link = link
+        self.snippet = snippet
+        self.date = date
+        self.position = position
+
+    @classmethod
+    def from_organic(cls, result: Any) -> "WebResult":
+        """
+        Project an organic result, dropping every field that is not kept.
+
+        Args:
+            result (Any): A Serper organic result (or any mapping with its keys).
+
+        Returns:
+            WebResult: The compact result; an existing WebResult is returned as is.
+        """
+        if isinstance(result, WebResult):
+            return result
+        position = result.get("position")
+        return cls(
+            title=result.get("title") or "",
+            link=result.get("link") or "",
+            snippet=result.get("snippet") or "",
+            date=result.get("date") or None,
+            position=int(position) if position is not None else None,
+        )
+
+    def with_position(self, position: int) -> "WebResult":
+        """Return a copy ranked at another position."""
+        return WebResult(self.title, self.link, self.snippet, self.date, position)
+
+    def _is_set(self, field: str) -> bool:
+        """Whether a field holds a value worth showing."""
+        value = getattr(self, field)
+        return value is not None and value != ""
+
+    def __getitem__(self, field: str) -> Any:
+        """Return a field that is set, like a dict lookup."""
+        if field not in WEB_RESULT_FIELDS or not self._is_set(field):
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names of the fields that are set."""
+        return (field for field in WEB_RESULT_FIELDS if self._is_set(field))
+
+    def __len__(self) -> int:
+        """Return the number of fields that are set."""
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        """Show the set fields."""
+        return f"WebResult({dict(self)!r})"
+
+    def project(self, fields: Sequence[str] = WEB_RESULT_FIELDS) -> dict:
+        """
+        Return the set fields among `fields` as a plain dict, e.g. for JSON.
+
+        Args:
+            fields (Sequence[str]): The fields to keep, in order.
+
+        Returns:
+            dict: The projection.
+        """
+        return {field: getattr(self, field) for field in fields if self._is_set(field)}
+
+    def to_prompt(self, fields: Sequence[str] = WEB_RESULT_FIELDS) -> str:
+        """
+        Serialize the result compactly for an LLM prompt.
+
+        The position (if projected) numbers the block, title and date share
+        its first line, and link and snippet follow on their own lines.
+
+        Args:
+            fields (Sequence[str]): The fields to include.
+
+        Returns:
+            str: The result's block, without a trailing newline.
+        """
+        head = []
+        if "position" in fields and self.position is not None:
+            head.append(f"{self.position}.")
+        if "title" in fields and self.title:
+            head.append(self.title)
+        if "date" in fields and self.date:
+            head.append(f"({self.date})")
+        lines = [" ".join(head)] if head else []
+        for field in ("link", "snippet"):
+            if field in fields and getattr(self, field):
+                lines.append(getattr(self, field))
+        return "\n".join(lines)
+
+
+def to_web_results(web_results: Any) -> List[WebResult]:
+    """
+    Collect the results of a search response or list as WebResult objects.
+
+    Args:
+        web_results (Any): A Serper-shaped response with "organic" results, or
+            a list of results.
+
+    Returns:
+        List[WebResult]: The results, in order.
+    """
+    if isinstance(web_results, Mapping):
+        web_results = web_results.get("organic", [])
+    return [WebResult.from_organic(result) for result in web_results or []]
+
+
+def render_web_results(
+    results: Iterable[Any], fields: Sequence[str] = WEB_RESULT_FIELDS
+) -> str:
+    """
+    Serialize web results compactly for an LLM prompt.
+
+    Args:
+        results (Iterable[Any]): WebResult objects or Serper organic results.
+        fields (Sequence[str]): The projection to include.
+
+    Returns:
+        str: One block per result, separated by blank lines.
+    """
+    blocks = (WebResult.from_organic(result).to_prompt(fields) for result in results)
+    return "\n\n".join(block for block in blocks if block)
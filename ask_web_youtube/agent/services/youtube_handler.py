@@ -5,15 +5,49 @@ Fetches videos via YouTube API and retrieves captions with timestamps using
 the youtube_transcript_api for public videos.
 """
 
+import asyncio
+import contextvars
+import threading
+import httplib2
 import isodate
-from typing import List, Dict, Any
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import os
 from youtube_transcript_api._errors import NoTranscriptFound, TranscriptsDisabled
 from youtube_transcript_api._api import YouTubeTranscriptApi
 
+from agent.services.transcript import Transcript
+from agent.services.transcript_store import (
+    TRANSCRIPT_UNAVAILABLE,
+    TranscriptStore,
+    get_transcript_store,
+)
+from utils.cache import TTLCache, normalize_query
+from utils.deadline import DeadlineExceeded, current_deadline
 from utils.log_config import setup_logger
+from utils.metrics import span
+from utils.resilience import CircuitOpenError, UpstreamPolicy, get_policy
+from utils.single_flight import SingleFlight
+
+# videos().list accepts at most 50 comma-separated IDs per call.
+VIDEOS_LIST_BATCH_SIZE = 50
+
+# YouTube Data API quota units charged per call (the default quota is 10,000
+# units a day, so searches dominate it).
+SEARCH_LIST_COST = 100
+VIDEOS_LIST_COST = 1
+
+# Video metadata (such as duration) is effectively immutable, so it is cached
+# process-wide and shared by every handler instance.
+_video_metadata_cache = TTLCache(maxsize=10_000)
+
+# Searches and transcript downloads in flight, so that concurrent sessions asking
+# the same question make one set of calls. The groups are module-wide but keyed
+# by handler, since handlers differ in API key, transcript fetcher and store.
+_search_flights = SingleFlight("youtube.search")
+_transcript_flights = SingleFlight("youtube.transcript")
 
 
 class YouTubeHandler:
@@ -21,107 +55,385 @@ class YouTubeHandler:
 
     from typing import Optional
 
-    def __init__(self, api_key: Optional[str] = None) -> None:
-        """Initialize the YouTubeHandler with the provided API key or from environment variable."""
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        probe_width: int = 6,
+        transcript_store: Optional[TranscriptStore] = None,
+        transcript_fetcher: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+        policy: Optional[UpstreamPolicy] = None,
+    ) -> None:
+        """
+        Initialize the YouTubeHandler with the provided API key or from environment variable.
+
+        :param api_key: The YouTube Data API key. Defaults to 'YOUTUBE_DATA_API_KEY'.
+        :param probe_width: Maximum number of transcript requests kept in flight.
+        :param transcript_store: The persistent transcript cache. Defaults to the
+            process-wide store.
+        :param transcript_fetcher: Returns the raw segments of a video and raises
+            TranscriptsDisabled/NoTranscriptFound when it has none. Defaults to
+            `YouTubeTranscriptApi.get_transcript`.
+        :param policy: Timeout, retries, hedging and circuit breaker for YouTube
+            Data API calls. Defaults to the process-wide policy for "youtube".
+        """
         self.api_key = api_key or os.getenv("YOUTUBE_DATA_API_KEY")
         if not self.api_key:
             raise ValueError(
                 "API key must be provided or set in the environment variable 'YOUTUBE_DATA_API_KEY'."
             )
-        self.youtube = build("youtube", "v3", developerKey=self.api_key)
+        self._youtube = None
+        self._clients = threading.local()
+        self._transcript_fetcher = transcript_fetcher
+        self.probe_width = max(1, probe_width)
+        self._transcript_store = transcript_store
+        self.policy = policy or get_policy("youtube")
         self.logger = setup_logger(__name__)
 
+    @property
+    def youtube(self) -> Any:
+        """
+        The YouTube Data API client, built on first use in each thread.
+
+        The underlying httplib2 connection is not thread-safe, and searches and
+        video lookups run on worker threads, so every thread gets its own
+        client. The discovery document bundled with google-api-python-client is
+        used, so building a client does not fetch it over the network. Requests
+        go to 'YOUTUBE_API_BASE_URL' if set (e.g. a local stand-in for benchmarks).
+        """
+        if self._youtube is not None:
+            return self._youtube
+        client = getattr(self._clients, "youtube", None)
+        if client is None:
+            api_endpoint = os.getenv("YOUTUBE_API_BASE_URL")
+            client = build(
+                "youtube",
+                "v3",
+                developerKey=self.api_key,
+                # httplib2 waits forever unless given a timeout.
+                http=httplib2.Http(timeout=self.policy.timeout),
+                static_discovery=True,
+                cache_discovery=False,
+                client_options={"api_endpoint": api_endpoint} if api_endpoint else None,
+            )
+            self._clients.youtube = client
+        return client
+
+    @youtube.setter
+    def youtube(self, client: Any) -> None:
+        """Replace the API client for every thread, e.g. with a preconfigured one."""
+        self._youtube = client
+
+    def _fetch_video_metadata(
+        self, video_ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolve video metadata for many videos with as few API calls as possible.
+
+        Cached videos are served from the process-wide metadata cache. The rest
+        are requested in batches of up to 50 comma-joined IDs per
+        `videos().list` call.
+
+        :param video_ids: The IDs of the videos to look up.
+        :return: A mapping of video ID to metadata (currently the duration in seconds).
+        """
+        metadata: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for video_id in dict.fromkeys(video_ids):
+            cached = _video_metadata_cache.get(video_id)
+            if cached is None:
+                missing.append(video_id)
+            else:
+                metadata[video_id] = cached
+
+        for start in range(0, len(missing), VIDEOS_LIST_BATCH_SIZE):
+            batch = missing[start : start + VIDEOS_LIST_BATCH_SIZE]
+            with span("youtube.videos_list", ids=len(batch)) as stage:
+                try:
+                    video_response = self.policy.call(
+                        lambda: self.youtube.videos()
+                        .list(
+                            part="contentDetails",
+                            id=",".join(batch),
+                            maxResults=len(batch),
+                        )
+                        .execute(),
+                        cost=VIDEOS_LIST_COST,
+                    )
+                except Exception as e:
+                    stage.fail(e)
+                    self.logger.warning(f"Could not fetch durations for {batch}: {e}")
+                    continue
+
+            for item in video_response.get("items", []):
+                try:
+                    duration = isodate.parse_duration(
+                        item["contentDetails"]["duration"]
+                    ).total_seconds()
+                except Exception as e:
+                    self.logger.warning(
+                        f"Could not parse duration for {item.get('id')}: {e}"
+                    )
+                    continue
+                metadata[item["id"]] = {"duration": duration}
+                _video_metadata_cache.set(item["id"], metadata[item["id"]])
+
+        return metadata
+
+    @property
+    def transcript_store(self) -> TranscriptStore:
+        """The persistent transcript cache used before calling the transcript API."""
+        return self._transcript_store or get_transcript_store()
+
+    def _fetch_transcript(self, video_id: str) -> Optional[Transcript]:
+        """
+        Fetch the transcript of a single video.
+
+        The persistent store is consulted first; on a miss the transcript API is
+        called and its answer, including "no transcript", is stored.
+
+        :param video_id: The ID of the video.
+        :return: The transcript, or None if the video has no transcript.
+        """
+        with span("youtube.transcript") as stage:
+            stored = self.transcript_store.get(video_id)
+            stage.set(cache_hit=stored is not None)
+            if stored is TRANSCRIPT_UNAVAILABLE:
+                self.logger.info(f"No transcript for: {video_id} (cached)")
+                return None
+            if stored is not None:
+                stage.set(segments=len(stored))
+                return stored
+
+            def download() -> Optional[Transcript]:
+                try:
+                    fetch = (
+                        self._transcript_fetcher or YouTubeTranscriptApi.get_transcript
+                    )
+                    transcript = Transcript.from_segments(fetch(video_id))
+                except (TranscriptsDisabled, NoTranscriptFound):
+                    self.logger.info(f"No transcript for: {video_id}")
+                    self.transcript_store.put_unavailable(video_id)
+                    return None
+                stage.set(bytes_in=len(transcript.text))
+                self.transcript_store.put(video_id, transcript)
+                return transcript
+
+            transcript, shared = _transcript_flights.do((id(self), video_id), download)
+            if shared:
+                stage.set(coalesced=True)
+            if transcript is not None:
+                stage.set(segments=len(transcript))
+            return transcript
+
+    def _probe_transcripts(
+        self, candidates: List[Dict[str, Any]], max_results: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch transcripts for the leading candidates in parallel.
+
+        Up to `probe_width` transcript requests are kept in flight. Results are
+        accepted strictly in candidate order, so the returned videos are the
+        first `max_results` candidates that have a transcript. Once they are
+        known, queued probes are cancelled and running stragglers are ignored.
+        The same happens when the active deadline passes: the videos accepted
+        so far are returned.
+
+        :param candidates: Videos sorted by preference (shortest first).
+        :param max_results: Number of videos with transcripts to return.
+        :return: Up to `max_results` videos with their transcripts attached.
+        """
+        if not candidates or max_results <= 0:
+            return []
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.probe_width, len(candidates)),
+            thread_name_prefix="transcript-probe",
+        )
+        futures: Dict[int, Future] = {}
+        outcomes: Dict[int, Optional[List[Dict[str, Any]]]] = {}
+        next_to_submit = 0
+        next_to_accept = 0
+        results: List[Dict[str, Any]] = []
+        deadline = current_deadline()
+
+        def submit_next() -> None:
+            nonlocal next_to_submit
+            if next_to_submit < len(candidates):
+                video_id = candidates[next_to_submit]["video_id"]
+                # Copy the caller's context so the probe's span joins its trace.
+                futures[next_to_submit] = executor.submit(
+                    contextvars.copy_context().run, self._fetch_transcript, video_id
+                )
+                next_to_submit += 1
+
+        try:
+            for _ in range(self.probe_width):
+                submit_next()
+
+            while len(results) < max_results and next_to_accept < len(candidates):
+                pending = [
+                    future
+                    for index, future in futures.items()
+                    if index not in outcomes
+                ]
+                done, _ = wait(
+                    pending,
+                    timeout=deadline.remaining() if deadline is not None else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                if not done:
+                    self.logger.warning(
+                        f"Transcript deadline reached with {len(results)} of "
+                        f"{max_results} videos; using those."
+                    )
+                    break
+                for index, future in list(futures.items()):
+                    if future not in done:
+                        continue
+                    video = candidates[index]
+                    try:
+                        outcomes[index] = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Transcript error for {video['title']}: {e}")
+                        outcomes[index] = None
+                    submit_next()
+
+                # Accept finished probes in candidate order to keep the ranking.
+                while next_to_accept in outcomes and len(results) < max_results:
+                    transcript = outcomes.pop(next_to_accept)
+                    futures.pop(next_to_accept)
+                    if transcript is not None:
+                        video = candidates[next_to_accept]
+                        video["transcript"] = transcript
+                        video["transcripts_available"] = True
+                        video["duration"] = transcript.duration
+                        results.append(video)
+                    next_to_accept += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
     def fetch_videos(
         self, query: str, max_results: int = 2, include_transcripts: bool = True
     ) -> List[Dict[str, Any]]:
         """
         Fetch videos from YouTube API. Sort by duration and select up to `max_results` videos that have transcripts if requested.
 
+        Concurrent calls on this handler for the same normalized query share
+        one search.
+
         :param query: Search query string.
         :param max_results: Number of results to return.
         :param include_transcripts: Whether to include transcripts.
         :return: List of video details.
         """
+        key = (id(self), normalize_query(query), max_results, include_transcripts)
+        try:
+            videos, _ = _search_flights.do(
+                key,
+                lambda: self._search_videos(query, max_results, include_transcripts),
+            )
+        except DeadlineExceeded as e:
+            self.logger.warning(f"Skipping YouTube search: {e}")
+            return []
+        # Each caller gets its own dicts, so sharing is invisible to it.
+        return [dict(video) for video in videos]
+
+    def _search_videos(
+        self, query: str, max_results: int, include_transcripts: bool
+    ) -> List[Dict[str, Any]]:
+        """
+        Search videos, rank them by duration and attach transcripts.
+
+        :param query: Search query string.
+        :param max_results: Number of results to return.
+        :param include_transcripts: Whether to include transcripts.
+        :return: List of video details, empty if the search failed.
+        """
         try:
             self.logger.info(f"Fetching results for query: '{query}'")
 
             # Step 1: Search videos
-            search_response = (
-                self.youtube.search()
-                .list(
-                    q=query,
-                    part="id,snippet",
-                    maxResults=max_results * 10,
-                    type="video",
+            with span("youtube.search"):
+                search_response = self.policy.call(
+                    lambda: self.youtube.search()
+                    .list(
+                        q=query,
+                        part="id,snippet",
+                        maxResults=max_results * 10,
+                        type="video",
+                    )
+                    .execute(),
+                    cost=SEARCH_LIST_COST,
                 )
-                .execute()
-            )
 
             # Step 2: Collect video IDs and titles
-            candidates: List[Dict[str, Any]] = []
-            for item in search_response.get("items", []):
-                video_id = item["id"]["videoId"]
-                title = item["snippet"]["title"]
-                self.logger.info(f"Found video: {title} (ID: {video_id})")
-
-                # Fetch duration
-                try:
-                    video_response = (
-                        self.youtube.videos()
-                        .list(part="contentDetails", id=video_id)
-                        .execute()
-                    )
-                    iso_duration = video_response["items"][0]["contentDetails"][
-                        "duration"
-                    ]
-                    duration = isodate.parse_duration(iso_duration).total_seconds()
-                except Exception as e:
-                    self.logger.warning(f"Could not fetch duration for {video_id}: {e}")
-                    duration = float("inf")
-
-                candidates.append(
-                    {
-                        "video_id": video_id,
-                        "title": title,
-                        "duration": duration,
-                    }
+            items = search_response.get("items", [])
+            for item in items:
+                self.logger.info(
+                    f"Found video: {item['snippet']['title']} (ID: {item['id']['videoId']})"
                 )
 
+            # Fetch durations in bulk
+            metadata = self._fetch_video_metadata(
+                [item["id"]["videoId"] for item in items]
+            )
+            candidates: List[Dict[str, Any]] = [
+                {
+                    "video_id": item["id"]["videoId"],
+                    "title": item["snippet"]["title"],
+                    "duration": metadata.get(item["id"]["videoId"], {}).get(
+                        "duration", float("inf")
+                    ),
+                }
+                for item in items
+            ]
+
             # Step 3: Sort by duration
             sorted_candidates = sorted(candidates, key=lambda x: x["duration"])
 
             # Step 4: Collect results with/without transcripts
-            results: List[Dict[str, Any]] = []
-            index = 0
-
-            while len(results) < max_results and index < len(sorted_candidates):
-                video = sorted_candidates[index]
-                index += 1
-
-                if include_transcripts:
-                    try:
-                        transcript = YouTubeTranscriptApi.get_transcript(
-                            video["video_id"]
-                        )
-                        video["transcript"] = transcript
-                        video["transcripts_available"] = True
-                        video["duration"] = sum(
-                            segment["duration"] for segment in transcript
-                        )
-                        results.append(video)
-                    except (TranscriptsDisabled, NoTranscriptFound):
-                        self.logger.info(f"No transcript for: {video['title']}")
-                    except Exception as e:
-                        self.logger.error(f"Transcript error for {video['title']}: {e}")
-                else:
+            if include_transcripts:
+                results = self._probe_transcripts(sorted_candidates, max_results)
+            else:
+                results = []
+                for video in sorted_candidates[:max_results]:
                     video["transcripts_available"] = False
                     results.append(video)
 
             return results
 
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            self.logger.warning(f"Skipping YouTube search: {e}")
         except HttpError as e:
             self.logger.error(f"HTTP error: {e}")
         except Exception as e:
             self.logger.error(f"Unexpected error: {e}")
 
         return []
+
+
+class AsyncYouTubeHandler(YouTubeHandler):
+    """
+    An asyncio variant of the YouTubeHandler.
+
+    The Google API client and youtube_transcript_api are blocking libraries, so
+    the work is delegated to a worker thread. This keeps the event loop free to
+    run web search and other retrieval concurrently.
+    """
+
+    async def fetch_videos(
+        self, query: str, max_results: int = 2, include_transcripts: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch videos from YouTube API without blocking the event loop.
+
+        :param query: Search query string.
+        :param max_results: Number of results to return.
+        :param include_transcripts: Whether to include transcripts.
+        :return: List of video details.
+        """
+        return await asyncio.to_thread(
+            super().fetch_videos, query, max_results, include_transcripts
+        )
@@ -0,0 +1,559 @@
+"""
+Headless HTTP API for the agent, served by any ASGI server.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Routes:
+
+    POST /v1/answer          Answer a question; the response is JSON.
+    POST /v1/answer/stream   Answer a question as server-sent events.
+    GET  /healthz            Liveness: the process is serving requests.
+    GET  /readyz             Readiness: started, not draining, LLM circuit closed.
+    GET  /v1/usage           Rate limit and quota usage of each upstream.
+    GET  /metrics            Metrics in the Prometheus text format.
+
+Both answer routes take a JSON body such as
+``{"query": "What is Python?", "web": true, "youtube": false, "deadline": 20}``
+(`use_cache` is also accepted). The stream sends ``data: {"token": ...}`` events
+followed by a ``done`` event carrying the dropped sources and timings.
+
+One AsyncAgent serves every request of a worker process, so handler caches,
+pooled connections and in-flight coalescing are shared by all of them. The
+pipeline is I/O bound and runs on the worker's event loop; to use more cores,
+run more workers (`--workers`), each a separate process. Use the SQLite cache
+backends (see `utils.cache.build_cache`) to share caches between workers.
+
+Admission control is configured with environment variables:
+
+    API_MAX_CONCURRENCY   Requests processed at once per worker (default 32).
+    API_MAX_QUEUE         Requests waiting for a slot; more are turned away
+                          with 503 and a Retry-After header (default 64).
+    API_QUEUE_TIMEOUT     Seconds a request may wait for a slot (default 5).
+    API_MAX_BODY_BYTES    Largest accepted request body (default 65536).
+    API_SHUTDOWN_GRACE    Seconds in-flight requests get to finish on
+                          shutdown (default 10).
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from agent.agent import AsyncAgent
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.http_client import aclose_http_clients
+from utils.log_config import setup_logger
+from utils.metrics import get_registry, metrics_enabled
+from utils.resilience import CircuitOpenError, get_policy
+
+logger = setup_logger(__name__)
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# The upstreams reported by /readyz and /v1/usage.
+UPSTREAMS = ("serper", "youtube", "groq")
+
+
+class APIError(Exception):
+    """An error answered with an HTTP status and a JSON message."""
+
+    def __init__(
+        self, status: int, message: str, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Initialize the error.
+
+        Args:
+            status (int): The HTTP status code.
+            message (str): The message returned in the `error` field.
+            headers (Optional[Dict[str, str]]): Extra response headers.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class AdmissionController:
+    """
+    Bound the requests a worker processes at once and the queue in front of them.
+
+    A request takes one of `max_concurrency` slots. If none is free it waits,
+    unless `max_queue` requests are already waiting, and gives up after
+    `queue_timeout` seconds or at its deadline. Rejected requests get a 503
+    telling the client when to retry, instead of piling up behind the others.
+
+    Attributes:
+        max_concurrency (int): Requests processed at once.
+        max_queue (int): Requests allowed to wait for a slot.
+        queue_timeout (float): Seconds a request may wait for a slot.
+    """
+
+    def __init__(
+        self, max_concurrency: int = 32, max_queue: int = 64, queue_timeout: float = 5.0
+    ) -> None:
+        """Initialize the controller with every slot free."""
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._active = 0
+        self._waiting = 0
+
+    @property
+    def active(self) -> int:
+        """The number of requests holding a slot."""
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        """The number of requests waiting for a slot."""
+        return self._waiting
+
+    def _reject(self, reason: str) -> APIError:
+        """Count a rejected request and build its error."""
+        if metrics_enabled():
+            get_registry().increment("api_rejected_total", reason=reason)
+        return APIError(
+            503,
+            "The server is busy, retry later.",
+            {"Retry-After": str(max(1, math.ceil(self.queue_timeout)))},
+        )
+
+    @asynccontextmanager
+    async def admit(self, deadline: Optional[Deadline] = None) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of a block.
+
+        Args:
+            deadline (Optional[Deadline]): The request's deadline, which also
+                bounds the wait.
+
+        Raises:
+            APIError: 503 if the queue is full or no slot freed up in time.
+        """
+        if self._slots.locked():
+            if self._waiting >= self.max_queue:
+                raise self._reject("queue_full")
+            timeout = self.queue_timeout
+            if deadline is not None:
+                timeout = deadline.timeout(timeout)
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("queue_timeout") from None
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._slots.release()
+
+
+def build_admission_controller() -> AdmissionController:
+    """
+    Build an admission controller configured from the API_* environment variables.
+
+    Returns:
+        AdmissionController: The configured controller.
+    """
+    return AdmissionController(
+        max_concurrency=int(os.getenv("API_MAX_CONCURRENCY", "32")),
+        max_queue=int(os.getenv("API_MAX_QUEUE", "64")),
+        queue_timeout=float(os.getenv("API_QUEUE_TIMEOUT", "5")),
+    )
+
+
+def _parse_answer_request(body: Any) -> Dict[str, Any]:
+    """
+    Validate the JSON body of an answer request.
+
+    Args:
+        body (Any): The decoded request body.
+
+    Returns:
+        Dict[str, Any]: The `query`, `web`, `youtube`, `use_cache` and
+        `deadline` (seconds or None) of the request.
+
+    Raises:
+        APIError: 400 if the body is not a valid request.
+    """
+    if not isinstance(body, dict):
+        raise APIError(400, "The request body must be a JSON object.")
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise APIError(400, "'query' must be a non-empty string.")
+    request = {"query": query}
+    for field, default in (("web", True), ("youtube", False), ("use_cache", True)):
+        value = body.get(field, default)
+        if not isinstance(value, bool):
+            raise APIError(400, f"'{field}' must be a boolean.")
+        request[field] = value
+    deadline = body.get("deadline")
+    if deadline is not None and (
+        isinstance(deadline, bool)
+        or not isinstance(deadline, (int, float))
+        or deadline <= 0
+    ):
+        raise APIError(400, "'deadline' must be a positive number of seconds.")
+    request["deadline"] = deadline
+    return request
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    """Encode one server-sent event."""
+    lines = f"event: {event}\n" if event else ""
+    return f"{lines}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class AgentAPI:
+    """
+    The ASGI application serving the agent.
+
+    Attributes:
+        admission (AdmissionController): Bounds concurrent and queued requests.
+        max_body_bytes (int): The largest accepted request body.
+        shutdown_grace (float): Seconds in-flight requests get on shutdown.
+        ready (bool): Whether startup finished and the worker is not draining.
+    """
+
+    def __init__(
+        self,
+        agent: Optional[AsyncAgent] = None,
+        admission: Optional[AdmissionController] = None,
+    ) -> None:
+        """
+        Initialize the application.
+
+        Args:
+            agent (Optional[AsyncAgent]): The agent serving every request.
+                Defaults to one built on first use.
+            admission (Optional[AdmissionController]): The admission controller.
+                Defaults to one configured from the environment.
+        """
+        self._agent = agent
+        self.admission = admission or build_admission_controller()
+        self.max_body_bytes = int(os.getenv("API_MAX_BODY_BYTES", str(64 * 1024)))
+        self.shutdown_grace = float(os.getenv("API_SHUTDOWN_GRACE", "10"))
+        self.ready = False
+        self._routes: Dict[Tuple[str, str], Callable[..., Awaitable[None]]] = {
+            ("POST", "/v1/answer"): self._answer,
+            ("POST", "/v1/answer/stream"): self._answer_stream,
+            ("GET", "/healthz"): self._healthz,
+            ("GET", "/readyz"): self._readyz,
+            ("GET", "/v1/usage"): self._usage,
+            ("GET", "/metrics"): self._metrics,
+        }
+
+    @property
+    def agent(self) -> AsyncAgent:
+        """The agent shared by every request of this worker."""
+        if self._agent is None:
+            self._agent = AsyncAgent()
+        return self._agent
+
+    async def startup(self) -> None:
+        """Warm up the agent and start accepting traffic."""
+        started_at = time.perf_counter()
+        try:
+            await self.agent.warm_up()
+        except Exception as e:
+            logger.warning("Could not resolve the language model yet: %s", e)
+        self.ready = True
+        logger.info("API ready after %.3fs", time.perf_counter() - started_at)
+
+    async def shutdown(self) -> None:
+        """Stop reporting ready, let in-flight requests finish, close the pools."""
+        self.ready = False
+        stop_at = time.monotonic() + self.shutdown_grace
+        while self.admission.active and time.monotonic() < stop_at:
+            await asyncio.sleep(0.05)
+        if self.admission.active:
+            logger.warning(
+                "Shutting down with %d requests in flight.", self.admission.active
+            )
+        await aclose_http_clients()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle an ASGI connection."""
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        started_at = time.perf_counter()
+        route = self._routes.get((scope["method"], scope["path"]))
+        status = 500
+        try:
+            if route is None:
+                known_path = any(path == scope["path"] for _, path in self._routes)
+                raise APIError(405 if known_path else 404, "Not found.")
+            status = await route(receive, send)
+        except APIError as e:
+            status = e.status
+            await self._send_json(send, e.status, {"error": e.message}, e.headers)
+        finally:
+            if metrics_enabled():
+                path = scope["path"] if route is not None else "unmatched"
+                registry = get_registry()
+                registry.increment("api_requests_total", route=path, status=status)
+                registry.observe(
+                    "api_request_seconds", time.perf_counter() - started_at, route=path
+                )
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        """Run startup and shutdown as the ASGI lifespan protocol asks."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _send_json(
+        send: Send,
+        status: int,
+        payload: Any,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Send a complete JSON response."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await AgentAPI._send_start(send, status, "application/json", headers, len(body))
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_start(
+        send: Send,
+        status: int,
+        content_type: str,
+        headers: Optional[Dict[str, str]] = None,
+        content_length: Optional[int] = None,
+    ) -> None:
+        """Send the status line and headers."""
+        raw_headers = [(b"content-type", content_type.encode("latin-1"))]
+        if content_length is not None:
+            raw_headers.append((b"content-length", str(content_length).encode()))
+        for name, value in (headers or {}).items():
+            raw_headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+        await send(
+            {"type": "http.response.start", "status": status, "headers": raw_headers}
+        )
+
+    async def _read_json(self, receive: Receive) -> Any:
+        """
+        Read and decode the JSON request body.
+
+        Raises:
+            APIError: 413 if the body is too large, 400 if it is not JSON.
+        """
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise APIError(400, "The client disconnected.")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise APIError(413, "The request body is too large.")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        try:
+            return json.loads(b"".join(chunks) or b"null")
+        except ValueError:
+            raise APIError(400, "The request body is not valid JSON.") from None
+
+    def _deadline(self, request: Dict[str, Any]) -> Optional[Deadline]:
+        """Start the request's deadline, so that queueing counts against it."""
+        seconds = request["deadline"] or self.agent.default_deadline
+        return Deadline.after(seconds) if seconds else None
+
+    async def _answer(self, receive: Receive, send: Send) -> int:
+        """Answer a question with a JSON response."""
+        request = _parse_answer_request(await self._read_json(receive))
+        deadline = self._deadline(request)
+        async with self.admission.admit(deadline):
+            try:
+                response = await self.agent.process_request(
+                    request["query"],
+                    enable_web=request["web"],
+                    enable_youtube=request["youtube"],
+                    use_cache=request["use_cache"],
+                    deadline=deadline,
+                )
+            except Exception as e:
+                raise self._upstream_error(e) from e
+        await self._send_json(send, 200, response)
+        return 200
+
+    async def _answer_stream(self, receive: Receive, send: Send) -> int:
+        """
+        Answer a question as server-sent events.
+
+        The status is sent with the first token, so failures before it still
+        get a proper error response. The stream stops if the client disconnects.
+        """
+        request = _parse_answer_request(await self._read_json(receive))
+        deadline = self._deadline(request)
+        async with self.admission.admit(deadline):
+            stream_task = asyncio.ensure_future(
+                self._stream_answer(request, deadline, send)
+            )
+            disconnect_task = asyncio.ensure_future(self._wait_for_disconnect(receive))
+            try:
+                await asyncio.wait(
+                    {stream_task, disconnect_task},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                disconnect_task.cancel()
+                if not stream_task.done():
+                    logger.info("Client disconnected, cancelling the stream.")
+                    stream_task.cancel()
+                    # Hold the slot until the upstream stream has been closed.
+                    await asyncio.wait({stream_task})
+            if stream_task.cancelled():
+                return 499
+            return stream_task.result()
+
+    @staticmethod
+    async def _wait_for_disconnect(receive: Receive) -> None:
+        """Return once the client has gone away."""
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def _stream_answer(
+        self, request: Dict[str, Any], deadline: Optional[Deadline], send: Send
+    ) -> int:
+        """Relay the agent's answer tokens as events."""
+        timings: Dict[str, float] = {}
+        dropped_sources: List[str] = []
+        tokens = self.agent.process_request_stream(
+            request["query"],
+            enable_web=request["web"],
+            enable_youtube=request["youtube"],
+            use_cache=request["use_cache"],
+            timings=timings,
+            deadline=deadline,
+            dropped_sources=dropped_sources,
+        )
+        started = False
+        try:
+            async for token in tokens:
+                if not started:
+                    await self._send_start(
+                        send, 200, "text/event-stream", {"Cache-Control": "no-cache"}
+                    )
+                    started = True
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": _sse({"token": token}),
+                        "more_body": True,
+                    }
+                )
+        except Exception as e:
+            error = self._upstream_error(e)
+            if not started:
+                raise error from e
+            final = _sse({"error": error.message}, event="error")
+        else:
+            if not started:
+                await self._send_start(
+                    send, 200, "text/event-stream", {"Cache-Control": "no-cache"}
+                )
+            final = _sse(
+                {"dropped_sources": dropped_sources, "timings": timings}, event="done"
+            )
+        finally:
+            await tokens.aclose()
+        await send({"type": "http.response.body", "body": final})
+        return 200
+
+    @staticmethod
+    def _upstream_error(error: Exception) -> APIError:
+        """Map a pipeline failure to the error returned to the client."""
+        if isinstance(error, APIError):
+            return error
+        if isinstance(error, DeadlineExceeded):
+            return APIError(504, "The request did not finish before its deadline.")
+        if isinstance(error, CircuitOpenError):
+            return APIError(
+                503,
+                "An upstream service is unavailable, retry later.",
+                {"Retry-After": str(max(1, math.ceil(error.retry_after)))},
+            )
+        logger.error("Request failed: %s: %s", type(error).__name__, error)
+        return APIError(502, "The request failed upstream.")
+
+    async def _healthz(self, receive: Receive, send: Send) -> int:
+        """Report that the process is alive."""
+        await self._send_json(send, 200, {"status": "ok"})
+        return 200
+
+    async def _readyz(self, receive: Receive, send: Send) -> int:
+        """Report whether the worker should receive traffic."""
+        upstreams = {name: get_policy(name).breaker.state for name in UPSTREAMS}
+        # Retrieval sources degrade gracefully; without the LLM nothing works.
+        ready = self.ready and not get_policy("groq").breaker.is_open
+        status = 200 if ready else 503
+        await self._send_json(
+            send,
+            status,
+            {
+                "status": "ready" if ready else "unavailable",
+                "active": self.admission.active,
+                "waiting": self.admission.waiting,
+                "upstreams": upstreams,
+            },
+        )
+        return status
+
+    async def _usage(self, receive: Receive, send: Send) -> int:
+        """Report how much of each upstream's rate limit and quota is in use."""
+        usage = {name: get_policy(name).usage() for name in UPSTREAMS}
+        await self._send_json(send, 200, {"upstreams": usage})
+        return 200
+
+    async def _metrics(self, receive: Receive, send: Send) -> int:
+        """Serve the metrics in the Prometheus text format."""
+        body = get_registry().to_prometheus().encode("utf-8")
+        await self._send_start(
+            send, 200, "text/plain; version=0.0.4; charset=utf-8", None, len(body)
+        )
+        await send({"type": "http.response.body", "body": body})
+        return 200
+
+
+load_dotenv()
+app = AgentAPI()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "api:app",
+        host=os.getenv("API_HOST", "127.0.0.1"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=int(os.getenv("API_WORKERS", "1")),
+    )
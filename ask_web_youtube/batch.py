@@ -0,0 +1,343 @@
+"""
+Answer the questions of a JSONL file offline, e.g. for nightly evaluations.
+
+    python batch.py questions.jsonl -o answers.jsonl --rate-limit serper=5
+
+Each input line is a JSON object holding the question (`--query-field`,
+default "query") and optionally an ID (`--id-field`, default "id"; the line
+number otherwise) and `web`/`youtube` flags. For the backlog format use
+`--id-field request_id --query-field body`.
+
+Answers are appended to the output file as JSON lines in completion order,
+each with the input `line` it answers. The input is read lazily and at most
+`--concurrency` questions are in flight, so memory stays flat on large files.
+
+Progress is checkpointed next to the output (`<output>.checkpoint`): the first
+input line not yet answered, the lines answered beyond it, and the size of the
+output at that point. Rerunning the same command resumes where the previous
+run stopped, skipping every line already answered.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from dotenv import load_dotenv
+
+from agent.agent import Agent
+from utils.log_config import setup_logger
+from utils.resilience import get_policy
+
+logger = setup_logger(__name__)
+
+# The upstreams whose request rate `--rate-limit` can cap.
+UPSTREAMS = ("serper", "youtube", "groq")
+
+
+class Checkpoint:
+    """
+    Tracks which input lines have been answered, with a bounded memory footprint.
+
+    Lines below `next_line` are all answered. Lines answered out of order
+    beyond it are kept in `done` until the gap before them closes, so `done`
+    only grows with the number of requests in flight. The input is read on
+    the agent's event loop while results are written from the caller's thread,
+    so updates are locked.
+
+    Attributes:
+        path (str): Where the checkpoint is stored.
+        next_line (int): The first input line (1-based) not yet answered.
+        done (Set[int]): Lines beyond `next_line` that are answered.
+        output_bytes (int): The size of the output file the checkpoint covers.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize an empty checkpoint; see `load`."""
+        self.path = path
+        self.next_line = 1
+        self.done: Set[int] = set()
+        self.output_bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> "Checkpoint":
+        """Read the checkpoint if one was written."""
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.next_line = state["next_line"]
+            self.done = set(state["done"])
+            self.output_bytes = state["output_bytes"]
+        return self
+
+    def reset(self) -> None:
+        """Forget every answered line, e.g. when the output they were in is gone."""
+        with self._lock:
+            self.next_line = 1
+            self.done = set()
+            self.output_bytes = 0
+
+    def is_done(self, line: int) -> bool:
+        """Whether an input line has been answered."""
+        with self._lock:
+            return line < self.next_line or line in self.done
+
+    def mark_done(self, line: int) -> None:
+        """Record an answered line, advancing past every contiguous answered line."""
+        with self._lock:
+            self.done.add(line)
+            while self.next_line in self.done:
+                self.done.remove(self.next_line)
+                self.next_line += 1
+
+    def save(self, output_bytes: int) -> None:
+        """Write the checkpoint atomically."""
+        with self._lock:
+            self.output_bytes = output_bytes
+            state = {
+                "next_line": self.next_line,
+                "done": sorted(self.done),
+                "output_bytes": output_bytes,
+            }
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temporary, self.path)
+
+
+def recover_output(output_path: str, checkpoint: Checkpoint) -> None:
+    """
+    Reconcile the output file with the checkpoint after an interrupted run.
+
+    Answers written after the last checkpoint are kept and marked done; a
+    partially written last line is cut off. If the output is missing or shorter
+    than the checkpoint says, the answers it vouched for are lost, so the
+    checkpoint is rebuilt from the answers the output still holds.
+
+    Args:
+        output_path (str): The output file.
+        checkpoint (Checkpoint): The loaded checkpoint, updated in place.
+    """
+    if not os.path.exists(output_path):
+        if checkpoint.output_bytes:
+            logger.warning("Output file is missing; answering every line again.")
+        checkpoint.reset()
+        return
+    with open(output_path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < checkpoint.output_bytes:
+            logger.warning(
+                "Output file is shorter than its checkpoint; rebuilding the checkpoint."
+            )
+            checkpoint.reset()
+        valid_bytes = min(checkpoint.output_bytes, size)
+        f.seek(valid_bytes)
+        for raw_line in f:
+            try:
+                record = json.loads(raw_line)
+            except ValueError:
+                break
+            if not raw_line.endswith(b"\n"):
+                break
+            checkpoint.mark_done(record["line"])
+            valid_bytes += len(raw_line)
+        f.truncate(valid_bytes)
+
+
+def read_requests(
+    input_file: TextIO, id_field: str, query_field: str, checkpoint: Checkpoint
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the requests of a JSONL file, skipping lines already answered.
+
+    Args:
+        input_file (TextIO): The open input file.
+        id_field (str): The field holding the request ID.
+        query_field (str): The field holding the question.
+        checkpoint (Checkpoint): Which lines are already answered.
+
+    Yields:
+        Dict[str, Any]: Requests for `Agent.process_batch`, with their `line`.
+    """
+    for line_number, raw_line in enumerate(input_file, start=1):
+        if checkpoint.is_done(line_number):
+            continue
+        if not raw_line.strip():
+            checkpoint.mark_done(line_number)
+            continue
+        try:
+            item = json.loads(raw_line)
+        except ValueError:
+            item = None
+        if not isinstance(item, dict):
+            logger.warning("Line %d is not a JSON object.", line_number)
+            item = {}
+        request: Dict[str, Any] = {
+            "id": item.get(id_field, line_number),
+            "line": line_number,
+            "query": item.get(query_field),
+        }
+        for flag in ("web", "youtube"):
+            if isinstance(item.get(flag), bool):
+                request[flag] = item[flag]
+        yield request
+
+
+def parse_rate_limits(values: List[str]) -> Dict[str, float]:
+    """
+    Parse `upstream=requests_per_second` settings.
+
+    Args:
+        values (List[str]): The settings, e.g. ["serper=5", "groq=0.5"].
+
+    Returns:
+        Dict[str, float]: The rate per upstream.
+
+    Raises:
+        argparse.ArgumentTypeError: If a setting is malformed or names an
+            unknown upstream.
+    """
+    limits = {}
+    for value in values:
+        name, _, rate = value.partition("=")
+        name = name.strip()
+        try:
+            limits[name] = float(rate)
+        except ValueError:
+            limits[name] = 0.0
+        if not name or limits[name] <= 0:
+            raise argparse.ArgumentTypeError(
+                f"Expected UPSTREAM=REQUESTS_PER_SECOND, got {value!r}."
+            )
+        if name not in UPSTREAMS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown upstream {name!r}; use one of {', '.join(UPSTREAMS)}."
+            )
+    return limits
+
+
+def run_batch(
+    agent: Agent,
+    input_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    enable_web: bool = True,
+    enable_youtube: bool = False,
+    use_cache: bool = True,
+    deadline: Optional[float] = None,
+    id_field: str = "id",
+    query_field: str = "query",
+    checkpoint_every: int = 20,
+) -> Tuple[int, int]:
+    """
+    Answer every unanswered line of an input file into the output file.
+
+    Args:
+        agent (Agent): The agent answering the questions.
+        input_path (str): The JSONL input.
+        output_path (str): The JSONL output, appended to.
+        concurrency (int): Questions in flight at once.
+        enable_web (bool): Whether to use web search when a line does not say.
+        enable_youtube (bool): Whether to use YouTube when a line does not say.
+        use_cache (bool): Set to False to bypass the LLM response cache.
+        deadline (Optional[float]): Seconds each question may take.
+        id_field (str): The input field holding the request ID.
+        query_field (str): The input field holding the question.
+        checkpoint_every (int): Results between checkpoints.
+
+    Returns:
+        Tuple[int, int]: The number of results written and how many were errors.
+    """
+    checkpoint = Checkpoint(f"{output_path}.checkpoint").load()
+    recover_output(output_path, checkpoint)
+    written = errors = 0
+    with open(input_path, encoding="utf-8") as input_file, open(
+        output_path, "a", encoding="utf-8"
+    ) as output:
+        results = agent.process_batch(
+            read_requests(input_file, id_field, query_field, checkpoint),
+            concurrency=concurrency,
+            enable_web=enable_web,
+            enable_youtube=enable_youtube,
+            use_cache=use_cache,
+            deadline=deadline,
+        )
+        try:
+            for result in results:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                checkpoint.mark_done(result["line"])
+                written += 1
+                errors += "error" in result
+                if written % checkpoint_every == 0:
+                    output.flush()
+                    checkpoint.save(output.tell())
+        finally:
+            output.flush()
+            checkpoint.save(output.tell())
+    return written, errors
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the batch command line.
+
+    Args:
+        argv (Optional[List[str]]): The arguments; defaults to sys.argv.
+
+    Returns:
+        int: The exit status: 0, or 1 if any question failed.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL file with one question per line.")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file for answers.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--no-web", action="store_true", help="Skip web search.")
+    parser.add_argument("--youtube", action="store_true", help="Use YouTube.")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--deadline", type=float, help="Seconds per question.")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--query-field", default="query")
+    parser.add_argument(
+        "--rate-limit",
+        action="append",
+        default=[],
+        metavar="UPSTREAM=RPS",
+        help="Requests per second for serper, youtube or groq; repeatable.",
+    )
+    parser.add_argument("--checkpoint-every", type=int, default=20)
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO logs.")
+    args = parser.parse_args(argv)
+
+    try:
+        rate_limits = parse_rate_limits(args.rate_limit)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    load_dotenv()
+    for upstream, rate in rate_limits.items():
+        get_policy(upstream).set_rate_limit(rate)
+
+    written, errors = run_batch(
+        Agent(),
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        enable_web=not args.no_web,
+        enable_youtube=args.youtube,
+        use_cache=not args.no_cache,
+        deadline=args.deadline,
+        id_field=args.id_field,
+        query_field=args.query_field,
+        checkpoint_every=max(1, args.checkpoint_every),
+    )
+    print(f"Wrote {written} results to {args.output} ({errors} failed).")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Benchmark package. Runs the agent end to end against local stand-in services."""
@@ -0,0 +1,376 @@
+"""
+End-to-end benchmark of `Agent.process_request` against local stand-in services.
+
+The driver starts the stand-ins from `benchmarks.stub_services`, points the
+agent at them through SERPER_BASE_URL, GROQ_BASE_URL and YOUTUBE_API_BASE_URL,
+and sends requests at a fixed concurrency. It reports p50/p95/p99 latency,
+throughput, errors, peak RSS and memory allocated per request. Each run is
+appended to a JSONL history keyed by the current git commit and compared with
+the previous run using the same configuration, so regressions show up between
+commits.
+
+Usage (from the project root):
+
+    PYTHONPATH=. python -m benchmarks.run_benchmark --requests 200 --concurrency 16
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from youtube_transcript_api._errors import TranscriptsDisabled
+
+from agent.agent import Agent
+from agent.services.transcript_store import TranscriptStore
+from agent.services.youtube_handler import AsyncYouTubeHandler
+from benchmarks.stub_services import StubBehaviour, StubServer
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(__file__), "results", "history.jsonl")
+
+# Metrics where a larger value is a regression; throughput is the opposite.
+_LOWER_IS_BETTER = ("p50", "p95", "p99", "peak_rss_bytes", "allocated_bytes_per_request")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Compute the q-th percentile of the samples, with q between 0 and 100.
+
+    Args:
+        values (List[float]): The samples.
+        q (float): The percentile.
+
+    Returns:
+        float: The percentile, or 0.0 without samples.
+    """
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def git_commit() -> Dict[str, Any]:
+    """Return the current commit hash and whether the work tree has changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": False}
+    return {"commit": commit, "dirty": dirty}
+
+
+def make_transcript_fetcher(base_url: str) -> Callable[[str], List[Dict[str, Any]]]:
+    """Build a transcript fetcher that reads segments from the stand-in service."""
+    client = httpx.Client(base_url=base_url, timeout=10)
+
+    def fetch(video_id: str) -> List[Dict[str, Any]]:
+        response = client.get(f"/transcripts/{video_id}")
+        if response.status_code != 200:
+            raise TranscriptsDisabled(video_id)
+        return response.json()
+
+    return fetch
+
+
+@contextmanager
+def stub_environment(server: StubServer) -> Iterator[None]:
+    """Point the upstream clients at the stand-in server for the duration of a run."""
+    overrides = {
+        "SERPER_BASE_URL": server.base_url,
+        "GROQ_BASE_URL": server.base_url,
+        "YOUTUBE_API_BASE_URL": server.base_url,
+        "SERPER_API_KEY": "benchmark",
+        "GROQ_API_KEY": "benchmark",
+        "YOUTUBE_DATA_API_KEY": "benchmark",
+    }
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def build_agent(server: StubServer, workdir: str, enable_youtube: bool) -> Agent:
+    """
+    Create an Agent wired to the stand-in services.
+
+    Must be called inside `stub_environment` so the handlers pick up the
+    stand-in URLs and keys.
+
+    Args:
+        server (StubServer): The running stand-in server.
+        workdir (str): A scratch directory for the transcript store.
+        enable_youtube (bool): Whether the YouTube handler will be used.
+
+    Returns:
+        Agent: The configured agent.
+    """
+    agent = Agent()
+    if enable_youtube:
+        agent.async_agent.youtube_handler = AsyncYouTubeHandler(
+            transcript_store=TranscriptStore(
+                path=os.path.join(workdir, "transcripts.db")
+            ),
+            transcript_fetcher=make_transcript_fetcher(server.base_url),
+        )
+    return agent
+
+
+def measure_allocations(
+    run_one: Callable[[int], None], samples: int, offset: int
+) -> Dict[str, float]:
+    """
+    Measure memory allocated per request with tracemalloc, one request at a time.
+
+    tracemalloc slows allocation down considerably, so this runs after (and
+    separately from) the timed phase.
+
+    Returns:
+        Dict[str, float]: The mean peak traced memory per request, in bytes.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for index in range(samples):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            run_one(offset + index)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return {"allocated_bytes_per_request": statistics.fmean(peaks) if peaks else 0.0}
+
+
+def run_benchmark(
+    requests: int = 100,
+    concurrency: int = 8,
+    behaviours: Optional[Dict[str, StubBehaviour]] = None,
+    enable_youtube: bool = True,
+    repeat_queries: bool = False,
+    allocation_samples: int = 5,
+) -> Dict[str, Any]:
+    """
+    Run the benchmark and return its configuration and results.
+
+    Args:
+        requests (int): The number of timed requests.
+        concurrency (int): The number of requests in flight at once.
+        behaviours (Optional[Dict[str, StubBehaviour]]): Stand-in behaviour per service.
+        enable_youtube (bool): Include YouTube retrieval in each request.
+        repeat_queries (bool): Reuse one query (warm caches) instead of unique ones.
+        allocation_samples (int): Requests measured with tracemalloc afterwards.
+
+    Returns:
+        Dict[str, Any]: The run's `config` and `results`.
+    """
+    server = StubServer(behaviours).start()
+    try:
+        with stub_environment(server), tempfile.TemporaryDirectory() as workdir:
+            agent = build_agent(server, workdir, enable_youtube)
+
+            def run_one(index: int) -> None:
+                query = "benchmark query" if repeat_queries else f"benchmark query {index}"
+                agent.process_request(
+                    query, enable_web=True, enable_youtube=enable_youtube
+                )
+
+            # One untimed request resolves the model and opens connection pools.
+            run_one(-1)
+
+            def timed(index: int) -> Optional[float]:
+                started_at = time.perf_counter()
+                try:
+                    run_one(index)
+                except Exception:
+                    return None
+                return time.perf_counter() - started_at
+
+            started_at = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # Workers only return their outcome; it is tallied here, on
+                # one thread, so no counter is shared between them.
+                outcomes = list(executor.map(timed, range(requests)))
+            wall = time.perf_counter() - started_at
+            latencies = [latency for latency in outcomes if latency is not None]
+            errors = len(outcomes) - len(latencies)
+
+            results: Dict[str, Any] = {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "mean": statistics.fmean(latencies) if latencies else 0.0,
+                "throughput": len(latencies) / wall if wall else 0.0,
+                "errors": errors,
+                # ru_maxrss is reported in kilobytes on Linux.
+                "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                * 1024,
+                "upstream_requests": dict(server.requests),
+            }
+            if allocation_samples:
+                results.update(
+                    measure_allocations(run_one, allocation_samples, offset=requests)
+                )
+    finally:
+        server.stop()
+
+    config = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "enable_youtube": enable_youtube,
+        "repeat_queries": repeat_queries,
+        "behaviours": {
+            service: behaviour.as_dict()
+            for service, behaviour in server.behaviours.items()
+        },
+    }
+    return {"config": config, "results": results}
+
+
+def load_previous(history_path: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the most recent recorded run with the same configuration, if any."""
+    if not os.path.exists(history_path):
+        return None
+    previous = None
+    with open(history_path, encoding="utf-8") as history:
+        for line in history:
+            record = json.loads(line)
+            if record.get("config") == config:
+                previous = record
+    return previous
+
+
+def compare(
+    current: Dict[str, Any], previous: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    List the metrics that regressed by more than a relative threshold.
+
+    Args:
+        current (Dict[str, Any]): The results of this run.
+        previous (Dict[str, Any]): The results of the baseline run.
+        threshold (float): The tolerated relative change, e.g. 0.1 for 10%.
+
+    Returns:
+        List[str]: One description per regressed metric.
+    """
+    regressions = []
+    for name in _LOWER_IS_BETTER + ("throughput",):
+        before, after = previous.get(name), current.get(name)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        if name == "throughput":
+            change = -change
+        if change > threshold:
+            regressions.append(f"{name}: {before:.4g} -> {after:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Parse arguments, run the benchmark, record it and report regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Base latency of every stand-in service, in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-size", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=None,
+                        help="Override the latency of the Groq stand-in.")
+    parser.add_argument("--web-only", action="store_true")
+    parser.add_argument("--repeat-queries", action="store_true")
+    parser.add_argument("--allocation-samples", type=int, default=5)
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO logs.")
+    parser.add_argument("--no-record", action="store_true")
+    parser.add_argument("--fail-on-regression", type=float, default=None,
+                        metavar="FRACTION",
+                        help="Exit with 1 if a metric regressed by more than this.")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        # Per-request INFO logs would drown the report and cost time under load.
+        logging.disable(logging.INFO)
+
+    behaviours = {
+        service: StubBehaviour(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            payload_size=args.payload_size,
+        )
+        for service in ("serper", "groq", "youtube", "transcripts")
+    }
+    if args.llm_latency is not None:
+        behaviours["groq"].latency = args.llm_latency
+
+    run = run_benchmark(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        behaviours=behaviours,
+        enable_youtube=not args.web_only,
+        repeat_queries=args.repeat_queries,
+        allocation_samples=args.allocation_samples,
+    )
+    record = {**git_commit(), "timestamp": time.time(), **run}
+    results = run["results"]
+
+    print(
+        f"p50 {results['p50'] * 1000:.1f} ms | p95 {results['p95'] * 1000:.1f} ms | "
+        f"p99 {results['p99'] * 1000:.1f} ms | {results['throughput']:.1f} req/s | "
+        f"errors {results['errors']} | peak RSS {results['peak_rss_bytes'] / 2**20:.1f} MiB"
+        + (
+            f" | {results['allocated_bytes_per_request'] / 1024:.0f} KiB allocated/request"
+            if "allocated_bytes_per_request" in results
+            else ""
+        )
+    )
+
+    previous = load_previous(args.history, run["config"])
+    regressions = []
+    if previous is not None:
+        threshold = args.fail_on_regression if args.fail_on_regression is not None else 0.1
+        regressions = compare(results, previous["results"], threshold)
+        print(f"Compared with {previous['commit']}:")
+        for regression in regressions or ["no regressions"]:
+            print(f"  {regression}")
+
+    if not args.no_record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as history:
+            history.write(json.dumps(record) + "\n")
+
+    return 1 if regressions and args.fail_on_regression is not None else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
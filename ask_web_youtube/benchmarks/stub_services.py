@@ -0,0 +1,321 @@
+"""
+Local stand-ins for the upstream services used by the agent.
+
+A single threaded HTTP server answers the endpoints the agent calls, in the
+shape the real services use:
+
+    POST /search                         Serper web search
+    GET  /openai/v1/models               Groq model list
+    POST /openai/v1/chat/completions     Groq chat completion (JSON or SSE stream)
+    GET  /youtube/v3/search              YouTube Data API search
+    GET  /youtube/v3/videos              YouTube Data API video details
+    GET  /transcripts/<video_id>         Transcript segments
+
+Each service has its own latency, error rate and payload size, so benchmarks
+can model slow or flaky upstreams. Responses are deterministic for a given
+query, which keeps runs comparable.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+MODEL_ID = "llama3-8b-8192"
+
+
+class StubBehaviour:
+    """
+    How one stand-in service responds.
+
+    Attributes:
+        latency (float): Base seconds to wait before answering.
+        jitter (float): Up to this many extra seconds, drawn uniformly.
+        error_rate (float): Fraction of requests answered with HTTP 503.
+        payload_size (int): Results per search page, segments per transcript,
+            or tokens per chat completion.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        payload_size: int = 10,
+    ) -> None:
+        """Initialize the behaviour of a stand-in service."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the behaviour as plain data, e.g. for benchmark reports."""
+        return {
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+            "payload_size": self.payload_size,
+        }
+
+
+def _video_ids(query: str, count: int) -> List[str]:
+    """Derive stable, YouTube-like video IDs from a query."""
+    digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+    return [f"{digest}{index:03d}" for index in range(count)]
+
+
+def _words(seed: str, count: int) -> List[str]:
+    """Return deterministic filler words."""
+    vocabulary = ("python", "agent", "search", "video", "latency", "cache", "model")
+    rng = random.Random(seed)
+    return [rng.choice(vocabulary) for _ in range(count)]
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    """Route requests to the stand-in services."""
+
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep request logs out of benchmark output."""
+
+    def _read_json(self) -> Dict[str, Any]:
+        """Read and parse the JSON request body."""
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        """Send a JSON response with a Content-Length, keeping the connection open."""
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, service: str) -> Optional[StubBehaviour]:
+        """Apply a service's latency and error rate; None means an error was sent."""
+        behaviour = self.server.behaviours[service]
+        time.sleep(behaviour.latency + self.server.uniform(0, behaviour.jitter))
+        self.server.count(service)
+        if self.server.uniform(0, 1) < behaviour.error_rate:
+            self._send_json({"error": "injected failure"}, status=503)
+            return None
+        return behaviour
+
+    def do_GET(self) -> None:
+        """Answer the model list, YouTube and transcript endpoints."""
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/openai/v1/models":
+            if self._simulate("groq"):
+                self._send_json({"object": "list", "data": [{"id": MODEL_ID}]})
+        elif url.path == "/youtube/v3/search":
+            if self._simulate("youtube"):
+                self._send_json(self._youtube_search(params))
+        elif url.path == "/youtube/v3/videos":
+            if self._simulate("youtube"):
+                self._send_json(self._youtube_videos(params))
+        elif url.path.startswith("/transcripts/"):
+            behaviour = self._simulate("transcripts")
+            if behaviour:
+                video_id = url.path.rsplit("/", 1)[1]
+                self._send_json(self._transcript(video_id, behaviour.payload_size))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self) -> None:
+        """Answer the Serper search and Groq chat completion endpoints."""
+        path = urlsplit(self.path).path
+        body = self._read_json()
+        if path == "/search":
+            behaviour = self._simulate("serper")
+            if behaviour:
+                self._send_json(self._serper_page(body, behaviour.payload_size))
+        elif path == "/openai/v1/chat/completions":
+            behaviour = self._simulate("groq")
+            if behaviour:
+                self._chat_completion(body, behaviour.payload_size)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    @staticmethod
+    def _serper_page(body: Dict[str, Any], size: int) -> Dict[str, Any]:
+        """Build one Serper result page."""
+        query = body.get("q", "")
+        page = int(body.get("page", 1))
+        site = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+        organic = []
+        for position in range(1, size + 1):
+            rank = (page - 1) * size + position
+            organic.append(
+                {
+                    "title": f"Result {rank} for {query}",
+                    "link": f"https://example.com/{site}/{rank}",
+                    "snippet": " ".join(_words(f"{query}-{rank}", 30)),
+                    "position": position,
+                }
+            )
+        return {"searchParameters": {"q": query, "page": page}, "organic": organic}
+
+    @staticmethod
+    def _youtube_search(params: Dict[str, str]) -> Dict[str, Any]:
+        """Build a YouTube search response."""
+        query = params.get("q", "")
+        count = int(params.get("maxResults", 5))
+        return {
+            "items": [
+                {
+                    "id": {"kind": "youtube#video", "videoId": video_id},
+                    "snippet": {"title": f"Video {index} about {query}"},
+                }
+                for index, video_id in enumerate(_video_ids(query, count))
+            ]
+        }
+
+    @staticmethod
+    def _youtube_videos(params: Dict[str, str]) -> Dict[str, Any]:
+        """Build a videos.list response with a duration per requested video."""
+        ids = [video_id for video_id in params.get("id", "").split(",") if video_id]
+        return {
+            "items": [
+                {
+                    "id": video_id,
+                    "contentDetails": {"duration": f"PT{3 + int(video_id[-3:]) % 20}M"},
+                }
+                for video_id in ids
+            ]
+        }
+
+    @staticmethod
+    def _transcript(video_id: str, size: int) -> List[Dict[str, Any]]:
+        """Build transcript segments of roughly five seconds each."""
+        words = _words(video_id, size * 8)
+        return [
+            {
+                "text": " ".join(words[index * 8 : index * 8 + 8]),
+                "start": index * 5.0,
+                "duration": 5.0,
+            }
+            for index in range(size)
+        ]
+
+    def _chat_completion(self, body: Dict[str, Any], size: int) -> None:
+        """Answer a chat completion as JSON, or as server-sent events if streamed."""
+        prompt = "".join(message.get("content", "") for message in body["messages"])
+        tokens = [f"{word} " for word in _words(prompt[:200], size)]
+        usage = {
+            "prompt_tokens": len(prompt) // 4 + 1,
+            "completion_tokens": len(tokens),
+            "total_tokens": len(prompt) // 4 + 1 + len(tokens),
+        }
+        if not body.get("stream"):
+            self._send_json(
+                {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", MODEL_ID),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(tokens)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+            return
+
+        # Without a Content-Length the stream ends when the connection closes.
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for token in tokens:
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", MODEL_ID),
+                "choices": [
+                    {"index": 0, "delta": {"content": token}, "finish_reason": None}
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    A threaded HTTP server hosting every stand-in service.
+
+    Attributes:
+        behaviours (Dict[str, StubBehaviour]): The behaviour of each service
+            ("serper", "groq", "youtube", "transcripts").
+        requests (Dict[str, int]): The number of requests each service received.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        behaviours: Optional[Dict[str, StubBehaviour]] = None,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        seed: int = 0,
+    ) -> None:
+        """
+        Bind the server; call `start` to serve from a background thread.
+
+        Args:
+            behaviours (Optional[Dict[str, StubBehaviour]]): Per-service behaviour.
+                Services left out use the StubBehaviour defaults.
+            address (Tuple[str, int]): The address to bind. Port 0 picks a free port.
+            seed (int): Seed for injected jitter and errors.
+        """
+        super().__init__(address, _StubRequestHandler)
+        self.behaviours = {
+            service: StubBehaviour()
+            for service in ("serper", "groq", "youtube", "transcripts")
+        }
+        self.behaviours.update(behaviours or {})
+        self.requests: Dict[str, int] = {service: 0 for service in self.behaviours}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        """The root URL of the server, e.g. "http://127.0.0.1:53211"."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def uniform(self, low: float, high: float) -> float:
+        """Draw a seeded random number (thread-safe)."""
+        with self._lock:
+            return self._random.uniform(low, high)
+
+    def count(self, service: str) -> None:
+        """Count a request to a service."""
+        with self._lock:
+            self.requests[service] += 1
+
+    def start(self) -> "StubServer":
+        """Serve requests from a daemon thread."""
+        threading.Thread(
+            target=self.serve_forever, name="stub-services", daemon=True
+        ).start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
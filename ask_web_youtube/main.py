@@ -4,11 +4,43 @@ This module provides the main functionality for the Agentic Search application.
 It includes the main page, sidebar, debug panel, and entry point for the application.
 """
 
+import itertools
+import time
+
 import streamlit as st
 from dotenv import load_dotenv
 
 from agent.agent import Agent
-from utils.log_config import get_log_buffer
+from utils.log_config import get_log_buffer, setup_logger
+from utils.metrics import Trace, get_registry, start_metrics_server
+
+logger = setup_logger(__name__)
+
+
+@st.cache_resource
+def get_agent() -> Agent:
+    """
+    Create the process-wide Agent.
+
+    Streamlit re-executes the script on every interaction; caching the agent as
+    a resource keeps its handlers, connection pools and caches alive across
+    reruns and sessions instead of rebuilding them each time.
+
+    Returns:
+        Agent: The shared agent.
+    """
+    started_at = time.perf_counter()
+    agent = Agent()
+    try:
+        # Model discovery is cached process-wide, so this only blocks on the
+        # first run of the app instead of on the first user query.
+        agent.warm_up()
+    except Exception as e:
+        logger.warning("Could not resolve the language model yet: %s", e)
+    logger.info("Agent cold start took %.3fs", time.perf_counter() - started_at)
+    # Serves /metrics and /metrics.json when METRICS_PORT is set.
+    start_metrics_server()
+    return agent
 
 
 # Main Page
@@ -17,8 +49,8 @@ def main_page(agent):
     Display the title, a text input box for user queries, and an "Ask" button.
 
     When the "Ask" button is clicked, process the user's query using the provided agent
-    and display the response. Allow the user to enable or disable web and YouTube search
-    through session state variables.
+    and stream the response as it is generated. Allow the user to enable or disable
+    web and YouTube search through session state variables.
 
     Args:
         agent: An object that processes user queries and returns responses.
@@ -32,21 +64,43 @@ def main_page(agent):
     # "Ask" button
     if st.button("Ask"):
         if query:
-            # Process the query using the agent
-            with st.spinner("Fetching results..."):
-                try:
-                    response = agent.process_request(
-                        input_text=query,
-                        enable_web=st.session_state.include_web,
-                        enable_youtube=st.session_state.include_youtube,
+            # Process the query using the agent, streaming the answer as it
+            # is generated instead of waiting for the full completion
+            timings = {}
+            dropped_sources = []
+            trace = Trace(name=query)
+            st.session_state.last_trace = trace
+            try:
+                stream = agent.process_request_stream(
+                    input_text=query,
+                    enable_web=st.session_state.include_web,
+                    enable_youtube=st.session_state.include_youtube,
+                    timings=timings,
+                    trace=trace,
+                    dropped_sources=dropped_sources,
+                )
+                with st.spinner("Fetching results..."):
+                    first_token = next(stream, "")
+                st.write("### Answer:")
+                answer = st.write_stream(itertools.chain([first_token], stream))
+                # Store the query and response in session state
+                st.session_state.last_query = query
+                st.session_state.last_response = {"data": answer}
+                if timings:
+                    st.caption(
+                        f"First token after {timings['time_to_first_token']:.2f}s "
+                        f"(retrieval {timings['retrieval']:.2f}s), "
+                        f"total {timings['total']:.2f}s"
                     )
-                    # Store the query and response in session state
-                    st.session_state.last_query = query
-                    st.session_state.last_response = response
-                    st.write("### Answer:")
-                    st.write(response)
-                except Exception as e:
-                    st.error(f"An error occurred: {e}")
+                if dropped_sources:
+                    labels = {"web_search": "web search", "youtube_search": "YouTube"}
+                    st.caption(
+                        "Answered without "
+                        + " and ".join(labels[source] for source in dropped_sources)
+                        + ": the source failed or did not respond in time."
+                    )
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
         else:
             st.warning("Please enter a query.")
 
@@ -79,10 +133,12 @@ def sidebar(agent):
             if "last_query" in st.session_state and "last_response" in st.session_state:
                 # Prompt for verification
                 VERIFICATION_PROMPT = (
-                    "Verify if the following response is correct for the query.",
-                    "If you agree that the response is correct, onlyt the word  `True` should be returned.",
-                    "If incorrect, return False with the incorrect references. "
-                    f"\n\nQuery: {st.session_state.last_query}\nResponse: {st.session_state.last_response}",
+                    "Verify if the following response is correct for the query. "
+                    "If you agree that the response is correct, only the word `True` "
+                    "should be returned. "
+                    "If incorrect, return False with the incorrect references."
+                    f"\n\nQuery: {st.session_state.last_query}"
+                    f"\nResponse: {st.session_state.last_response}"
                 )
                 with st.spinner("Verifying result..."):
                     try:
@@ -110,11 +166,36 @@ def sidebar(agent):
 # Debug Panel
 def debug_panel():
     """
-    Create a debug panel to display the log buffer.
+    Create a debug panel to display the log buffer and pipeline timings.
 
-    Useful for debugging and monitoring the application's behavior.
+    Shows the per-stage breakdown of the last request and the latency
+    percentiles aggregated since the process started. Useful for debugging and
+    monitoring the application's behavior.
     """
     with st.expander("Debug Panel"):
+        trace = st.session_state.get("last_trace")
+        if trace is not None and trace.spans:
+            st.write("Last request, by stage:")
+            st.dataframe(trace.breakdown(), use_container_width=True)
+
+        histograms = get_registry().to_json()["histograms"]
+        stages = histograms.get("agent_stage_duration_seconds", [])
+        if stages:
+            st.write("All requests, latency by stage (seconds):")
+            st.dataframe(
+                [
+                    {
+                        "stage": series["labels"]["stage"],
+                        "count": series["count"],
+                        "p50": series["p50"],
+                        "p95": series["p95"],
+                        "p99": series["p99"],
+                    }
+                    for series in stages
+                ],
+                use_container_width=True,
+            )
+
         st.text(get_log_buffer())
 
 
@@ -125,8 +206,9 @@ def main():
 
     Initialize the agent, set up the sidebar, main page, and debug panel.
     """
+    started_at = time.perf_counter()
     load_dotenv()
-    agent = Agent()
+    agent = get_agent()
 
     # Initialize session state for toggles
     if "include_web" not in st.session_state:
@@ -137,6 +219,7 @@ def main():
     sidebar(agent)
     main_page(agent)
     debug_panel()
+    logger.info("Rerun took %.3fs", time.perf_counter() - started_at)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,13 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+from utils.resilience import reset_policies
+
+
+@pytest.fixture(autouse=True)
+def fresh_upstream_policies():
+    """Give every test closed circuits and empty latency histories."""
+    reset_policies()
+    yield
+    reset_policies()
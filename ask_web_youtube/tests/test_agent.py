@@ -0,0 +1,453 @@
+"""
+Tests for the Agent and AsyncAgent coordinators.
+
+These tests replace the service handlers with in-process fakes, so they run
+without API keys and focus on how the agent orchestrates its services.
+"""
+
+import asyncio
+import io
+import time
+
+import pytest
+
+from agent.agent import Agent, AsyncAgent, get_template_environment
+from agent.services.local_index import LocalIndex
+from agent.services.transcript import Transcript
+from utils.metrics import Trace
+from utils.resilience import get_policy
+
+
+class FakeSearchHandler:
+    """Fake web search handler that sleeps before answering."""
+
+    def __init__(self, delay: float) -> None:
+        """Store the simulated latency."""
+        self.delay = delay
+        self.calls = 0
+
+    async def search(self, query: str) -> dict:
+        """Return a canned search result after a delay."""
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"organic": [{"title": query}]}
+
+
+class FakeYouTubeHandler:
+    """Fake YouTube handler that sleeps before answering."""
+
+    def __init__(self, delay: float) -> None:
+        """Store the simulated latency."""
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch_videos(self, query: str) -> list:
+        """Return a canned video list after a delay."""
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return [
+            {
+                "video_id": "abc",
+                "title": query,
+                "transcript": Transcript.from_segments(
+                    [{"text": query, "start": 0.0, "duration": 1.0}]
+                ),
+            }
+        ]
+
+
+class FailingYouTubeHandler:
+    """Fake YouTube handler whose upstream is down."""
+
+    def __init__(self) -> None:
+        """Initialize the call counter."""
+        self.calls = 0
+
+    async def fetch_videos(self, query: str) -> list:
+        """Fail like an unreachable upstream."""
+        self.calls += 1
+        raise ConnectionError("YouTube is unreachable")
+
+
+class FakeLLMHandler:
+    """Fake LLM handler that records the prompt it receives."""
+
+    def __init__(self) -> None:
+        """Initialize the recorded prompts."""
+        self.prompts = []
+
+    async def query(self, messages: list, use_cache: bool = True) -> dict:
+        """Record the prompt and return a canned answer."""
+        self.prompts.append(messages[0]["content"])
+        return {"model": "fake", "data": "answer"}
+
+    async def query_stream(self, messages: list, use_cache: bool = True):
+        """Record the prompt and stream a canned answer."""
+        self.prompts.append(messages[0]["content"])
+        for token in ("an", "sw", "er"):
+            await asyncio.sleep(0.05)
+            yield token
+
+
+@pytest.fixture
+def async_agent(monkeypatch) -> AsyncAgent:
+    """Fixture to create an AsyncAgent wired to fake handlers."""
+    for name in ("SERPER_API_KEY", "YOUTUBE_DATA_API_KEY", "GROQ_API_KEY"):
+        monkeypatch.setenv(name, "fake_key")
+    agent = AsyncAgent()
+    agent.serper_handler = FakeSearchHandler(delay=0.2)
+    agent.youtube_handler = FakeYouTubeHandler(delay=0.2)
+    agent.llm_handler = FakeLLMHandler()
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_retrieval_runs_concurrently(async_agent: AsyncAgent) -> None:
+    """Test that web and YouTube retrieval overlap instead of running serially."""
+    start = time.perf_counter()
+    response = await async_agent.process_request(
+        "What is Python?", enable_web=True, enable_youtube=True
+    )
+    elapsed = time.perf_counter() - start
+
+    assert response["data"] == "answer"
+    assert elapsed < 0.35
+    prompt = async_agent.llm_handler.prompts[0]
+    assert "What is Python?" in prompt
+    assert "abc" in prompt
+
+
+def test_sync_agent_wraps_async_agent(async_agent: AsyncAgent) -> None:
+    """Test that the synchronous Agent delegates to the AsyncAgent."""
+    agent = Agent.__new__(Agent)
+    agent.async_agent = async_agent
+
+    response = agent.process_request("What is Python?", enable_web=True)
+
+    assert response == {"model": "fake", "data": "answer", "dropped_sources": []}
+
+
+def test_sync_agent_streams_tokens_with_timings(async_agent: AsyncAgent) -> None:
+    """Test that tokens are streamed and time-to-first-token is recorded."""
+    agent = Agent.__new__(Agent)
+    agent.async_agent = async_agent
+    timings = {}
+
+    tokens = list(
+        agent.process_request_stream("What is Python?", enable_web=True, timings=timings)
+    )
+
+    assert tokens == ["an", "sw", "er"]
+    assert timings["retrieval"] < timings["time_to_first_token"] < timings["total"]
+
+
+@pytest.mark.asyncio
+async def test_prompt_context_is_compacted(async_agent: AsyncAgent) -> None:
+    """Test that only relevant passages within the token budget reach the prompt."""
+    async_agent.compactor.token_budget = 50
+    filler = "unrelated chatter " * 100
+
+    async def search(query: str) -> dict:
+        return {
+            "organic": [
+                {"title": "Noise", "link": "https://a.example", "snippet": filler},
+                {"title": "Python", "link": "https://b.example", "snippet": query},
+            ],
+            "searchParameters": {"q": query},
+        }
+
+    async_agent.serper_handler.search = search
+
+    await async_agent.process_request("What is Python?", enable_web=True)
+
+    prompt = async_agent.llm_handler.prompts[0]
+    assert "https://b.example" in prompt
+    assert "https://a.example" not in prompt
+    assert "searchParameters" not in prompt
+
+
+@pytest.mark.asyncio
+async def test_prompt_web_results_are_projected(async_agent: AsyncAgent) -> None:
+    """Test that web results reach the prompt as plain text with only chosen fields."""
+    async_agent.web_result_fields = ("title", "link")
+
+    async def search(query: str) -> dict:
+        return {
+            "organic": [
+                {"title": "Python", "link": "https://b.example", "snippet": query,
+                 "position": 1, "sitelinks": [{"link": "https://b.example/docs"}]},
+            ],
+        }
+
+    async_agent.serper_handler.search = search
+
+    await async_agent.process_request("What is Python?", enable_web=True)
+
+    prompt = async_agent.llm_handler.prompts[0]
+    assert "Python\nhttps://b.example" in prompt
+    assert "https://b.example/docs" not in prompt
+    assert '"link"' not in prompt
+
+
+def test_template_is_compiled_once(async_agent: AsyncAgent, monkeypatch) -> None:
+    """Test that repeated renders reuse the shared environment's compiled template."""
+    get_template_environment.cache_clear()
+    loads = []
+    environment = get_template_environment("agent/templates")
+    original_load = environment.loader.load
+
+    def load(env, name, globals=None):
+        loads.append(name)
+        return original_load(env, name, globals)
+
+    monkeypatch.setattr(environment.loader, "load", load)
+
+    first = async_agent.generate_from_template({"question": "What is Python?"})
+    second = async_agent.generate_from_template({"question": "What is Python?"})
+
+    assert first == second
+    assert "What is Python?" in first
+    assert len(loads) == 1
+    get_template_environment.cache_clear()
+
+
+def test_render_template_into_buffer(async_agent: AsyncAgent) -> None:
+    """Test that rendering into a buffer matches the rendered string."""
+    data = {"question": "What is Python?", "web_search": "[]"}
+    buffer = io.StringIO()
+
+    async_agent.render_template_into(data, buffer)
+
+    assert buffer.getvalue() == async_agent.generate_from_template(data)
+
+
+def test_bytecode_cache_is_written(tmp_path, monkeypatch) -> None:
+    """Test that AGENT_TEMPLATE_CACHE_DIR persists compiled templates."""
+    get_template_environment.cache_clear()
+    monkeypatch.setenv("AGENT_TEMPLATE_CACHE_DIR", str(tmp_path / "bytecode"))
+
+    environment = get_template_environment("agent/templates")
+    environment.get_template("agent_input_template.jinja2")
+
+    assert any((tmp_path / "bytecode").iterdir())
+    get_template_environment.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_transcripts_are_serialized_without_compaction(
+    async_agent: AsyncAgent,
+) -> None:
+    """Test that transcripts are inlined compactly when compaction is disabled."""
+    async_agent.compactor = None
+
+    await async_agent.process_request(
+        "What is Python?", enable_web=False, enable_youtube=True
+    )
+
+    assert "[0] What is Python?" in async_agent.llm_handler.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_handlers_are_built_lazily(monkeypatch) -> None:
+    """Test that handlers are only constructed when a request needs them."""
+    for name in ("SERPER_API_KEY", "YOUTUBE_DATA_API_KEY", "GROQ_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    agent = AsyncAgent()
+    agent.serper_handler = FakeSearchHandler(delay=0)
+    agent.llm_handler = FakeLLMHandler()
+
+    response = await agent.process_request("What is Python?", enable_web=True)
+
+    assert response["data"] == "answer"
+    assert agent._youtube_handler is None
+
+
+def test_youtube_handler_is_built_on_first_access(monkeypatch) -> None:
+    """Test that the lazy YouTube handler imports and builds its class."""
+    from agent.services.youtube_handler import AsyncYouTubeHandler
+
+    monkeypatch.setenv("YOUTUBE_DATA_API_KEY", "fake_key")
+    agent = AsyncAgent()
+
+    handler = agent.youtube_handler
+
+    assert isinstance(handler, AsyncYouTubeHandler)
+    assert agent.youtube_handler is handler
+
+
+def test_trace_breaks_down_streamed_request(async_agent: AsyncAgent) -> None:
+    """Test that a streamed request records a span for each pipeline stage."""
+    agent = Agent.__new__(Agent)
+    agent.async_agent = async_agent
+    trace = Trace()
+
+    list(
+        agent.process_request_stream(
+            "What is Python?", enable_web=True, enable_youtube=True, trace=trace
+        )
+    )
+
+    stages = {row["stage"] for row in trace.breakdown()}
+    assert {
+        "agent.request_stream",
+        "agent.web_search",
+        "agent.youtube_search",
+        "agent.compaction",
+        "agent.template",
+    } <= stages
+
+
+@pytest.mark.asyncio
+async def test_failing_source_is_dropped(async_agent: AsyncAgent) -> None:
+    """Test that the answer is built from the sources that still work."""
+    async_agent.youtube_handler = FailingYouTubeHandler()
+
+    response = await async_agent.process_request(
+        "What is Python?", enable_web=True, enable_youtube=True
+    )
+
+    assert response["data"] == "answer"
+    assert response["dropped_sources"] == ["youtube_search"]
+    prompt = async_agent.llm_handler.prompts[0]
+    assert "What is Python?" in prompt
+    assert "abc" not in prompt
+
+
+@pytest.mark.asyncio
+async def test_source_with_open_circuit_is_skipped(async_agent: AsyncAgent) -> None:
+    """Test that an upstream whose circuit is open is not called at all."""
+    handler = FailingYouTubeHandler()
+    async_agent.youtube_handler = handler
+    breaker = get_policy("youtube").breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    response = await async_agent.process_request(
+        "What is Python?", enable_web=True, enable_youtube=True
+    )
+
+    assert response["data"] == "answer"
+    assert response["dropped_sources"] == ["youtube_search"]
+    assert handler.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_source_is_dropped_at_the_deadline(async_agent: AsyncAgent) -> None:
+    """Test that a straggler is cancelled and the answer uses what arrived in time."""
+    async_agent.serper_handler = FakeSearchHandler(delay=0.05)
+    async_agent.youtube_handler = FakeYouTubeHandler(delay=5)
+
+    start = time.perf_counter()
+    response = await async_agent.process_request(
+        "What is Python?", enable_web=True, enable_youtube=True, deadline=0.5
+    )
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1
+    assert response["data"] == "answer"
+    assert response["dropped_sources"] == ["youtube_search"]
+    prompt = async_agent.llm_handler.prompts[0]
+    assert "What is Python?" in prompt
+    assert "abc" not in prompt
+
+
+def test_stream_reports_dropped_sources(async_agent: AsyncAgent) -> None:
+    """Test that a streamed answer reports the sources it did without."""
+    agent = Agent.__new__(Agent)
+    agent.async_agent = async_agent
+    async_agent.default_deadline = 0.1
+    dropped = []
+
+    tokens = list(
+        agent.process_request_stream(
+            "What is Python?",
+            enable_web=True,
+            enable_youtube=True,
+            dropped_sources=dropped,
+        )
+    )
+
+    assert tokens == ["an", "sw", "er"]
+    assert sorted(dropped) == ["web_search", "youtube_search"]
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_retrieval(async_agent: AsyncAgent) -> None:
+    """Test that concurrent identical questions retrieve once, unless uncached."""
+    first, second = await asyncio.gather(
+        async_agent.process_request("What is Python?", enable_web=True),
+        async_agent.process_request("what is python", enable_web=True),
+    )
+
+    assert first["data"] == second["data"] == "answer"
+    assert async_agent.serper_handler.calls == 1
+    assert len(async_agent.llm_handler.prompts) == 2
+
+    await asyncio.gather(
+        async_agent.process_request("What is Python?", use_cache=False),
+        async_agent.process_request("What is Python?", use_cache=False),
+    )
+    assert async_agent.serper_handler.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_agents_with_other_settings_do_not_share_prompts(
+    async_agent: AsyncAgent,
+) -> None:
+    """Test that a prompt is only shared within one agent and field projection."""
+    other = AsyncAgent(web_result_fields=("link",))
+    other.serper_handler = FakeSearchHandler(delay=0.2)
+    other.llm_handler = FakeLLMHandler()
+
+    await asyncio.gather(
+        async_agent.process_request("What is Python?", enable_web=True),
+        other.process_request("What is Python?", enable_web=True),
+    )
+
+    assert async_agent.serper_handler.calls == other.serper_handler.calls == 1
+    assert async_agent.llm_handler.prompts[0] != other.llm_handler.prompts[0]
+
+
+def test_verification_prompt_without_sources(async_agent: AsyncAgent) -> None:
+    """Test the "Verify Result" call, and that non-string input is not coalesced."""
+    agent = Agent.__new__(Agent)
+    agent.async_agent = async_agent
+    prompt = "Verify if the following response is correct.\n\nQuery: q\nResponse: r"
+
+    response = agent.process_request(prompt, enable_web=False, enable_youtube=False)
+    legacy = agent.process_request(("Verify.", "Query: q"), enable_web=False)
+
+    assert response["data"] == legacy["data"] == "answer"
+    assert "Response: r" in async_agent.llm_handler.prompts[0]
+    assert async_agent.serper_handler.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_local_first_answers_from_previously_fetched_passages(
+    async_agent: AsyncAgent, tmp_path
+) -> None:
+    """Test that indexed sources are not fetched again in local-first mode."""
+    async_agent.local_index = LocalIndex(
+        path=str(tmp_path / "index.db"), min_results=1
+    )
+    question = "What is Python?"
+
+    await async_agent.process_request(question, enable_youtube=True, local_first=True)
+    assert async_agent.serper_handler.calls == 1
+    assert async_agent.youtube_handler.calls == 1
+    assert len(async_agent.local_index) == 2
+
+    response = await async_agent.process_request(
+        question, enable_youtube=True, local_first=True
+    )
+    assert response["dropped_sources"] == []
+    assert async_agent.serper_handler.calls == 1
+    assert async_agent.youtube_handler.calls == 1
+    prompt = async_agent.llm_handler.prompts[-1]
+    assert question in prompt and "abc" in prompt
+
+    # Without local-first, and for questions the index does not cover, the
+    # upstreams are called.
+    await async_agent.process_request(question)
+    await async_agent.process_request("Who wrote Rust?", local_first=True)
+    assert async_agent.serper_handler.calls == 3
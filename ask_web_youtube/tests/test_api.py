@@ -0,0 +1,220 @@
+"""
+Tests for the ASGI API.
+
+The agent's handlers are replaced with in-process fakes and requests go through
+httpx's ASGI transport, so no server, network or API keys are needed.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from agent.agent import AsyncAgent
+from api import AdmissionController, AgentAPI
+from utils.resilience import get_policy
+
+
+class FakeSearchHandler:
+    """Fake web search handler that sleeps before answering."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        """Store the simulated latency."""
+        self.delay = delay
+
+    async def search(self, query: str) -> dict:
+        """Return a canned search result after a delay."""
+        await asyncio.sleep(self.delay)
+        return {"organic": [{"title": query}]}
+
+
+class FakeLLMHandler:
+    """Fake LLM handler with a canned answer."""
+
+    async def warm_up(self) -> str:
+        """Pretend to resolve the model."""
+        return "fake"
+
+    async def query(self, messages: list, use_cache: bool = True) -> dict:
+        """Return a canned answer."""
+        return {"model": "fake", "data": "answer"}
+
+    async def query_stream(self, messages: list, use_cache: bool = True):
+        """Stream a canned answer."""
+        for token in ("an", "sw", "er"):
+            yield token
+
+
+@pytest.fixture
+def api() -> AgentAPI:
+    """Fixture to create the API around an agent wired to fake handlers."""
+    agent = AsyncAgent()
+    agent.serper_handler = FakeSearchHandler()
+    agent.llm_handler = FakeLLMHandler()
+    return AgentAPI(agent=agent, admission=AdmissionController(max_concurrency=2))
+
+
+def _client(api: AgentAPI) -> httpx.AsyncClient:
+    """Build a client that sends requests straight to the application."""
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api), base_url="http://test"
+    )
+
+
+@pytest.mark.asyncio
+async def test_answer_returns_json(api: AgentAPI) -> None:
+    """Test that a question is answered with the agent's response."""
+    async with _client(api) as client:
+        response = await client.post("/v1/answer", json={"query": "What is Python?"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "model": "fake",
+        "data": "answer",
+        "dropped_sources": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_invalid_requests_are_rejected(api: AgentAPI) -> None:
+    """Test validation errors and unknown routes."""
+    async with _client(api) as client:
+        missing = await client.post("/v1/answer", json={"web": True})
+        bad_flag = await client.post("/v1/answer", json={"query": "q", "web": "yes"})
+        not_json = await client.post("/v1/answer", content=b"{")
+        wrong_method = await client.get("/v1/answer")
+        unknown = await client.get("/nope")
+
+    assert missing.status_code == 400
+    assert "query" in missing.json()["error"]
+    assert bad_flag.status_code == 400
+    assert not_json.status_code == 400
+    assert wrong_method.status_code == 405
+    assert unknown.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_answer_stream_sends_events(api: AgentAPI) -> None:
+    """Test that tokens are streamed as server-sent events, then a done event."""
+    async with _client(api) as client:
+        response = await client.post(
+            "/v1/answer/stream", json={"query": "What is Python?"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/event-stream"
+    events = response.text.strip().split("\n\n")
+    tokens = [json.loads(event[len("data: ") :])["token"] for event in events[:-1]]
+    assert tokens == ["an", "sw", "er"]
+    assert events[-1].startswith("event: done\n")
+    done = json.loads(events[-1].split("data: ", 1)[1])
+    assert done["dropped_sources"] == []
+    assert "time_to_first_token" in done["timings"]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_closes_stream_and_frees_slot(api: AgentAPI) -> None:
+    """Test that a client leaving mid-answer closes the LLM stream and its slot."""
+    first_token = asyncio.Event()
+    closed = asyncio.Event()
+
+    async def query_stream(messages: list, use_cache: bool = True):
+        try:
+            yield "an"
+            await asyncio.sleep(60)
+            yield "swer"
+        finally:
+            closed.set()
+
+    api.agent.llm_handler.query_stream = query_stream
+    body = json.dumps({"query": "What is Python?", "use_cache": False}).encode()
+    messages = [{"type": "http.request", "body": body}]
+
+    async def receive() -> dict:
+        if messages:
+            return messages.pop(0)
+        await first_token.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        if b"token" in message.get("body", b""):
+            first_token.set()
+
+    scope = {"type": "http", "method": "POST", "path": "/v1/answer/stream"}
+    await asyncio.wait_for(api(scope, receive, send), timeout=5)
+
+    assert closed.is_set()
+    assert api.admission.active == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_turned_away() -> None:
+    """Test that requests beyond the slots and queue get a 503 with Retry-After."""
+    agent = AsyncAgent()
+    agent.serper_handler = FakeSearchHandler(delay=0.2)
+    agent.llm_handler = FakeLLMHandler()
+    api = AgentAPI(
+        agent=agent,
+        admission=AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1),
+    )
+
+    async with _client(api) as client:
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "/v1/answer", json={"query": f"question {index}", "use_cache": False}
+                )
+                for index in range(3)
+            )
+        )
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 503]
+    rejected = next(response for response in responses if response.status_code == 503)
+    assert rejected.headers["retry-after"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_readiness_follows_lifecycle_and_llm_circuit(api: AgentAPI) -> None:
+    """Test /healthz, and /readyz before startup, after it and with the LLM down."""
+    async with _client(api) as client:
+        assert (await client.get("/healthz")).status_code == 200
+        assert (await client.get("/readyz")).status_code == 503
+
+        await api.startup()
+        ready = await client.get("/readyz")
+        assert ready.status_code == 200
+        assert ready.json()["upstreams"]["groq"] == "closed"
+
+        breaker = get_policy("groq").breaker
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        assert (await client.get("/readyz")).status_code == 503
+
+        await api.shutdown()
+        assert not api.ready
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_exported(api: AgentAPI) -> None:
+    """Test that /metrics serves the Prometheus text including API counters."""
+    async with _client(api) as client:
+        await client.get("/healthz")
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "api_requests_total" in response.text
+
+
+@pytest.mark.asyncio
+async def test_usage_reports_every_upstream(api: AgentAPI) -> None:
+    """Test that /v1/usage reports the budgets of each upstream."""
+    get_policy("youtube").set_quota(10000, period=86400)
+    async with _client(api) as client:
+        response = await client.get("/v1/usage")
+
+    upstreams = response.json()["upstreams"]
+    assert set(upstreams) == {"serper", "youtube", "groq"}
+    assert upstreams["youtube"]["quota"]["burst"] == 10000
+    assert upstreams["groq"]["circuit"] == "closed"
@@ -0,0 +1,158 @@
+"""
+Tests for batch answering and the JSONL batch command line.
+
+The agent's handlers are replaced with in-process fakes, so no API keys are needed.
+"""
+
+import argparse
+import asyncio
+import json
+
+import pytest
+
+from agent.agent import Agent, AsyncAgent
+from batch import Checkpoint, parse_rate_limits, recover_output, run_batch
+
+
+class FakeSearchHandler:
+    """Fake web search handler counting its calls."""
+
+    def __init__(self) -> None:
+        """Initialize the call counter."""
+        self.calls = 0
+
+    async def search(self, query: str) -> dict:
+        """Return a canned search result, slower for "slow" questions."""
+        self.calls += 1
+        await asyncio.sleep(0.2 if "slow" in query else 0.01)
+        return {"organic": [{"title": query}]}
+
+
+class FakeLLMHandler:
+    """Fake LLM handler that fails on request."""
+
+    async def query(self, messages: list, use_cache: bool = True) -> dict:
+        """Return a canned answer, or fail for "broken" questions."""
+        if "broken" in messages[0]["content"]:
+            raise RuntimeError("model unavailable")
+        return {"model": "fake", "data": "answer"}
+
+
+@pytest.fixture
+def agent() -> Agent:
+    """Fixture to create an Agent wired to fake handlers."""
+    async_agent = AsyncAgent()
+    async_agent.serper_handler = FakeSearchHandler()
+    async_agent.llm_handler = FakeLLMHandler()
+    agent = Agent.__new__(Agent)
+    agent.async_agent = async_agent
+    return agent
+
+
+def test_batch_yields_in_completion_order_and_dedupes(agent: Agent) -> None:
+    """Test completion order, duplicates, failures and invalid requests."""
+    requests = [
+        {"id": "a", "query": "slow question"},
+        {"id": "b", "query": "fast question"},
+        {"id": "c", "query": "Fast question?"},
+        {"id": "d", "query": "broken question"},
+        {"id": "e", "query": ""},
+    ]
+
+    results = list(agent.process_batch(requests, concurrency=4))
+
+    by_id = {result["id"]: result for result in results}
+    assert results[-1]["id"] == "a"
+    assert by_id["b"]["data"] == "answer"
+    assert by_id["c"]["duplicate_of"] == "b"
+    assert "RuntimeError" in by_id["d"]["error"]
+    assert "query" in by_id["e"]["error"]
+    assert agent.async_agent.serper_handler.calls == 3
+
+
+def test_checkpoint_tracks_a_contiguous_prefix(tmp_path) -> None:
+    """Test that out-of-order lines are folded into the prefix once it catches up."""
+    checkpoint = Checkpoint(str(tmp_path / "out.checkpoint"))
+    for line in (2, 3, 5):
+        checkpoint.mark_done(line)
+    assert checkpoint.next_line == 1 and checkpoint.done == {2, 3, 5}
+
+    checkpoint.mark_done(1)
+    checkpoint.save(output_bytes=42)
+
+    loaded = Checkpoint(checkpoint.path).load()
+    assert loaded.next_line == 4
+    assert loaded.done == {5}
+    assert loaded.output_bytes == 42
+    assert loaded.is_done(3) and not loaded.is_done(4)
+
+
+def test_cli_resumes_without_repeating_answered_lines(agent: Agent, tmp_path) -> None:
+    """Test that a rerun skips answered lines and recovers uncheckpointed output."""
+    input_path = tmp_path / "questions.jsonl"
+    output_path = tmp_path / "answers.jsonl"
+    lines = [
+        {"request_id": f"q{index}", "body": f"question {index}"} for index in range(5)
+    ]
+    input_path.write_text(
+        "\n".join(json.dumps(line) for line in lines[:3]) + "\n", encoding="utf-8"
+    )
+
+    written, errors = run_batch(
+        agent,
+        str(input_path),
+        str(output_path),
+        id_field="request_id",
+        query_field="body",
+    )
+    assert (written, errors) == (3, 0)
+
+    # Simulate a crash after an answer was written but before the checkpoint,
+    # leaving a partial line behind.
+    with open(output_path, "a", encoding="utf-8") as output:
+        output.write(json.dumps({"id": "q3", "line": 4, "data": "answer"}) + "\n")
+        output.write('{"id": "q4", "li')
+    input_path.write_text(
+        "\n".join(json.dumps(line) for line in lines) + "\n", encoding="utf-8"
+    )
+
+    written, _ = run_batch(
+        agent,
+        str(input_path),
+        str(output_path),
+        id_field="request_id",
+        query_field="body",
+    )
+
+    records = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert written == 1
+    assert sorted(record["id"] for record in records) == ["q0", "q1", "q2", "q3", "q4"]
+
+
+def test_lost_output_resets_the_checkpoint(tmp_path) -> None:
+    """Test that answers the output no longer holds are answered again."""
+    output_path = tmp_path / "answers.jsonl"
+    first = json.dumps({"id": "q0", "line": 1}) + "\n"
+    checkpoint = Checkpoint(f"{output_path}.checkpoint")
+    for line in (1, 2, 3):
+        checkpoint.mark_done(line)
+    checkpoint.save(output_bytes=3 * len(first))
+
+    recover_output(str(output_path), checkpoint)
+    assert not checkpoint.is_done(1) and checkpoint.output_bytes == 0
+
+    output_path.write_text(first, encoding="utf-8")
+    checkpoint.save(output_bytes=3 * len(first))
+    recover_output(str(output_path), checkpoint)
+
+    assert checkpoint.is_done(1) and not checkpoint.is_done(2)
+    assert output_path.read_bytes() == first.encode("utf-8")
+
+
+def test_rate_limits_are_parsed() -> None:
+    """Test the UPSTREAM=RPS syntax."""
+    assert parse_rate_limits(["serper=5", "groq=0.5"]) == {"serper": 5, "groq": 0.5}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_rate_limits(["serper"])
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_rate_limits(["serpr=5"])
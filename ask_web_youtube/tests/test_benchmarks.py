@@ -0,0 +1,90 @@
+"""Tests for the offline benchmark harness and its stand-in services."""
+
+import httpx
+import pytest
+
+from benchmarks.run_benchmark import compare, load_previous, percentile, run_benchmark
+from benchmarks.stub_services import StubBehaviour, StubServer
+
+
+@pytest.fixture
+def server():
+    """Run fast stand-in services for a test."""
+    behaviours = {
+        service: StubBehaviour(latency=0.0, payload_size=3)
+        for service in ("serper", "groq", "youtube", "transcripts")
+    }
+    stub = StubServer(behaviours).start()
+    yield stub
+    stub.stop()
+
+
+def test_stub_services_answer_in_upstream_shapes(server) -> None:
+    """Test that each stand-in answers like the service it replaces."""
+    with httpx.Client(base_url=server.base_url) as client:
+        page = client.post("/search", json={"q": "python", "page": 2}).json()
+        videos = client.get("/youtube/v3/search", params={"q": "python", "maxResults": 2})
+        transcript = client.get("/transcripts/abc").json()
+
+    assert [item["position"] for item in page["organic"]] == [1, 2, 3]
+    assert page["organic"][0]["title"] == "Result 4 for python"
+    assert len(videos.json()["items"]) == 2
+    assert [segment["start"] for segment in transcript] == [0.0, 5.0, 10.0]
+    assert server.requests["serper"] == 1 and server.requests["youtube"] == 1
+
+
+def test_stub_services_inject_errors() -> None:
+    """Test that an error rate of one fails every request."""
+    stub = StubServer({"serper": StubBehaviour(latency=0.0, error_rate=1.0)}).start()
+    try:
+        response = httpx.post(f"{stub.base_url}/search", json={"q": "python"})
+    finally:
+        stub.stop()
+    assert response.status_code == 503
+
+
+def test_run_benchmark_reports_latency_and_memory(monkeypatch) -> None:
+    """Test a short benchmark run end to end against the stand-ins."""
+    for name in ("SERPER_BASE_URL", "GROQ_BASE_URL", "YOUTUBE_API_BASE_URL"):
+        monkeypatch.delenv(name, raising=False)
+    behaviours = {
+        service: StubBehaviour(latency=0.0, payload_size=3)
+        for service in ("serper", "groq", "youtube", "transcripts")
+    }
+
+    run = run_benchmark(
+        requests=4, concurrency=2, behaviours=behaviours, allocation_samples=1
+    )
+
+    results = run["results"]
+    assert results["errors"] == 0
+    assert 0 < results["p50"] <= results["p95"] <= results["p99"]
+    assert results["throughput"] > 0
+    assert results["peak_rss_bytes"] > 0
+    assert results["allocated_bytes_per_request"] > 0
+    assert results["upstream_requests"]["groq"] >= 4
+    assert results["upstream_requests"]["transcripts"] > 0
+    assert run["config"]["concurrency"] == 2
+
+
+def test_compare_flags_regressions_beyond_threshold() -> None:
+    """Test that slower latency and lower throughput count as regressions."""
+    previous = {"p50": 1.0, "p95": 2.0, "throughput": 10.0}
+    current = {"p50": 1.05, "p95": 3.0, "throughput": 5.0}
+
+    regressions = compare(current, previous, threshold=0.1)
+
+    assert [line.split(":")[0] for line in regressions] == ["p95", "throughput"]
+
+
+def test_load_previous_matches_configuration(tmp_path) -> None:
+    """Test that only runs with the same configuration are compared."""
+    history = tmp_path / "history.jsonl"
+    history.write_text(
+        '{"commit": "a", "config": {"requests": 1}, "results": {}}\n'
+        '{"commit": "b", "config": {"requests": 2}, "results": {}}\n'
+    )
+
+    assert load_previous(str(history), {"requests": 1})["commit"] == "a"
+    assert load_previous(str(history), {"requests": 3}) is None
+    assert percentile([1.0, 2.0, 3.0], 50) == 2.0
@@ -0,0 +1,85 @@
+"""
+Tests for the in-memory and SQLite caches.
+
+These tests exercise expiry, LRU eviction and statistics without network access.
+"""
+
+import time
+
+import pytest
+
+from utils.cache import SQLiteCache, TTLCache, build_cache, normalize_query
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """Fixture returning a factory for each cache backend."""
+
+    def factory(maxsize: int = 2, ttl=None):
+        if request.param == "memory":
+            return TTLCache(maxsize=maxsize, ttl=ttl)
+        return SQLiteCache(str(tmp_path / "cache.db"), maxsize=maxsize, ttl=ttl)
+
+    return factory
+
+
+def test_normalize_query_folds_case_whitespace_and_punctuation() -> None:
+    """Test that near-identical queries normalize to the same key."""
+    assert normalize_query("  What is  Python? ") == normalize_query("what is python")
+    assert normalize_query("Café") == normalize_query("cafe")
+
+
+def test_get_and_set(make_cache) -> None:
+    """Test that stored values are returned and misses return the default."""
+    cache = make_cache()
+    cache.set("a", {"value": 1})
+    assert cache.get("a") == {"value": 1}
+    assert cache.get("missing", "default") == "default"
+    assert "a" in cache
+
+
+def test_least_recently_used_entry_is_evicted(make_cache) -> None:
+    """Test that the least recently used entry is evicted when full."""
+    cache = make_cache(maxsize=2)
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_per_entry_ttl(make_cache) -> None:
+    """Test that per-entry TTLs override the default TTL."""
+    cache = make_cache(ttl=60)
+    cache.set("short", 1, ttl=0.05)
+    cache.set("long", 2)
+    time.sleep(0.1)
+
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_stats_count_hits_and_misses(make_cache) -> None:
+    """Test that hits and misses are counted."""
+    cache = make_cache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_build_cache_reads_environment(monkeypatch, tmp_path) -> None:
+    """Test that the backend and settings come from prefixed variables."""
+    monkeypatch.setenv("TEST_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("TEST_CACHE_PATH", str(tmp_path / "env.db"))
+    monkeypatch.setenv("TEST_CACHE_TTL", "5")
+    cache = build_cache("TEST", maxsize=10, ttl=None)
+    assert isinstance(cache, SQLiteCache)
+    assert cache.ttl == 5.0
@@ -0,0 +1,99 @@
+"""
+Tests for the context compaction module.
+
+These tests run offline on synthetic search results and transcripts.
+"""
+
+from agent.context_compactor import ContextCompactor, bm25_scores, estimate_tokens
+from agent.services.transcript import Transcript
+
+
+def make_segments(texts: list, step: float = 20.0) -> Transcript:
+    """Build a transcript with segments spaced `step` seconds apart."""
+    return Transcript.from_segments(
+        {"text": text, "start": index * step, "duration": step}
+        for index, text in enumerate(texts)
+    )
+
+
+def test_bm25_ranks_matching_documents_first() -> None:
+    """Test that documents containing the query terms score highest."""
+    scores = bm25_scores(
+        "python generators",
+        ["cooking pasta at home", "python generators explained", "python basics"],
+    )
+
+    assert scores.argmax() == 1
+    assert scores[0] == 0
+    assert scores[2] > 0
+
+
+def test_bm25_handles_empty_inputs() -> None:
+    """Test that empty queries and document lists produce zero scores."""
+    assert len(bm25_scores("python", [])) == 0
+    assert not bm25_scores("", ["python"]).any()
+
+
+def test_compact_respects_token_budget() -> None:
+    """Test that the kept passages fit in the budget and the best one is kept."""
+    web_results = {
+        "organic": [
+            {"title": f"Result {rank}", "link": f"https://{rank}.example",
+             "snippet": "filler text " * 20}
+            for rank in range(10)
+        ]
+        + [{"title": "Rust", "link": "https://rust.example",
+            "snippet": "rust ownership and borrowing"}]
+    }
+    compactor = ContextCompactor(token_budget=100)
+
+    web, youtube = compactor.compact("rust ownership", web_results=web_results)
+
+    assert youtube == []
+    assert "https://rust.example" in [result["link"] for result in web]
+    assert len(web) < 11
+    used = sum(estimate_tokens(" ".join(result.values())) for result in web)
+    assert used <= 100
+
+
+def test_compact_keeps_rank_and_time_order() -> None:
+    """Test that kept web results and chunks are returned in their original order."""
+    web_results = {
+        "organic": [
+            {"title": "First", "link": "https://1.example", "snippet": "python"},
+            {"title": "Second", "link": "https://2.example", "snippet": "python python"},
+        ]
+    }
+    videos = [
+        {
+            "video_id": "abc",
+            "title": "Talk",
+            "transcript": make_segments(
+                ["python intro", "weather", "weather", "more python", "end"], step=40
+            ),
+        }
+    ]
+
+    web, youtube = ContextCompactor().compact("python", web_results, videos)
+
+    assert [result["title"] for result in web] == ["First", "Second"]
+    assert youtube[0]["video_id"] == "abc"
+    starts = [chunk["start"] for chunk in youtube[0]["chunks"]]
+    assert starts == sorted(starts)
+    assert all("text" in chunk for chunk in youtube[0]["chunks"])
+
+
+def test_compact_drops_videos_without_relevant_chunks_when_over_budget() -> None:
+    """Test that videos whose chunks do not fit the budget are left out."""
+    videos = [
+        {"video_id": "relevant", "title": "A",
+         "transcript": make_segments(["python decorators"])},
+        {"video_id": "noise", "title": "B",
+         "transcript": make_segments(["gardening tips " * 50])},
+    ]
+
+    _, youtube = ContextCompactor(token_budget=40).compact(
+        "python decorators", None, videos
+    )
+
+    assert [video["video_id"] for video in youtube] == ["relevant"]
@@ -0,0 +1,80 @@
+"""Tests for request deadlines and their propagation through contexts."""
+
+import asyncio
+
+import pytest
+
+from utils.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    current_deadline,
+    remaining_time,
+    use_deadline,
+)
+
+
+class FakeClock:
+    """A manually advanced monotonic clock."""
+
+    def __init__(self) -> None:
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def test_deadline_counts_down_and_expires() -> None:
+    """Test remaining time, expiry and the check."""
+    clock = FakeClock()
+    deadline = Deadline.after(2.0, clock)
+
+    assert deadline.remaining() == 2.0
+    assert deadline.timeout(5.0) == 2.0
+    deadline.check()
+
+    clock.now = 3.0
+    assert deadline.remaining() == 0.0
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("the search")
+
+
+def test_portion_splits_the_remaining_time() -> None:
+    """Test that a portion ends earlier than its parent, never later."""
+    clock = FakeClock()
+    deadline = Deadline.after(10.0, clock)
+    clock.now = 2.0
+
+    portion = deadline.portion(0.5)
+
+    assert portion.remaining() == 4.0
+    assert portion.expires_at < deadline.expires_at
+
+
+def test_use_deadline_is_scoped() -> None:
+    """Test that the active deadline is restored, and None keeps the current one."""
+    deadline = Deadline.after(1.0)
+
+    assert current_deadline() is None
+    assert remaining_time(default=5.0) == 5.0
+    with use_deadline(deadline):
+        with use_deadline(None) as active:
+            assert active is deadline
+        assert current_deadline() is deadline
+        assert remaining_time() <= 1.0
+    assert current_deadline() is None
+
+
+def test_deadline_follows_tasks_and_threads() -> None:
+    """Test that tasks and to_thread calls see the deadline they were started with."""
+    deadline = Deadline.after(1.0)
+
+    async def run():
+        with use_deadline(deadline):
+            task = asyncio.ensure_future(asyncio.sleep(0, result=current_deadline()))
+            in_thread = await asyncio.to_thread(current_deadline)
+        return await task, in_thread
+
+    assert asyncio.run(run()) == (deadline, deadline)
@@ -2,14 +2,23 @@
 
 This module tests the functionality of the GroqHandler
 without mocking, ensuring that credentials are working as expected.
+The response cache tests use a fake client and run without credentials.
 """
 
+import asyncio
+
 import pytest
-from agent.services.llm_handler.groq_handler import GroqHandler
+from agent.services.llm_handler import groq_handler as groq_module
+from agent.services.llm_handler.groq_handler import AsyncGroqHandler, GroqHandler
+from types import SimpleNamespace
+import threading
+import time
+from utils.cache import TTLCache
+from utils.resilience import UpstreamPolicy
 import os
 
 
-@pytest.fixture(scope="module", autouse=True)
+@pytest.fixture(scope="module")
 def check_groq_api_key():
     """Skip tests if GROQ_API_KEY is not set."""
     if not os.getenv("GROQ_API_KEY"):
@@ -17,7 +26,7 @@ def check_groq_api_key():
 
 
 @pytest.fixture
-def groq_handler():
+def groq_handler(check_groq_api_key):
     """Fixture to create a GroqHandler instance with the actual API."""
     return GroqHandler(api_key=os.getenv("GROQ_API_KEY"))
 
@@ -36,6 +45,7 @@ def test_query_success(groq_handler):
     assert response.get("data") is not None
 
 
+@pytest.mark.usefixtures("check_groq_api_key")
 def test_query_with_model_parameter():
     """Test the query method when a specific model is provided."""
     groq_handler = GroqHandler(api_key=os.getenv("GROQ_API_KEY"))
@@ -55,3 +65,200 @@ def test_query_exception_handling(groq_handler):
         groq_handler.query(messages=messages)
     except Exception as e:
         assert isinstance(e, Exception)
+
+
+class FakeStream:
+    """Fake SDK stream of chunks that records whether it was closed."""
+
+    def __init__(self, tokens) -> None:
+        """Initialize the stream over the given tokens."""
+        self.chunks = iter(
+            SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=token))]
+            )
+            for token in tokens
+        )
+        self.closed = False
+
+    def __iter__(self):
+        """Iterate over the chunks."""
+        return self.chunks
+
+    def __enter__(self):
+        """Enter the stream's context."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the stream."""
+        self.closed = True
+
+    def __aiter__(self):
+        """Iterate over the chunks asynchronously."""
+        return self
+
+    async def __anext__(self):
+        """Return the next chunk."""
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def __aenter__(self):
+        """Enter the stream's context."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the stream."""
+        self.closed = True
+
+
+class FakeCompletions:
+    """Fake chat completions resource that counts calls."""
+
+    def __init__(self) -> None:
+        """Initialize the call counter."""
+        self.calls = 0
+        self.streams = []
+
+    def create(self, **kwargs):
+        """Return a canned completion, or a chunk stream when streaming."""
+        self.calls += 1
+        if kwargs.get("stream"):
+            self.streams.append(FakeStream(("str", "eam", None)))
+            return self.streams[-1]
+        message = SimpleNamespace(content=f"answer {self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def cached_handler(monkeypatch) -> GroqHandler:
+    """Fixture to create a caching GroqHandler with a fake client."""
+    monkeypatch.setattr(groq_module, "_response_cache", TTLCache(maxsize=8))
+    handler = GroqHandler(api_key="fake_key", model="fake-model", cache_responses=True)
+    handler._client = SimpleNamespace(
+        chat=SimpleNamespace(completions=FakeCompletions())
+    )
+    return handler
+
+
+def test_response_cache_serves_repeated_prompts(cached_handler: GroqHandler) -> None:
+    """Test that an identical prompt is answered from the cache."""
+    messages = [{"role": "user", "content": "Hello"}]
+    first = cached_handler.query(messages)
+    second = cached_handler.query(messages)
+
+    assert first == second == {"model": "fake-model", "data": "answer 1"}
+    assert cached_handler.client.chat.completions.calls == 1
+
+
+def test_response_cache_can_be_bypassed(cached_handler: GroqHandler) -> None:
+    """Test that use_cache=False and different sampling params miss the cache."""
+    messages = [{"role": "user", "content": "Hello"}]
+    cached_handler.query(messages)
+    cached_handler.query(messages, use_cache=False)
+    cached_handler.query(messages, temperature=0.2)
+
+    assert cached_handler.client.chat.completions.calls == 3
+
+
+def test_model_catalog_is_shared_between_handlers(monkeypatch) -> None:
+    """Test that model discovery runs once per process, not once per handler."""
+    catalog = groq_module.ModelCatalog(ttl=60)
+    monkeypatch.setattr(groq_module, "_model_catalog", catalog)
+    fetches = []
+
+    def fetch_models(self):
+        fetches.append(self)
+        return [{"id": GroqHandler.default_model}]
+
+    monkeypatch.setattr(GroqHandler, "_fetch_models", fetch_models)
+
+    assert GroqHandler(api_key="fake_key").warm_up() == GroqHandler.default_model
+    assert GroqHandler(api_key="fake_key").resolve_model() == GroqHandler.default_model
+    assert len(fetches) == 1
+
+
+def test_model_catalog_refreshes_stale_entries_in_background() -> None:
+    """Test that a stale list is served while a refresh runs off the request path."""
+    catalog = groq_module.ModelCatalog(ttl=0)
+    refreshed = threading.Event()
+
+    def fetch():
+        refreshed.set()
+        return [{"id": "new"}]
+
+    catalog.store("key", [{"id": "old"}])
+    assert catalog.peek("key", fetch) == [{"id": "old"}]
+    assert refreshed.wait(timeout=1)
+    time.sleep(0.05)
+    assert catalog.peek("key", fetch) == [{"id": "new"}]
+
+
+def test_query_stream_yields_tokens_and_caches(cached_handler: GroqHandler) -> None:
+    """Test that streamed tokens are yielded and the full answer is cached."""
+    messages = [{"role": "user", "content": "Stream"}]
+    timings = {}
+
+    assert list(cached_handler.query_stream(messages, timings=timings)) == ["str", "eam"]
+    assert 0 <= timings["time_to_first_token"] <= timings["total"]
+    assert cached_handler.query(messages) == {"model": "fake-model", "data": "stream"}
+    assert cached_handler.client.chat.completions.calls == 1
+    assert cached_handler.client.chat.completions.streams[0].closed
+
+
+def test_abandoned_stream_is_closed(cached_handler: GroqHandler) -> None:
+    """Test that a consumer stopping early closes the upstream stream."""
+    messages = [{"role": "user", "content": "Stream"}]
+    tokens = cached_handler.query_stream(messages)
+
+    assert next(tokens) == "str"
+    tokens.close()
+
+    stream = cached_handler.client.chat.completions.streams[0]
+    assert stream.closed
+    assert cached_handler.query(messages) == {"model": "fake-model", "data": "answer 2"}
+
+
+@pytest.mark.asyncio
+async def test_abandoned_async_stream_is_closed(monkeypatch) -> None:
+    """Test that an async consumer stopping early closes the upstream stream."""
+    monkeypatch.setattr(groq_module, "_response_cache", TTLCache(maxsize=8))
+    handler = AsyncGroqHandler(api_key="fake_key", model="fake-model")
+    completions = FakeCompletions()
+
+    async def create(**kwargs):
+        return completions.create(**kwargs)
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    handler._async_clients[asyncio.get_running_loop()] = client
+    tokens = handler.query_stream([{"role": "user", "content": "Stream"}])
+
+    assert await tokens.__anext__() == "str"
+    await tokens.aclose()
+
+    assert completions.streams[0].closed
+
+
+def test_completions_are_charged_against_the_token_quota(
+    cached_handler: GroqHandler,
+) -> None:
+    """Test that a completion costs its estimated tokens, corrected by its usage."""
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert groq_module.estimate_prompt_tokens(messages) == 105
+    assert groq_module.completion_budget({"max_tokens": 50}) == 50
+    assert groq_module.completion_budget({}) == groq_module.DEFAULT_COMPLETION_TOKENS
+
+    cached_handler.policy = UpstreamPolicy("groq")
+    cached_handler.policy.set_quota(6000)
+    cached_handler.query(messages, use_cache=False, max_tokens=50)
+    assert cached_handler.policy.usage()["quota"]["consumed"] == 155
+
+    usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+    completions = cached_handler.client.chat.completions
+    completions.create = lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="a"))], usage=usage
+    )
+    cached_handler.query(messages, use_cache=False, max_tokens=50)
+    assert cached_handler.policy.usage()["quota"]["consumed"] == 275
@@ -0,0 +1,44 @@
+"""
+Tests for the pooled HTTP client registry.
+
+These tests only create and close clients; no network requests are made.
+"""
+
+import asyncio
+
+from utils.http_client import (
+    aclose_http_clients,
+    close_http_clients,
+    get_async_http_client,
+    get_http_client,
+)
+
+
+def test_sync_client_is_shared_per_name() -> None:
+    """Test that the same upstream name returns the same pooled client."""
+    client = get_http_client("test-upstream")
+    assert get_http_client("test-upstream") is client
+    assert get_http_client("other-upstream") is not client
+
+
+def test_close_http_clients_recreates_on_next_use() -> None:
+    """Test that closed clients are replaced on the next lookup."""
+    client = get_http_client("test-upstream")
+    close_http_clients()
+    assert client.is_closed
+    assert get_http_client("test-upstream") is not client
+
+
+def test_async_client_is_bound_to_running_loop() -> None:
+    """Test that each event loop gets its own async client."""
+
+    async def lookup():
+        client = get_async_http_client("test-upstream")
+        assert get_async_http_client("test-upstream") is client
+        await aclose_http_clients()
+        return client
+
+    first = asyncio.run(lookup())
+    second = asyncio.run(lookup())
+    assert first is not second
+    assert first.is_closed and second.is_closed
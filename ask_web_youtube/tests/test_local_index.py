@@ -0,0 +1,103 @@
+"""Tests for the local retrieval index."""
+
+import time
+
+import pytest
+
+from agent.services.local_index import WEB, YOUTUBE, LocalIndex, coverage
+from agent.services.transcript import Transcript
+
+
+@pytest.fixture
+def index(tmp_path) -> LocalIndex:
+    """Fixture to open an index in a temporary directory."""
+    index = LocalIndex(path=str(tmp_path / "index.db"), min_results=2)
+    yield index
+    index.close()
+
+
+def _serper_response(*results: tuple) -> dict:
+    """Build a Serper response from (title, link, snippet) tuples."""
+    return {
+        "organic": [
+            {"title": title, "link": link, "snippet": snippet}
+            for title, link, snippet in results
+        ]
+    }
+
+
+def test_web_results_are_searchable_and_refreshed_in_place(index: LocalIndex) -> None:
+    """Test that results are ranked by relevance and re-adding updates them."""
+    index.add_web_results(
+        _serper_response(
+            ("Python", "https://python.org", "Python is a programming language."),
+            ("Snakes", "https://snakes.example", "Pythons are large snakes."),
+            ("Rust", "https://rust-lang.org", "Rust is a systems language."),
+        )
+    )
+    hits = index.search("What is the Python programming language?", WEB)
+    assert [hit["link"] for hit in hits][:2] == [
+        "https://python.org",
+        "https://rust-lang.org",
+    ]
+
+    index.add_web_results(
+        _serper_response(("Python", "https://python.org", "Python 3.13 released."))
+    )
+    assert len(index) == 3
+    assert index.search("python released", WEB)[0]["text"] == "Python 3.13 released."
+    assert index.search("python", YOUTUBE) == []
+
+
+def test_transcripts_are_indexed_per_chunk(index: LocalIndex) -> None:
+    """Test that transcript windows become passages with their start times."""
+    transcript = Transcript.from_segments(
+        [
+            {"text": "intro to decorators", "start": 0.0, "duration": 30.0},
+            {"text": "closures capture variables", "start": 70.0, "duration": 30.0},
+        ]
+    )
+    assert index.add_transcript("abc", "Python tips", transcript) == 2
+
+    hits = index.search("closures", YOUTUBE)
+    assert [(hit["doc_id"], hit["start"]) for hit in hits] == [("abc", 70)]
+
+
+def test_lookup_requires_enough_covering_passages(index: LocalIndex) -> None:
+    """Test the result count and coverage thresholds."""
+    index.add_web_results(
+        _serper_response(("Python", "https://python.org", "Python is a language."))
+    )
+    assert index.lookup("python language", WEB) is None
+
+    index.add_web_results(
+        _serper_response(("Docs", "https://docs.python.org", "Python language docs."))
+    )
+    assert len(index.lookup("python language", WEB)) == 2
+    assert index.lookup("python language performance tuning", WEB) is None
+    assert coverage("what is python", [{"title": "", "text": "Python"}]) == 1
+
+
+def test_stale_passages_are_ignored_and_pruned(tmp_path) -> None:
+    """Test the freshness threshold."""
+    path = str(tmp_path / "index.db")
+    index = LocalIndex(path=path, max_age=0.05, min_results=1)
+    index.add_web_results(_serper_response(("Python", "https://python.org", "")))
+    assert index.lookup("python", WEB) is not None
+
+    time.sleep(0.1)
+    assert index.lookup("python", WEB) is None
+    index.close()
+
+    assert len(LocalIndex(path=path, max_age=0.05)) == 0
+
+
+def test_explicit_zero_settings_are_kept(tmp_path, monkeypatch) -> None:
+    """Test that 0 passed explicitly is not replaced by the environment."""
+    monkeypatch.setenv("LOCAL_INDEX_MAX_AGE", "3600")
+    monkeypatch.setenv("LOCAL_INDEX_MIN_RESULTS", "5")
+    index = LocalIndex(path=str(tmp_path / "index.db"), max_age=0, min_results=0)
+
+    assert index.max_age == 0
+    assert index.min_results == 0
+    index.close()
@@ -0,0 +1,74 @@
+"""
+Tests for the queue-based logging pipeline.
+
+Each test restarts the background listener with a temporary log file, so no
+output is written to the working directory.
+"""
+
+import logging
+import time
+
+import pytest
+
+from utils import log_config
+
+
+@pytest.fixture
+def logger(tmp_path, monkeypatch) -> logging.Logger:
+    """Fixture to create a logger writing through a fresh listener."""
+    log_config.shutdown_logging()
+    monkeypatch.setenv("LOG_FILE", str(tmp_path / "app.log"))
+    monkeypatch.setenv("LOG_MAX_MESSAGE_CHARS", "50")
+    monkeypatch.setattr(log_config, "_buffer_handler", log_config.RingBufferHandler(5))
+    logger = log_config.setup_logger(f"test_log_config.{time.monotonic_ns()}")
+    yield logger
+    log_config.shutdown_logging()
+
+
+def test_records_reach_file_and_buffer(logger: logging.Logger, tmp_path) -> None:
+    """Test that queued records are written by the listener thread."""
+    logger.info("hello %s", "world")
+    log_config.shutdown_logging()
+
+    assert "hello world" in log_config.get_log_buffer()
+    assert "hello world" in (tmp_path / "app.log").read_text()
+
+
+def test_buffer_keeps_only_recent_records(logger: logging.Logger) -> None:
+    """Test that the ring buffer drops the oldest records once full."""
+    for n in range(20):
+        logger.info("record %d", n)
+    log_config.shutdown_logging()
+
+    lines = log_config.get_log_buffer().splitlines()
+    assert len(lines) == 5
+    assert lines[-1].endswith("record 19")
+    assert "record 14" not in log_config.get_log_buffer()
+
+
+def test_long_messages_are_truncated(logger: logging.Logger) -> None:
+    """Test that oversized payloads are cut down before being written."""
+    logger.info("payload: %s", "x" * 1000)
+    log_config.shutdown_logging()
+
+    line = log_config.get_log_buffer()
+    assert "chars truncated]" in line
+    assert len(line) < 200
+
+
+def test_formatting_is_deferred_to_the_listener(logger: logging.Logger) -> None:
+    """Test that the calling thread does not render the message."""
+    rendered = []
+
+    class Payload:
+        def __str__(self) -> str:
+            rendered.append(True)
+            return "payload"
+
+    record = logger.makeRecord(
+        logger.name, logging.INFO, __file__, 0, "%s", (Payload(),), None
+    )
+    prepared = log_config._queue_handler.prepare(record)
+
+    assert rendered == []
+    assert prepared.args == record.args
@@ -0,0 +1,118 @@
+"""
+Tests for the tracing and metrics module.
+
+The process-wide registry is reset before each test.
+"""
+
+import asyncio
+import json
+import urllib.request
+
+import pytest
+
+from utils import metrics
+from utils.metrics import Histogram, Trace, activate_trace, get_registry, span
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    """Reset the shared registry and make sure instrumentation is on."""
+    metrics.set_metrics_enabled(True)
+    get_registry().reset()
+    yield get_registry()
+    get_registry().reset()
+
+
+def test_histogram_quantiles() -> None:
+    """Test that quantiles are estimated within the right bucket."""
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 0.5, 1.5, 3.0):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["buckets"][-1] == (float("inf"), 4)
+    assert 0 < histogram.quantile(0.5) <= 1.0
+    assert 2.0 < histogram.quantile(0.99) <= 4.0
+    assert Histogram().quantile(0.5) is None
+
+
+def test_span_records_duration_cache_and_bytes(registry) -> None:
+    """Test that a span feeds the histogram and counters."""
+    with span("stage.a") as stage:
+        stage.set(cache_hit=False, bytes_in=100)
+
+    exported = registry.to_json()
+    series = exported["histograms"]["agent_stage_duration_seconds"][0]
+    assert series["labels"] == {"stage": "stage.a"}
+    assert series["count"] == 1
+    assert registry.counter_value("agent_stage_bytes_in_total", stage="stage.a") == 100
+    assert registry.counter_value(
+        "agent_stage_cache_total", stage="stage.a", result="miss"
+    ) == 1
+
+
+def test_span_counts_errors(registry) -> None:
+    """Test that raised and handled errors are both counted."""
+    with pytest.raises(RuntimeError):
+        with span("stage.b"):
+            raise RuntimeError("boom")
+    with span("stage.b") as stage:
+        stage.fail(ValueError("handled"))
+
+    assert registry.counter_value("agent_stage_errors_total", stage="stage.b") == 2
+
+
+def test_trace_collects_spans_across_tasks() -> None:
+    """Test that spans from concurrent tasks join the active trace."""
+    trace = Trace()
+
+    async def stage(name: str) -> None:
+        with span(name):
+            await asyncio.sleep(0.01)
+
+    async def request() -> None:
+        with activate_trace(trace):
+            await asyncio.gather(stage("web"), stage("youtube"))
+
+    asyncio.run(request())
+
+    assert {row["stage"] for row in trace.breakdown()} == {"web", "youtube"}
+    assert all(row["seconds"] >= 0.01 for row in trace.breakdown())
+
+
+def test_disabled_spans_record_nothing(registry) -> None:
+    """Test that a disabled registry returns the shared no-op span."""
+    metrics.set_metrics_enabled(False)
+    trace = Trace()
+    with activate_trace(trace):
+        with span("stage.c") as stage:
+            stage.set(bytes_in=1)
+
+    assert stage is metrics._NOOP_SPAN
+    assert trace.spans == []
+    assert registry.to_json() == {"counters": {}, "histograms": {}}
+
+
+def test_prometheus_export(registry) -> None:
+    """Test the Prometheus text exposition format."""
+    with span('stage "d"'):
+        pass
+
+    text = registry.to_prometheus()
+    assert "# TYPE agent_stage_duration_seconds histogram" in text
+    assert 'agent_stage_duration_seconds_bucket{stage="stage \\"d\\"",le="+Inf"} 1' in text
+    assert 'agent_stage_duration_seconds_count{stage="stage \\"d\\""} 1' in text
+
+
+def test_metrics_server(registry) -> None:
+    """Test that the HTTP exporter serves both formats."""
+    with span("stage.e"):
+        pass
+    server = metrics.start_metrics_server(port=0)
+    port = server.server_address[1]
+
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+        assert b"agent_stage_duration_seconds_count" in response.read()
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics.json") as response:
+        assert "histograms" in json.load(response)
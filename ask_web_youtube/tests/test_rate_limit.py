@@ -0,0 +1,104 @@
+"""Tests for the token bucket rate limiter."""
+
+import asyncio
+import time
+
+import pytest
+
+from utils.deadline import Deadline, DeadlineExceeded, use_deadline
+from utils.rate_limit import BATCH, RateLimiter, use_priority
+from utils.resilience import UpstreamPolicy
+
+
+class FakeClock:
+    """A manually advanced monotonic clock."""
+
+    def __init__(self) -> None:
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_refills() -> None:
+    """Test that the burst is spent at once and tokens come back at the rate."""
+    clock = FakeClock()
+    limiter = RateLimiter("test", rate=2, burst=3, clock=clock)
+
+    assert [limiter.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.now = 0.5
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_waiting_callers_reserve_their_tokens() -> None:
+    """Test that each caller waits for its own share of the refill."""
+    clock = FakeClock()
+    limiter = RateLimiter("test", rate=10, burst=1, clock=clock)
+
+    assert limiter._reserve(1) == 0
+    assert limiter._reserve(1) == pytest.approx(0.1)
+    assert limiter._reserve(1) == pytest.approx(0.2)
+
+
+def test_wait_beyond_the_deadline_fails_fast() -> None:
+    """Test that a caller does not queue for tokens it could not use in time."""
+    limiter = RateLimiter("test", rate=1, burst=1)
+    limiter.acquire()
+
+    with use_deadline(Deadline.after(0.1)):
+        with pytest.raises(DeadlineExceeded):
+            limiter.acquire()
+    assert not limiter.try_acquire()
+
+
+def test_policy_paces_attempts() -> None:
+    """Test that every attempt of a rate-limited policy takes a token."""
+    policy = UpstreamPolicy("test")
+    policy.set_rate_limit(20, burst=1)
+
+    async def run() -> None:
+        for _ in range(3):
+            await policy.call_async(lambda: asyncio.sleep(0))
+
+    started_at = time.perf_counter()
+    asyncio.run(run())
+    assert time.perf_counter() - started_at >= 0.09
+
+    policy.set_rate_limit(None)
+    assert policy.rate_limiter is None
+
+
+def test_batch_callers_leave_the_reserve_to_interactive_ones() -> None:
+    """Test that batch work only spends tokens beyond the reserve."""
+    clock = FakeClock()
+    limiter = RateLimiter("test", rate=1, burst=10, reserve=4, clock=clock)
+
+    with use_priority(BATCH):
+        assert limiter._poll(6) == 0
+        assert not limiter.try_acquire()
+        assert limiter._poll(1) == pytest.approx(1)
+    assert limiter.try_acquire(4)
+
+    # Interactive callers borrow; batch callers wait until the debt is repaid.
+    assert limiter._reserve(2) == pytest.approx(2)
+    with use_priority(BATCH):
+        assert limiter._poll(1) == pytest.approx(7)
+
+
+def test_usage_reports_tokens_backlog_and_consumption() -> None:
+    """Test the usage report, including tokens given back."""
+    clock = FakeClock()
+    limiter = RateLimiter("test", rate=2, burst=4, clock=clock)
+    limiter._reserve(6)
+    limiter.release(1)
+
+    assert limiter.usage() == {
+        "rate": 2,
+        "burst": 4,
+        "available": -1,
+        "backlog": 0.5,
+        "consumed": 5,
+    }
@@ -0,0 +1,417 @@
+"""Tests for retries, hedging and circuit breakers."""
+
+import asyncio
+import email.utils
+import socket
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import httpx
+import pytest
+
+from utils.deadline import Deadline, DeadlineExceeded, use_deadline
+from utils.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    UpstreamPolicy,
+    build_policy,
+    is_retryable,
+    retry_after_of,
+    status_code_of,
+)
+
+
+def _status_error(
+    status: int, headers: Optional[Dict[str, str]] = None
+) -> httpx.HTTPStatusError:
+    """Build the error httpx raises for an error status."""
+    request = httpx.Request("GET", "https://example.com")
+    response = httpx.Response(status, request=request, headers=headers)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class FakeClock:
+    """A manually advanced monotonic clock."""
+
+    def __init__(self) -> None:
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def test_status_codes_are_read_from_upstream_errors() -> None:
+    """Test httpx, Groq-style and googleapiclient-style errors."""
+    assert status_code_of(_status_error(503)) == 503
+    assert status_code_of(SimpleNamespace(status_code=429)) == 429
+    assert status_code_of(SimpleNamespace(resp=SimpleNamespace(status="500"))) == 500
+    assert status_code_of(ValueError("no response")) is None
+
+
+def test_retryable_errors_follow_the_cause_chain() -> None:
+    """Test that wrapped transport errors count as transient."""
+    assert is_retryable(_status_error(503))
+    assert not is_retryable(_status_error(401))
+    assert is_retryable(httpx.ConnectTimeout("slow"))
+    try:
+        try:
+            raise httpx.ConnectError("refused")
+        except httpx.ConnectError as e:
+            raise RuntimeError("SDK connection error") from e
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
+    assert not is_retryable(ValueError("bad input"))
+
+
+def test_youtube_transport_errors_are_transient() -> None:
+    """Test the errors googleapiclient's httplib2 transport raises."""
+    httplib2 = pytest.importorskip("httplib2")
+    assert is_retryable(httplib2.ServerNotFoundError("no such host"))
+    assert is_retryable(socket.timeout("timed out"))
+    assert is_retryable(socket.gaierror(-2, "Name or service not known"))
+
+
+def test_non_retryable_errors_do_not_reset_the_breaker() -> None:
+    """Test that a bad request neither closes nor opens the circuit."""
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    policy = UpstreamPolicy("test", max_attempts=1, breaker=breaker)
+
+    def down():
+        raise httpx.ConnectError("refused")
+
+    def bad_request():
+        raise _status_error(400)
+
+    with pytest.raises(httpx.ConnectError):
+        policy.call(down)
+    with pytest.raises(httpx.HTTPStatusError):
+        policy.call(bad_request)
+    with pytest.raises(httpx.ConnectError):
+        policy.call(down)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_backoff_is_jittered_and_capped() -> None:
+    """Test that delays stay within the exponential bound and the maximum."""
+    policy = UpstreamPolicy("test", backoff_base=0.1, backoff_max=0.5)
+    delays = [policy.backoff(retry) for retry in range(6) for _ in range(50)]
+    assert all(0 <= delay <= 0.5 for delay in delays)
+    assert max(policy.backoff(0) for _ in range(50)) <= 0.1
+    assert len(set(delays)) > 1
+
+
+def test_transient_failures_are_retried() -> None:
+    """Test that a 503 is retried until the upstream answers."""
+    policy = UpstreamPolicy("test", max_attempts=3, backoff_base=0)
+    outcomes = [_status_error(503), _status_error(503), "ok"]
+
+    def call() -> str:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert policy.call(call) == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retries_are_bounded_and_client_errors_are_not_retried() -> None:
+    """Test the attempt limit and that a 4xx fails at once."""
+    policy = UpstreamPolicy("test", max_attempts=2, backoff_base=0)
+    calls = []
+
+    def failing(status: int):
+        def call():
+            calls.append(status)
+            raise _status_error(status)
+
+        return call
+
+    with pytest.raises(httpx.HTTPStatusError):
+        policy.call(failing(503))
+    assert calls == [503, 503]
+
+    calls.clear()
+    with pytest.raises(httpx.HTTPStatusError):
+        policy.call(failing(400))
+    assert calls == [400]
+
+
+def test_circuit_opens_fails_fast_and_recovers() -> None:
+    """Test the closed -> open -> half-open -> closed cycle."""
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10, clock=clock)
+    policy = UpstreamPolicy("test", max_attempts=1, breaker=breaker)
+
+    def down():
+        raise httpx.ConnectError("refused")
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            policy.call(down)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        policy.call(lambda: "never called")
+    assert excinfo.value.retry_after == pytest.approx(10)
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert policy.call(lambda: "back") == "back"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_circuit_allows_a_single_trial() -> None:
+    """Test that only one caller probes a recovering upstream."""
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def _warm(policy: UpstreamPolicy, seconds: float) -> None:
+    """Record enough latency samples for hedging to start."""
+    for _ in range(policy.hedge_min_samples):
+        policy.latency.observe(seconds)
+
+
+def test_slow_requests_are_hedged() -> None:
+    """Test that a duplicate request answers when the first one stalls."""
+    policy = UpstreamPolicy("test", hedge=True, hedge_min_samples=5)
+    _warm(policy, 0.01)
+    calls = []
+
+    def call() -> str:
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(1)
+            return "slow"
+        return "fast"
+
+    started_at = time.perf_counter()
+    assert policy.call(call) == "fast"
+    assert time.perf_counter() - started_at < 0.5
+    assert len(calls) == 2
+
+
+def test_hedging_waits_for_enough_samples() -> None:
+    """Test that no hedge delay is derived from too few observations."""
+    policy = UpstreamPolicy("test", hedge=True, hedge_min_samples=5)
+    assert policy.hedge_delay() is None
+    _warm(policy, 0.2)
+    assert 0 < policy.hedge_delay() <= 0.25
+    assert UpstreamPolicy("test").hedge_delay() is None
+
+
+def test_async_hedge_cancels_the_loser() -> None:
+    """Test async hedging: the fast duplicate wins and the stalled call is cancelled."""
+    policy = UpstreamPolicy("test", hedge=True, hedge_min_samples=5)
+    _warm(policy, 0.01)
+    cancelled = []
+    calls = []
+
+    async def call() -> str:
+        calls.append(None)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "slow"
+        return "fast"
+
+    async def main() -> str:
+        result = await policy.call_async(call)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "fast"
+    assert cancelled == [True]
+
+
+def test_async_calls_are_retried() -> None:
+    """Test that the async path retries transient failures too."""
+    policy = UpstreamPolicy("test", max_attempts=2, backoff_base=0)
+    attempts = []
+
+    async def call() -> str:
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise httpx.ReadTimeout("slow")
+        return "ok"
+
+    assert asyncio.run(policy.call_async(call)) == "ok"
+    assert len(attempts) == 2
+
+
+def test_no_retry_is_started_past_the_deadline() -> None:
+    """Test that a failure at the deadline raises instead of retrying."""
+    policy = UpstreamPolicy("test", max_attempts=5, backoff_base=0)
+    clock = FakeClock()
+    calls = []
+
+    def call() -> str:
+        calls.append(None)
+        clock.now += 1.0
+        raise httpx.ReadTimeout("slow")
+
+    with use_deadline(Deadline.after(1.0, clock)):
+        with pytest.raises(DeadlineExceeded):
+            policy.call(call)
+    assert len(calls) == 1
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_attempt_timeout_is_clipped_to_the_deadline() -> None:
+    """Test that request timeouts never outlast the active deadline."""
+    policy = UpstreamPolicy("test", timeout=10)
+    clock = FakeClock()
+
+    assert policy.attempt_timeout() == 10
+    with use_deadline(Deadline.after(2.0, clock)):
+        assert policy.attempt_timeout() == 2.0
+        assert policy.attempt_timeout(1.0) == 1.0
+
+
+def test_async_attempt_is_cancelled_at_the_deadline() -> None:
+    """Test that a hanging async attempt is cut off when the deadline passes."""
+    policy = UpstreamPolicy("test", max_attempts=3, backoff_base=0)
+
+    async def hang() -> str:
+        await asyncio.sleep(5)
+        return "late"
+
+    async def run() -> str:
+        with use_deadline(Deadline.after(0.1)):
+            return await policy.call_async(hang, hedge=False)
+
+    started_at = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert time.perf_counter() - started_at < 1
+
+
+def test_retry_after_is_read_from_upstream_errors() -> None:
+    """Test Retry-After in seconds, as an HTTP date and in httplib2 responses."""
+    assert retry_after_of(_status_error(429, {"Retry-After": "3"})) == 3
+    later = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < retry_after_of(_status_error(503, {"Retry-After": later})) <= 60
+    assert retry_after_of(SimpleNamespace(resp={"retry-after": "2"})) == 2
+    assert retry_after_of(_status_error(429)) is None
+
+
+def test_throttled_upstream_pauses_without_opening_the_circuit() -> None:
+    """Test that a 429 holds back the retry for its Retry-After."""
+    policy = UpstreamPolicy("test", max_attempts=2, backoff_base=0)
+    policy.breaker.failure_threshold = 1
+    outcomes = [_status_error(429, {"Retry-After": "0.2"}), "ok"]
+
+    def call() -> str:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    started_at = time.perf_counter()
+    assert policy.call(call) == "ok"
+    assert time.perf_counter() - started_at >= 0.2
+    assert policy.breaker.state == "closed"
+
+    # A pause longer than the deadline fails the call without waiting.
+    policy.pause(5)
+    with use_deadline(Deadline.after(1)):
+        with pytest.raises(DeadlineExceeded):
+            policy.call(lambda: "ok")
+
+
+def test_attempts_are_charged_their_cost_against_the_quota() -> None:
+    """Test that each attempt spends its cost and usage is corrected later."""
+    policy = UpstreamPolicy("test", max_attempts=2, backoff_base=0)
+    policy.set_quota(1000, period=3600)
+    outcomes = [_status_error(503), "ok"]
+
+    def call() -> str:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    policy.call(call, cost=100)
+    assert policy.usage()["quota"]["consumed"] == 200
+
+    policy.settle_cost(100, 40)
+    usage = policy.usage()
+    assert usage["quota"]["consumed"] == 140
+    assert usage["requests"] is None
+    assert usage["circuit"] == "closed"
+
+
+def test_attempts_that_never_reach_the_upstream_are_refunded() -> None:
+    """Test that failed connects give back their quota cost, served calls don't."""
+    policy = UpstreamPolicy("test", max_attempts=4, backoff_base=0)
+    policy.set_quota(1000, period=3600)
+    policy.set_rate_limit(100)
+    outcomes = [
+        httpx.ConnectError("refused"),
+        httpx.ReadTimeout("sent, no answer"),
+        "ok",
+    ]
+
+    def call() -> str:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert policy.call(call, cost=100) == "ok"
+    usage = policy.usage()
+    assert usage["quota"]["consumed"] == 200
+    assert usage["requests"]["consumed"] == 2
+
+    def short_circuited() -> str:
+        raise CircuitOpenError("nested", 1)
+
+    with pytest.raises(CircuitOpenError):
+        policy.call(short_circuited, cost=100)
+    async def unreachable() -> str:
+        raise httpx.ConnectTimeout("no route")
+
+    with pytest.raises(httpx.ConnectTimeout):
+        asyncio.run(policy.call_async(unreachable, cost=100))
+    assert policy.usage()["quota"]["consumed"] == 200
+
+
+def test_build_policy_reads_environment(monkeypatch) -> None:
+    """Test that policies are configured from prefixed environment variables."""
+    monkeypatch.setenv("TEST_TIMEOUT", "2.5")
+    monkeypatch.setenv("TEST_MAX_ATTEMPTS", "4")
+    monkeypatch.setenv("TEST_HEDGE", "1")
+    monkeypatch.setenv("TEST_BREAKER_THRESHOLD", "7")
+
+    policy = build_policy("test")
+
+    assert policy.timeout == 2.5
+    assert policy.max_attempts == 4
+    assert policy.hedge
+    assert policy.breaker.failure_threshold == 7
+
+
+def test_build_policy_reads_quota(monkeypatch) -> None:
+    """Test that a quota is configured in units per period."""
+    monkeypatch.setenv("TEST_QUOTA", "10000")
+    monkeypatch.setenv("TEST_QUOTA_PERIOD", "86400")
+
+    quota = build_policy("test").quota
+
+    assert quota.burst == 10000
+    assert quota.rate == pytest.approx(10000 / 86400)
@@ -3,10 +3,22 @@ Tests for SerperSearchHandler using pytest standards.
 
 This module tests the functionality of the SerperSearchHandler
 without mocking, ensuring that credentials are working as expected.
+The page merging tests run offline against an httpx mock transport.
 """
 
+import asyncio
+import json
+from typing import Optional
+
+import httpx
 import pytest
-from agent.services.serper_search_handler import SerperSearchHandler
+from agent.services.serper_search_handler import (
+    AsyncSerperSearchHandler,
+    SerperSearchHandler,
+    normalize_url,
+)
+from utils.cache import TTLCache
+from utils.resilience import UpstreamPolicy
 
 
 @pytest.fixture
@@ -29,3 +41,186 @@ def test_search_empty_query(handler: SerperSearchHandler) -> None:
     """Test that an empty query raises a ValueError."""
     with pytest.raises(ValueError, match="Search query cannot be empty."):
         handler.search("")
+
+
+def _paged_transport(
+    pages: dict, requests: Optional[list] = None
+) -> httpx.MockTransport:
+    """Build a mock transport that serves canned organic results per page."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        if requests is not None:
+            requests.append(body)
+        page = int(body["page"])
+        if page not in pages:
+            return httpx.Response(500)
+        organic = [
+            {"title": link, "link": link, "position": position}
+            for position, link in enumerate(pages[page], start=1)
+        ]
+        return httpx.Response(
+            200, json={"searchParameters": {"page": page}, "organic": organic}
+        )
+
+    return httpx.MockTransport(handler)
+
+
+PAGES = {
+    1: ["https://a.com/", "https://www.b.com/x?utm_source=feed"],
+    2: ["https://b.com/x", "https://c.com"],
+    3: ["https://d.com#section"],
+}
+
+
+def test_normalize_url_folds_trivial_differences() -> None:
+    """Test that tracking params, www, fragments and trailing slashes are ignored."""
+    assert normalize_url("https://www.B.com/x/?utm_source=feed#top") == normalize_url(
+        "https://b.com/x"
+    )
+
+
+def test_search_merges_and_dedupes_pages() -> None:
+    """Test that all pages are merged into one ranked, deduplicated list."""
+    handler = SerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.Client(transport=_paged_transport(PAGES)),
+        cache=TTLCache(),
+    )
+    result = handler.search("query", max_pages=3)
+
+    links = [item["link"] for item in result["organic"]]
+    assert links == [
+        "https://a.com/",
+        "https://www.b.com/x?utm_source=feed",
+        "https://c.com",
+        "https://d.com#section",
+    ]
+    assert [item["position"] for item in result["organic"]] == [1, 2, 3, 4]
+    assert set(result) == {"organic"}
+
+
+def test_search_skips_failed_pages() -> None:
+    """Test that a failing page does not discard the other pages."""
+    handler = SerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.Client(transport=_paged_transport({2: PAGES[2]})),
+        cache=TTLCache(),
+    )
+    result = handler.search("query", max_pages=3)
+    assert [item["link"] for item in result["organic"]] == PAGES[2]
+
+
+def test_iter_results_stops_early() -> None:
+    """Test that the fan-out stops once enough unique results are collected."""
+    handler = SerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.Client(transport=_paged_transport(PAGES)),
+        cache=TTLCache(),
+    )
+    results = list(handler.iter_results("query", max_pages=3, max_results=2))
+    assert len(results) >= 2
+    assert len({normalize_url(item["link"]) for item in results}) == len(results)
+
+
+@pytest.mark.asyncio
+async def test_async_search_merges_pages() -> None:
+    """Test that the async handler merges concurrent pages the same way."""
+    handler = AsyncSerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.AsyncClient(transport=_paged_transport(PAGES)),
+        cache=TTLCache(),
+    )
+    result = await handler.search("query", max_pages=3, max_results=3)
+    assert len(result["organic"]) == 3
+
+
+def test_search_results_are_cached_by_normalized_query() -> None:
+    """Test that near-identical queries are served from the result cache."""
+    requests = []
+    cache = TTLCache()
+    handler = SerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.Client(transport=_paged_transport(PAGES, requests)),
+        cache=cache,
+    )
+    first = handler.search("What is Python?", max_pages=3)
+    second = handler.search("  what is PYTHON ", max_pages=3)
+
+    assert first == second
+    assert len(requests) == 3
+    assert cache.stats()["hits"] == 3
+
+
+def test_locale_is_part_of_the_cache_key() -> None:
+    """Test that a different locale does not reuse cached pages."""
+    requests = []
+    cache = TTLCache()
+    transport = _paged_transport(PAGES, requests)
+    SerperSearchHandler(
+        api_key="fake_key", client=httpx.Client(transport=transport), cache=cache
+    ).search("query", max_pages=1)
+    SerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.Client(transport=transport),
+        cache=cache,
+        gl="de",
+        hl="de",
+    ).search("query", max_pages=1)
+
+    assert len(requests) == 2
+    assert requests[1]["gl"] == "de" and requests[1]["hl"] == "de"
+
+
+def test_transient_page_errors_are_retried() -> None:
+    """Test that a page answered with 503 is retried by the upstream policy."""
+    attempts = []
+
+    def flaky(request: httpx.Request) -> httpx.Response:
+        attempts.append(None)
+        if len(attempts) == 1:
+            return httpx.Response(503)
+        return httpx.Response(
+            200, json={"organic": [{"title": "a", "link": "https://a.com"}]}
+        )
+
+    handler = SerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.Client(transport=httpx.MockTransport(flaky)),
+        cache=TTLCache(maxsize=8),
+        policy=UpstreamPolicy("serper", backoff_base=0),
+    )
+
+    result = handler.search("query", max_pages=1)
+
+    assert [item["link"] for item in result["organic"]] == ["https://a.com"]
+    assert len(attempts) == 2
+
+
+def test_concurrent_identical_searches_share_page_requests() -> None:
+    """Test that concurrent searches for the same query request each page once."""
+    requests = []
+
+    async def slow(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content)["page"])
+        await asyncio.sleep(0.05)
+        return httpx.Response(
+            200, json={"organic": [{"title": "a", "link": "https://a.com"}]}
+        )
+
+    handler = AsyncSerperSearchHandler(
+        api_key="fake_key",
+        client=httpx.AsyncClient(transport=httpx.MockTransport(slow)),
+        cache=TTLCache(maxsize=8),
+    )
+
+    async def run():
+        return await asyncio.gather(
+            handler.search("What is Python?", max_pages=2),
+            handler.search("what is python", max_pages=2),
+        )
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert sorted(requests) == ["1", "2"]
@@ -0,0 +1,167 @@
+"""Tests for coalescing identical in-flight calls."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.deadline import Deadline, DeadlineExceeded, use_deadline
+from utils.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def _run_in_threads(count: int, target) -> list:
+    """Run `target` in several threads and collect what each returns or raises."""
+    outcomes = [None] * count
+
+    def run(index: int) -> None:
+        try:
+            outcomes[index] = target()
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_concurrent_calls_share_one_execution() -> None:
+    """Test that callers arriving while the leader runs share its result."""
+    flights = SingleFlight("test")
+    calls = []
+
+    def fetch() -> str:
+        calls.append(None)
+        time.sleep(0.2)
+        return "result"
+
+    outcomes = _run_in_threads(5, lambda: flights.do("key", fetch))
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in outcomes) == [False, True, True, True, True]
+    assert {result for result, _ in outcomes} == {"result"}
+    assert flights.in_flight() == 0
+
+
+def test_errors_are_shared_and_not_remembered() -> None:
+    """Test that followers get the leader's error and the next call runs again."""
+    flights = SingleFlight("test")
+    calls = []
+
+    def fail() -> str:
+        calls.append(None)
+        time.sleep(0.2)
+        raise ConnectionError("down")
+
+    outcomes = _run_in_threads(3, lambda: flights.do("key", fail))
+
+    assert len(calls) == 1
+    assert all(isinstance(outcome, ConnectionError) for outcome in outcomes)
+    assert flights.do("key", lambda: "recovered") == ("recovered", False)
+
+
+def test_follower_stops_waiting_at_its_deadline() -> None:
+    """Test that a follower does not wait past the active deadline."""
+    flights = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow() -> str:
+        started.set()
+        release.wait()
+        return "late"
+
+    leader = threading.Thread(target=flights.do, args=("key", slow))
+    leader.start()
+    started.wait()
+    try:
+        with use_deadline(Deadline.after(0.05)):
+            with pytest.raises(DeadlineExceeded):
+                flights.do("key", slow)
+    finally:
+        release.set()
+        leader.join()
+
+
+def test_async_calls_share_one_execution() -> None:
+    """Test that concurrent coroutines with the same key share one execution."""
+    flights = AsyncSingleFlight("test")
+    calls = []
+
+    async def fetch() -> str:
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(
+            flights.do("key", fetch), flights.do("key", fetch), flights.do("other", fetch)
+        )
+
+    outcomes = asyncio.run(run())
+
+    assert len(calls) == 2
+    assert [shared for _, shared in outcomes] == [False, True, False]
+    assert flights.in_flight() == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_others() -> None:
+    """Test that the shared task keeps running while someone still waits for it."""
+    flights = AsyncSingleFlight("test")
+    cancelled = []
+
+    async def fetch() -> str:
+        try:
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "result"
+
+    async def run():
+        leader = asyncio.ensure_future(flights.do("key", fetch))
+        follower = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+
+        lonely = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0.01)
+        lonely.cancel()
+        await asyncio.gather(lonely, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return result
+
+    assert asyncio.run(run()) == ("result", True)
+    assert cancelled == [True]
+    assert flights.in_flight() == 0
+
+
+def test_async_follower_stops_waiting_at_its_deadline() -> None:
+    """Test that an async follower gives up at its own deadline, not the leader's."""
+    flights = AsyncSingleFlight("test")
+
+    async def slow() -> str:
+        await asyncio.sleep(0.2)
+        return "late"
+
+    async def follow() -> float:
+        started = time.perf_counter()
+        with use_deadline(Deadline.after(0.05)):
+            with pytest.raises(DeadlineExceeded):
+                await flights.do("key", slow)
+        return time.perf_counter() - started
+
+    async def run():
+        leader = asyncio.ensure_future(flights.do("key", slow))
+        await asyncio.sleep(0)
+        waited = await follow()
+        return waited, await leader
+
+    waited, outcome = asyncio.run(run())
+
+    assert waited < 0.15
+    assert outcome == ("late", False)
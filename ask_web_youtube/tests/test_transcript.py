@@ -0,0 +1,61 @@
+"""
+Tests for the column-oriented Transcript.
+
+These tests run offline on synthetic segments.
+"""
+
+import pytest
+
+from agent.services.transcript import Segment, Transcript
+
+SEGMENTS = [
+    {"text": "Hello ", "start": 0.0, "duration": 20.0},
+    {"text": "wörld", "start": 20.0, "duration": 20.0},
+    {"text": " ", "start": 40.0, "duration": 20.0},
+    {"text": "again", "start": 60.0, "duration": 30.5},
+]
+
+
+@pytest.fixture
+def transcript() -> Transcript:
+    """Fixture to build a small transcript."""
+    return Transcript.from_segments(SEGMENTS)
+
+
+def test_segments_round_trip(transcript: Transcript) -> None:
+    """Test that the columns reproduce the original segments."""
+    assert len(transcript) == 4
+    assert transcript[1] == Segment("wörld", 20.0, 20.0)
+    assert transcript[-1].text == "again"
+    assert transcript.to_segments() == SEGMENTS
+    assert transcript.duration == 90.5
+
+
+def test_index_out_of_range(transcript: Transcript) -> None:
+    """Test that indexing past the last segment raises IndexError."""
+    with pytest.raises(IndexError):
+        transcript[4]
+
+
+def test_slice_by_time_range(transcript: Transcript) -> None:
+    """Test that slicing keeps the segments starting within the range."""
+    sliced = transcript.slice(15.0, 60.0)
+
+    assert [segment.text for segment in sliced] == ["wörld", " "]
+    assert list(sliced.starts) == [20.0, 40.0]
+    assert len(transcript.slice(100.0, 200.0)) == 0
+
+
+def test_chunks_group_segments_by_window(transcript: Transcript) -> None:
+    """Test that segments are grouped into windows keyed by their start time."""
+    assert transcript.chunks(window_seconds=60) == [(0, "Hello wörld"), (60, "again")]
+
+
+def test_to_prompt(transcript: Transcript) -> None:
+    """Test the compact prompt serialization."""
+    assert transcript.to_prompt(window_seconds=60) == "[0] Hello wörld\n[60] again"
+
+
+def test_uses_slots(transcript: Transcript) -> None:
+    """Test that transcripts do not carry a per-instance __dict__."""
+    assert not hasattr(transcript, "__dict__")
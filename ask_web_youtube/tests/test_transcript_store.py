@@ -0,0 +1,91 @@
+"""
+Tests for the persistent TranscriptStore.
+
+Each test uses a temporary SQLite database, so no external services are needed.
+"""
+
+import time
+
+import pytest
+
+from agent.services.transcript import Transcript
+from agent.services.transcript_store import TRANSCRIPT_UNAVAILABLE, TranscriptStore
+
+SEGMENTS = Transcript.from_segments(
+    [
+        {"text": "Hello ", "start": 0.0, "duration": 1.5},
+        {"text": "wörld", "start": 1.5, "duration": 2.25},
+        {"text": "", "start": 3.75, "duration": 0.5},
+    ]
+)
+
+
+@pytest.fixture
+def store(tmp_path) -> TranscriptStore:
+    """Fixture to create a TranscriptStore in a temporary directory."""
+    return TranscriptStore(path=str(tmp_path / "transcripts.db"))
+
+
+def test_round_trip(store: TranscriptStore) -> None:
+    """Test that stored transcripts are returned unchanged."""
+    store.put("abc", SEGMENTS)
+    assert store.get("abc") == SEGMENTS
+    assert store.get("missing") is None
+
+
+def test_persists_across_instances(store: TranscriptStore) -> None:
+    """Test that transcripts survive reopening the database."""
+    store.put("abc", SEGMENTS)
+    store.close()
+    assert TranscriptStore(path=store.path).get("abc") == SEGMENTS
+
+
+def test_negative_entries_expire(tmp_path) -> None:
+    """Test that 'no transcript' entries are cached only for their TTL."""
+    store = TranscriptStore(path=str(tmp_path / "t.db"), negative_ttl=0.05)
+    store.put_unavailable("abc")
+    assert store.get("abc") is TRANSCRIPT_UNAVAILABLE
+    time.sleep(0.1)
+    assert store.get("abc") is None
+
+
+def test_zero_negative_ttl_disables_negative_caching(tmp_path, monkeypatch) -> None:
+    """Test that an explicit 0 is not replaced by the environment or default."""
+    monkeypatch.setenv("TRANSCRIPT_STORE_NEGATIVE_TTL", "3600")
+    store = TranscriptStore(path=str(tmp_path / "t.db"), negative_ttl=0)
+    store.put_unavailable("abc")
+
+    assert store.negative_ttl == 0
+    assert store.get("abc") is None
+
+
+def test_evicts_least_recently_used(tmp_path) -> None:
+    """Test that the oldest transcripts are evicted past the size limit."""
+    long_segments = Transcript.from_segments(
+        {"text": f"segment {n} " * 20, "start": float(n), "duration": 1.0}
+        for n in range(50)
+    )
+    probe = TranscriptStore(path=str(tmp_path / "probe.db"))
+    probe.put("probe", long_segments)
+    row_size = probe.total_bytes
+
+    store = TranscriptStore(path=str(tmp_path / "t.db"), max_bytes=row_size * 3)
+    for video_id in ("a", "b", "c", "d"):
+        store.put(video_id, long_segments)
+        time.sleep(0.01)
+
+    assert store.get("a") is None
+    assert store.get("d") == long_segments
+    assert store.total_bytes <= row_size * 3
+
+
+def test_lookup_is_fast(store: TranscriptStore) -> None:
+    """Test that a warm lookup stays well under a millisecond on average."""
+    store.put(
+        "abc", Transcript.from_segments(SEGMENTS.to_segments() * 100)
+    )
+    store.get("abc")
+    start = time.perf_counter()
+    for _ in range(200):
+        store.get("abc")
+    assert (time.perf_counter() - start) / 200 < 0.001
@@ -0,0 +1,130 @@
+"""
+Tests for the compact web search result module.
+
+These tests run offline on a synthetic Serper response.
+"""
+
+import json
+import sys
+
+import pytest
+
+from agent.context_compactor import estimate_tokens
+from agent.services.serper_search_handler import compact_page
+from agent.services.web_result import (
+    WebResult,
+    parse_fields,
+    render_web_results,
+    to_web_results,
+)
+
+
+def make_response(count: int = 10) -> dict:
+    """Build a Serper-shaped response with the sections the answer never cites."""
+    return {
+        "searchParameters": {"q": "python", "type": "search", "engine": "google"},
+        "knowledgeGraph": {
+            "title": "Python",
+            "type": "Programming language",
+            "imageUrl": "https://img.example/python.png",
+            "attributes": {"Designed by": "Guido van Rossum", "First appeared": "1991"},
+        },
+        "organic": [
+            {
+                "title": f"Result {position}",
+                "link": f"https://{position}.example/page",
+                "snippet": f"Python snippet number {position}.",
+                "date": "Apr 1, 2024" if position == 1 else None,
+                "position": position,
+                "sitelinks": [
+                    {"title": "Docs", "link": f"https://{position}.example/docs"},
+                    {"title": "Blog", "link": f"https://{position}.example/blog"},
+                ],
+                "imageUrl": f"https://img.example/{position}.png",
+                "attributes": {"Rating": "4.5", "Reviews": "1,024"},
+            }
+            for position in range(1, count + 1)
+        ],
+        "peopleAlsoAsk": [
+            {"question": "Is Python easy?", "snippet": "Yes.", "link": "https://q.example"}
+        ],
+        "relatedSearches": [{"query": "python tutorial"}, {"query": "python download"}],
+    }
+
+
+def deep_size(value) -> int:
+    """Approximate the memory held by a parsed JSON value and what it refers to."""
+    seen = set()
+
+    def size(obj) -> int:
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        total = sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            total += sum(size(key) + size(item) for key, item in obj.items())
+        elif isinstance(obj, (list, tuple)):
+            total += sum(size(item) for item in obj)
+        elif isinstance(obj, WebResult):
+            total += sum(size(getattr(obj, field)) for field in obj.__slots__)
+        return total
+
+    return size(value)
+
+
+def test_from_organic_keeps_only_projected_fields() -> None:
+    """Test that extra fields are dropped and dict-style access still works."""
+    result = WebResult.from_organic(make_response()["organic"][1])
+
+    assert dict(result) == {
+        "title": "Result 2",
+        "link": "https://2.example/page",
+        "snippet": "Python snippet number 2.",
+        "position": 2,
+    }
+    assert result.get("date") is None
+    assert "sitelinks" not in result
+    assert not hasattr(result, "__dict__")
+    assert WebResult.from_organic(result) is result
+
+
+def test_to_prompt_writes_numbered_blocks() -> None:
+    """Test the compact block layout and the field projection."""
+    results = to_web_results(make_response(2))
+
+    assert render_web_results(results) == (
+        "1. Result 1 (Apr 1, 2024)\n"
+        "https://1.example/page\n"
+        "Python snippet number 1.\n"
+        "\n"
+        "2. Result 2\n"
+        "https://2.example/page\n"
+        "Python snippet number 2."
+    )
+    assert render_web_results(results, ("link",)) == (
+        "https://1.example/page\n\nhttps://2.example/page"
+    )
+
+
+def test_parse_fields_validates_names() -> None:
+    """Test that projections parse from strings or sequences and reject typos."""
+    assert parse_fields(None) == ("title", "link", "snippet", "date", "position")
+    assert parse_fields(" link, title ") == ("link", "title")
+    assert parse_fields(["snippet"]) == ("snippet",)
+    with pytest.raises(ValueError):
+        parse_fields("title,url")
+
+
+def test_compact_results_shrink_prompt_and_memory() -> None:
+    """Test that compact results take fewer prompt tokens and less memory."""
+    response = make_response()
+
+    raw_prompt = json.dumps(response, ensure_ascii=False, separators=(",", ":"))
+    compact_prompt = render_web_results(to_web_results(response))
+    assert estimate_tokens(compact_prompt) < estimate_tokens(raw_prompt) / 3
+
+    page = compact_page(response)
+    assert set(page) == {"organic"}
+    results = to_web_results(page)
+    assert deep_size(results) < deep_size(response) / 2
+    assert deep_size(results) < deep_size(page["organic"])
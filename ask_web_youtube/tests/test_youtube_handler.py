@@ -1,19 +1,25 @@
 """
 Tests for YouTubeHandler using pytest standards.
-This module tests the functionality of the YouTubeHandler
+This module tests the functionality of the YouTubeHandler.
+Live tests need YOUTUBE_DATA_API_KEY; the rest use a fake API client.
 """
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pytest
+from agent.services import youtube_handler as youtube_module
+from agent.services.transcript import Transcript
+from agent.services.transcript_store import TranscriptStore
 from agent.services.youtube_handler import YouTubeHandler
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
 # Load environment variables from a .env file
 load_dotenv()
 
-# Skip tests if YOUTUBE_DATA_API_KEY is not set
-pytestmark = pytest.mark.skipif(
+# Skip live tests if YOUTUBE_DATA_API_KEY is not set
+requires_api_key = pytest.mark.skipif(
     not os.getenv("YOUTUBE_DATA_API_KEY"),
     reason="YOUTUBE_DATA_API_KEY environment variable is not set",
 )
@@ -31,6 +37,7 @@ def youtube_handler() -> YouTubeHandler:
     return YouTubeHandler(api_key)
 
 
+@requires_api_key
 def test_fetch_videos_success(youtube_handler: YouTubeHandler) -> None:
     """
     Test fetching videos with and without transcripts.
@@ -58,6 +65,7 @@ def test_fetch_videos_success(youtube_handler: YouTubeHandler) -> None:
         assert "transcripts_available" in video
 
 
+@requires_api_key
 def test_fetch_videos_http_error(youtube_handler: YouTubeHandler) -> None:
     """
     Test handling of HTTP errors during video fetching.
@@ -72,6 +80,7 @@ def test_fetch_videos_http_error(youtube_handler: YouTubeHandler) -> None:
 
 
 
+@requires_api_key
 def test_fetch_videos_unexpected_error(youtube_handler: YouTubeHandler) -> None:
     """
     Test handling of unexpected errors during video fetching.
@@ -83,3 +92,179 @@ def test_fetch_videos_unexpected_error(youtube_handler: YouTubeHandler) -> None:
         youtube_handler.fetch_videos("", max_results=1, include_transcripts=True)
     except Exception as e:
         assert "Unexpected Error" in str(e)
+
+
+class FakeRequest:
+    """Fake googleapiclient request that returns a canned response."""
+
+    def __init__(self, response: Dict) -> None:
+        """Store the canned response."""
+        self.response = response
+
+    def execute(self) -> Dict:
+        """Return the canned response."""
+        return self.response
+
+
+class FakeVideosResource:
+    """Fake `videos()` resource that records every `list` call."""
+
+    def __init__(self) -> None:
+        """Initialize the recorded calls."""
+        self.calls: List[Dict] = []
+
+    def list(self, **kwargs) -> FakeRequest:
+        """Return a duration of N seconds for the video ID "vN"."""
+        self.calls.append(kwargs)
+        items = [
+            {"id": video_id, "contentDetails": {"duration": f"PT{video_id[1:]}S"}}
+            for video_id in kwargs["id"].split(",")
+        ]
+        return FakeRequest({"items": items})
+
+
+class FakeYouTubeClient:
+    """Fake YouTube Data API client with search and videos resources."""
+
+    def __init__(self, video_ids: List[str]) -> None:
+        """Create a client whose search returns the given video IDs."""
+        self.video_ids = video_ids
+        self.videos_resource = FakeVideosResource()
+
+    def search(self) -> "FakeYouTubeClient":
+        """Return the search resource."""
+        return self
+
+    def list(self, **kwargs) -> FakeRequest:
+        """Return the canned search results."""
+        items = [
+            {"id": {"videoId": video_id}, "snippet": {"title": f"Video {video_id}"}}
+            for video_id in self.video_ids
+        ]
+        return FakeRequest({"items": items})
+
+    def videos(self) -> FakeVideosResource:
+        """Return the videos resource."""
+        return self.videos_resource
+
+
+@pytest.fixture
+def fake_handler(tmp_path) -> YouTubeHandler:
+    """Fixture to create a YouTubeHandler backed by a fake API client."""
+    youtube_module._video_metadata_cache.clear()
+    handler = YouTubeHandler(
+        api_key="fake_key",
+        transcript_store=TranscriptStore(path=str(tmp_path / "transcripts.db")),
+    )
+    handler.youtube = FakeYouTubeClient([f"v{n}" for n in reversed(range(60))])
+    return handler
+
+
+def test_video_metadata_is_fetched_in_batches(fake_handler: YouTubeHandler) -> None:
+    """Test that durations are resolved with batched `videos().list` calls."""
+    videos = fake_handler.fetch_videos("query", max_results=3, include_transcripts=False)
+
+    calls = fake_handler.youtube.videos_resource.calls
+    assert [len(call["id"].split(",")) for call in calls] == [50, 10]
+    assert [video["duration"] for video in videos] == [0.0, 1.0, 2.0]
+
+
+def test_video_metadata_is_cached(fake_handler: YouTubeHandler) -> None:
+    """Test that repeated candidates are served from the metadata cache."""
+    fake_handler.fetch_videos("query", max_results=1, include_transcripts=False)
+    fake_handler.fetch_videos("query", max_results=1, include_transcripts=False)
+
+    assert len(fake_handler.youtube.videos_resource.calls) == 2
+
+
+def test_transcripts_are_probed_in_parallel_and_in_order(
+    fake_handler: YouTubeHandler,
+) -> None:
+    """Test that slow probes overlap and results keep the duration ordering."""
+    delays = {"v0": 0.3, "v1": 0.3, "v2": 0.05, "v3": 0.05}
+
+    def fetch_transcript(video_id: str) -> Optional[Transcript]:
+        time.sleep(delays.get(video_id, 0.05))
+        if video_id == "v1":
+            return None
+        return Transcript.from_segments(
+            [{"text": video_id, "start": 0.0, "duration": 1.5}]
+        )
+
+    fake_handler._fetch_transcript = fetch_transcript
+    start = time.perf_counter()
+    videos = fake_handler.fetch_videos("query", max_results=2, include_transcripts=True)
+    elapsed = time.perf_counter() - start
+
+    assert [video["video_id"] for video in videos] == ["v0", "v2"]
+    assert all(video["transcripts_available"] for video in videos)
+    assert videos[0]["duration"] == 1.5
+    assert elapsed < 0.5
+
+
+def test_transcripts_come_from_the_store(fake_handler: YouTubeHandler, monkeypatch) -> None:
+    """Test that stored transcripts and negative entries skip the transcript API."""
+    fake_handler.transcript_store.put(
+        "v0", Transcript.from_segments([{"text": "hi", "start": 0.0, "duration": 2.0}])
+    )
+    fake_handler.transcript_store.put_unavailable("v1")
+    fetched = []
+
+    def get_transcript(video_id: str) -> List[Dict]:
+        fetched.append(video_id)
+        return [{"text": video_id, "start": 0.0, "duration": 1.0}]
+
+    monkeypatch.setattr(
+        youtube_module.YouTubeTranscriptApi, "get_transcript", staticmethod(get_transcript)
+    )
+    videos = fake_handler.fetch_videos("query", max_results=2, include_transcripts=True)
+
+    assert [video["video_id"] for video in videos] == ["v0", "v2"]
+    assert videos[0]["transcript"][0].text == "hi"
+    assert isinstance(videos[1]["transcript"], Transcript)
+    assert "v0" not in fetched and "v1" not in fetched
+
+
+def test_api_client_is_built_lazily_from_bundled_discovery(tmp_path) -> None:
+    """Test that the API client is built on first use without fetching discovery."""
+    handler = YouTubeHandler(
+        api_key="fake_key",
+        transcript_store=TranscriptStore(path=str(tmp_path / "transcripts.db")),
+    )
+    assert handler._youtube is None
+
+    client = handler.youtube
+
+    assert hasattr(client, "search")
+    assert handler.youtube is client
+
+
+def test_handlers_do_not_share_in_flight_searches(tmp_path) -> None:
+    """Test that concurrent identical searches on two handlers stay separate."""
+
+    class SlowClient(FakeYouTubeClient):
+        def list(self, **kwargs) -> FakeRequest:
+            time.sleep(0.1)
+            return super().list(**kwargs)
+
+    youtube_module._video_metadata_cache.clear()
+    handlers = []
+    for name in ("a", "b"):
+        handler = YouTubeHandler(
+            api_key=f"key_{name}",
+            transcript_store=TranscriptStore(path=str(tmp_path / f"{name}.db")),
+        )
+        handler.youtube = SlowClient([f"{name}1"])
+        handlers.append(handler)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(
+            executor.map(
+                lambda handler: handler.fetch_videos(
+                    "query", max_results=1, include_transcripts=False
+                ),
+                handlers,
+            )
+        )
+
+    assert [videos[0]["video_id"] for videos in results] == ["a1", "b1"]
@@ -0,0 +1,297 @@
+"""
+Module providing the caches shared by the service handlers.
+
+Two interchangeable backends are available: an in-memory LRU (`TTLCache`) and
+a SQLite-backed one (`SQLiteCache`) that survives restarts and can be shared by
+several worker processes. Both are thread-safe, support a default and a
+per-entry time-to-live, and count hits, misses and evictions.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+
+_MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a free-text query for use in cache keys.
+
+    Case, accents, punctuation and runs of whitespace are folded, so
+    "What is Python?" and "what is  python" map to the same key.
+
+    Args:
+        query (str): The raw query text.
+
+    Returns:
+        str: The normalized query.
+    """
+    text = unicodedata.normalize("NFKD", query.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class TTLCache:
+    """
+    A thread-safe, size-bounded LRU cache with an optional time-to-live.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept before evicting the least
+            recently used one.
+        ttl (Optional[float]): Default seconds an entry stays valid. None means forever.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        """Initialize an empty cache."""
+        if maxsize <= 0:
+            raise ValueError("Cache maxsize must be a positive integer.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for a key, or a default if missing or expired.
+
+        Args:
+            key (Hashable): The cache key.
+            default (Any): The value returned on a miss.
+
+        Returns:
+            Any: The cached value or the default.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value to store.
+            ttl (Optional[float]): Seconds this entry stays valid. Defaults to the cache TTL.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return True if the key is cached and not expired."""
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        """Return the number of stored entries, including expired ones."""
+        with self._lock:
+            return len(self._data)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit, miss and eviction counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "size": len(self._data),
+            }
+
+
+class SQLiteCache:
+    """
+    A size-bounded LRU cache persisted in SQLite.
+
+    Values must be JSON-serializable and keys must be strings. The table can be
+    shared by several processes pointing at the same file.
+
+    Attributes:
+        path (str): The path of the SQLite database file.
+        table (str): The table holding this cache's entries.
+        maxsize (int): Maximum number of entries before LRU eviction.
+        ttl (Optional[float]): Default seconds an entry stays valid. None means forever.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "cache",
+        maxsize: int = 10_000,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """Open (or create) the cache table."""
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        if maxsize <= 0:
+            raise ValueError("Cache maxsize must be a positive integer.")
+        self.path = path
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)"
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Return the cached value for a key, or a default if missing or expired.
+
+        Args:
+            key (str): The cache key.
+            default (Any): The value returned on a miss.
+
+        Returns:
+            Any: The cached value or the default.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._misses += 1
+                return default
+            self._conn.execute(
+                f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entries if full.
+
+        Args:
+            key (str): The cache key.
+            value (Any): The JSON-serializable value to store.
+            ttl (Optional[float]): Seconds this entry stays valid. Defaults to the cache TTL.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, payload, expires_at, now),
+            )
+            excess = self._size() - self.maxsize
+            if excess > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f" SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self._evictions += excess
+
+    def _size(self) -> int:
+        """Return the number of stored entries (caller holds the lock)."""
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        """Return True if the key is cached and not expired."""
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        """Return the number of stored entries, including expired ones."""
+        with self._lock:
+            return self._size()
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit, miss and eviction counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "size": self._size(),
+            }
+
+
+Cache = Union[TTLCache, SQLiteCache]
+
+
+def build_cache(prefix: str, maxsize: int, ttl: Optional[float]) -> Cache:
+    """
+    Build a cache configured from environment variables.
+
+    The variables are named after the prefix, e.g. for "SERPER":
+
+        SERPER_CACHE_BACKEND   "memory" (default) or "sqlite".
+        SERPER_CACHE_SIZE      Maximum number of entries.
+        SERPER_CACHE_TTL       Default time-to-live in seconds.
+        SERPER_CACHE_PATH      SQLite file path (default "cache.db").
+
+    Args:
+        prefix (str): The environment variable prefix.
+        maxsize (int): The default maximum number of entries.
+        ttl (Optional[float]): The default time-to-live in seconds.
+
+    Returns:
+        Cache: The configured cache.
+    """
+    backend = os.getenv(f"{prefix}_CACHE_BACKEND", "memory").lower()
+    maxsize = int(os.getenv(f"{prefix}_CACHE_SIZE", maxsize))
+    ttl_setting = os.getenv(f"{prefix}_CACHE_TTL")
+    if ttl_setting is not None:
+        ttl = float(ttl_setting)
+    if backend == "sqlite":
+        return SQLiteCache(
+            path=os.getenv(f"{prefix}_CACHE_PATH", "cache.db"),
+            table=f"{prefix.lower()}_cache",
+            maxsize=maxsize,
+            ttl=ttl,
+        )
+    if backend != "memory":
+        raise ValueError(f"Unknown cache backend for {prefix}: {backend!r}")
+    return TTLCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,147 @@
+"""
+Module for giving a request an overall time budget.
+
+A `Deadline` is an absolute point in time. The agent creates one per request,
+hands a portion of it to each stage and activates it with `use_deadline`.
+Like the metrics trace, the active deadline lives in a context variable, so it
+follows the request into asyncio tasks, `asyncio.to_thread` calls and thread
+pool jobs submitted with `contextvars.copy_context().run`. Handlers read it
+with `current_deadline()` to shorten request timeouts and to stop waiting for
+stragglers, returning whatever arrived in time.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage runs out of its share of the request's time budget."""
+
+
+class Deadline:
+    """
+    A point in time by which work must be finished.
+
+    Attributes:
+        expires_at (float): The deadline, on the clock's timescale.
+    """
+
+    def __init__(
+        self, expires_at: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """Initialize a deadline at an absolute time of `clock`."""
+        self.expires_at = expires_at
+        self._clock = clock
+
+    @classmethod
+    def after(
+        cls, seconds: float, clock: Callable[[], float] = time.monotonic
+    ) -> "Deadline":
+        """
+        Create a deadline a number of seconds from now.
+
+        Args:
+            seconds (float): The time budget.
+            clock (Callable[[], float]): The monotonic clock to measure against.
+
+        Returns:
+            Deadline: The new deadline.
+        """
+        return cls(clock() + seconds, clock)
+
+    def remaining(self) -> float:
+        """Return the seconds left, never less than zero."""
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        """Whether the deadline has passed."""
+        return self._clock() >= self.expires_at
+
+    def portion(self, fraction: float) -> "Deadline":
+        """
+        Return an earlier deadline covering a fraction of the remaining time.
+
+        Args:
+            fraction (float): The share of the remaining time, between 0 and 1.
+
+        Returns:
+            Deadline: A deadline that never ends after this one.
+        """
+        return Deadline(self._clock() + self.remaining() * fraction, self._clock)
+
+    def timeout(self, default: float) -> float:
+        """
+        Clip a timeout so that it ends by the deadline.
+
+        Args:
+            default (float): The timeout that applies without a deadline.
+
+        Returns:
+            float: The smaller of the default and the remaining time.
+        """
+        return min(default, self.remaining())
+
+    def check(self, what: str = "operation") -> None:
+        """
+        Raise if the deadline has passed.
+
+        Args:
+            what (str): What was about to run, for the error message.
+
+        Raises:
+            DeadlineExceeded: If no time is left.
+        """
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {what}.")
+
+    def __repr__(self) -> str:
+        """Show the remaining time."""
+        return f"Deadline(remaining={self.remaining():.3f}s)"
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Return the deadline active in this context, if any."""
+    return _current_deadline.get()
+
+
+def remaining_time(default: Optional[float] = None) -> Optional[float]:
+    """
+    Return the seconds left before the active deadline.
+
+    Args:
+        default (Optional[float]): Returned when no deadline is active.
+
+    Returns:
+        Optional[float]: The remaining time, or the default.
+    """
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline is not None else default
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """
+    Make a deadline the active one for the duration of a block.
+
+    Args:
+        deadline (Optional[Deadline]): The deadline. None keeps the current one.
+
+    Yields:
+        Optional[Deadline]: The active deadline.
+    """
+    if deadline is None:
+        yield _current_deadline.get()
+        return
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,90 @@
+"""
+Module for running coroutines from synchronous code.
+
+This module owns a single background event loop per process. Synchronous
+callers (such as the Streamlit script) submit coroutines to it instead of
+spinning up a fresh loop with `asyncio.run` on every request, so async
+resources bound to the loop can live for the whole process.
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide background event loop, starting it if needed.
+
+    Returns:
+        asyncio.AbstractEventLoop: A running event loop on a daemon thread.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="agent-event-loop", daemon=True
+            )
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def run_coroutine(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine on the background loop and block until it completes.
+
+    Args:
+        coro (Coroutine): The coroutine to run.
+        timeout (Optional[float]): Maximum seconds to wait for the result.
+
+    Returns:
+        T: The value returned by the coroutine.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_background_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def iterate_async(
+    iterator: AsyncIterator[T], timeout: Optional[float] = None
+) -> Iterator[T]:
+    """
+    Consume an async iterator on the background loop as a regular iterator.
+
+    Each item is awaited on the background loop and handed to the calling
+    thread as soon as it is produced, so streamed output is not buffered.
+
+    Args:
+        iterator (AsyncIterator[T]): The async iterator (e.g. an async generator).
+        timeout (Optional[float]): Maximum seconds to wait for each item.
+
+    Yields:
+        T: The items produced by the async iterator.
+    """
+    loop = get_background_loop()
+
+    async def next_item() -> T:
+        return await iterator.__anext__()
+
+    try:
+        while True:
+            future = asyncio.run_coroutine_threadsafe(next_item(), loop)
+            try:
+                item = future.result(timeout)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            asyncio.run_coroutine_threadsafe(aclose(), loop).result(timeout)
@@ -0,0 +1,157 @@
+"""
+Module for sharing pooled HTTP clients across the application.
+
+Every handler used to open its own `httpx` client per request, paying a fresh
+TCP and TLS handshake each time. This module keeps one long-lived client per
+upstream name and process (and, for async clients, per event loop) so calls
+reuse warm keep-alive connections.
+
+The pool is configured through environment variables:
+
+    HTTP_MAX_CONNECTIONS     Maximum open connections per client (default 100).
+    HTTP_MAX_KEEPALIVE       Maximum idle keep-alive connections (default 20).
+    HTTP_KEEPALIVE_EXPIRY    Seconds an idle connection is kept (default 30).
+    HTTP_ENABLE_HTTP2        Set to "1" to negotiate HTTP/2 (requires `h2`).
+"""
+
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+import weakref
+from typing import Dict
+
+import httpx
+
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+_clients: Dict[str, httpx.Client] = {}
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _env_number(name: str, default: float) -> float:
+    """Read a numeric setting from the environment, falling back to a default."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+def http2_enabled() -> bool:
+    """Return True if HTTP/2 was requested and the `h2` package is available."""
+    if os.getenv("HTTP_ENABLE_HTTP2", "").lower() not in ("1", "true", "yes"):
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed.")
+        return False
+    return True
+
+
+def _client_options() -> dict:
+    """Build the keyword arguments shared by sync and async clients."""
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(_env_number("HTTP_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(_env_number("HTTP_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=_env_number("HTTP_KEEPALIVE_EXPIRY", 30),
+        ),
+        "http2": http2_enabled(),
+        "timeout": httpx.Timeout(10.0),
+    }
+
+
+def get_http_client(name: str = "default") -> httpx.Client:
+    """
+    Return the process-wide synchronous client for an upstream.
+
+    `httpx.Client` is thread-safe, so concurrent Streamlit sessions can share
+    the same instance and its connection pool.
+
+    Args:
+        name (str): The upstream the client is used for, e.g. "serper".
+
+    Returns:
+        httpx.Client: A pooled, long-lived client.
+    """
+    with _lock:
+        client = _clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.Client(**_client_options())
+            _clients[name] = client
+            logger.debug(f"Created pooled HTTP client for '{name}'.")
+        return client
+
+
+def get_async_http_client(name: str = "default") -> httpx.AsyncClient:
+    """
+    Return the asynchronous client for an upstream on the running event loop.
+
+    Async connections are bound to the loop that opened them, so one client is
+    kept per (loop, name) pair. Must be called from within a running loop.
+
+    Args:
+        name (str): The upstream the client is used for, e.g. "serper".
+
+    Returns:
+        httpx.AsyncClient: A pooled, long-lived async client.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_client_options())
+            clients[name] = client
+            logger.debug(f"Created pooled async HTTP client for '{name}'.")
+        return client
+
+
+async def aclose_http_clients() -> None:
+    """Close the async clients that belong to the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def close_http_clients() -> None:
+    """
+    Close every pooled client.
+
+    Sync clients are closed directly. Async clients are closed on their own
+    loop when it is still running; otherwise they are dropped.
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        loops = list(_async_clients.keys())
+
+    for client in clients:
+        client.close()
+
+    try:
+        current_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        current_loop = None
+
+    for loop in loops:
+        if loop is current_loop:
+            continue
+        if loop.is_running() and not loop.is_closed():
+            future = asyncio.run_coroutine_threadsafe(aclose_http_clients(), loop)
+            try:
+                future.result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Could not close async HTTP clients cleanly: {e}")
+
+
+atexit.register(close_http_clients)
@@ -1,25 +1,172 @@
 """
 Module for setting up and configuring logging in a Python application.
 
-This module provides a function to create a logger with multiple handlers,
-including console, file, and memory handlers. It also includes a function
-to retrieve the contents of the in-memory log buffer.
+Loggers created by `setup_logger` only put records on an in-process queue; a
+single background listener thread formats them and writes them to the console,
+a rotating log file and a fixed-size in-memory ring buffer. Request threads
+therefore never block on log I/O, and the buffer shown by the debug panel
+cannot grow without bound.
+
+The pipeline is configured with environment variables:
+
+    LOG_FILE               Log file path (default "app.log").
+    LOG_FILE_MAX_BYTES     Size at which the log file is rotated (default 10 MiB).
+    LOG_FILE_BACKUPS       Number of rotated files kept (default 3).
+    LOG_BUFFER_LINES       Records kept for the debug panel (default 1000).
+    LOG_MAX_MESSAGE_CHARS  Longer messages are truncated (default 2000).
 """
 
+import atexit
+import copy
 import logging
-import io
+import os
+import queue
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class TruncatingFormatter(logging.Formatter):
+    """
+    A formatter that caps the length of log messages.
+
+    Attributes:
+        max_chars (int): The maximum number of message characters kept.
+    """
+
+    def __init__(self, fmt: str = _FORMAT, max_chars: int = 2000) -> None:
+        """Initialize the formatter with its format string and message limit."""
+        super().__init__(fmt)
+        self.max_chars = max_chars
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        """Format the record, truncating an oversized message first."""
+        message = record.message
+        if len(message) > self.max_chars:
+            record.message = (
+                f"{message[: self.max_chars]}... "
+                f"[{len(message) - self.max_chars} chars truncated]"
+            )
+        try:
+            return super().formatMessage(record)
+        finally:
+            record.message = message
 
-_log_buffer = io.StringIO()
+
+class RingBufferHandler(logging.Handler):
+    """
+    A handler that keeps the most recent formatted records in memory.
+
+    Attributes:
+        capacity (int): The number of records kept.
+    """
+
+    def __init__(self, capacity: int = 1000) -> None:
+        """Initialize an empty buffer holding up to `capacity` records."""
+        super().__init__()
+        self.capacity = capacity
+        self._records: deque = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Append the formatted record, dropping the oldest one when full."""
+        try:
+            self._records.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def getvalue(self) -> str:
+        """Return the buffered records, oldest first, one per line."""
+        # emit() runs with the handler lock held, so take it to read a
+        # consistent snapshot.
+        with self.lock:
+            return "\n".join(self._records)
+
+    def clear(self) -> None:
+        """Remove every buffered record."""
+        with self.lock:
+            self._records.clear()
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    A QueueHandler that leaves message formatting to the listener thread.
+
+    The standard QueueHandler renders every message on the calling thread so
+    records can cross process boundaries. This queue never leaves the process,
+    so the record is passed on as is and large arguments are only formatted
+    (and truncated) in the background.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Return a shallow copy of the record without formatting it."""
+        return copy.copy(record)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read a positive integer from the environment, falling back to a default."""
+    try:
+        value = int(os.getenv(name, default))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_queue_handler = DeferredQueueHandler(_queue)
+_buffer_handler = RingBufferHandler(_env_int("LOG_BUFFER_LINES", 1000))
+_listener: Optional[QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener() -> None:
+    """Start the background listener and its output handlers once per process."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        formatter = TruncatingFormatter(
+            max_chars=_env_int("LOG_MAX_MESSAGE_CHARS", 2000)
+        )
+        file_handler = RotatingFileHandler(
+            os.getenv("LOG_FILE", "app.log"),
+            maxBytes=_env_int("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024),
+            backupCount=_env_int("LOG_FILE_BACKUPS", 3),
+            encoding="utf-8",
+            delay=True,
+        )
+        handlers = (logging.StreamHandler(), file_handler, _buffer_handler)
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        _listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the background listener."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
 
 
 def setup_logger(name: str = "app_logger") -> logging.Logger:
     """
-    Set up and configure a logger with specified handlers and formatting.
+    Set up and configure a logger that writes through the shared log queue.
 
     This function creates a logger with the given name, sets its logging level to
-    INFO, and attaches three handlers: a console handler, a file handler, and a
-    memory handler. Each handler is configured with a consistent log message
-    format. If the logger already has handlers, no additional handlers are added.
+    INFO, and attaches the process-wide queue handler. Console, rotating file and
+    in-memory output happen on the background listener thread. Calling it again
+    for the same name does not add the handler twice.
 
     Args:
         name (str): The name of the logger. Defaults to "app_logger".
@@ -29,24 +176,15 @@ def setup_logger(name: str = "app_logger") -> logging.Logger:
     """
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
+    _start_listener()
 
-    if not logger.hasHandlers():
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-        # Handlers
-        console_handler = logging.StreamHandler()
-        file_handler = logging.FileHandler("app.log")
-        memory_handler = logging.StreamHandler(_log_buffer)
-
-        for handler in (console_handler, file_handler, memory_handler):
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
-
+    if _queue_handler not in logger.handlers:
+        logger.addHandler(_queue_handler)
         logger.propagate = False
 
     return logger
 
 
 def get_log_buffer() -> str:
-    """Retrieve the contents of the in-memory log buffer."""
-    return _log_buffer.getvalue()
+    """Retrieve the most recent records from the in-memory log buffer."""
+    return _buffer_handler.getvalue()
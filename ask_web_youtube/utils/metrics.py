@@ -0,0 +1,525 @@
+"""
+Module for lightweight tracing and metrics of the agent pipeline.
+
+Each stage of a request (web search pages, YouTube API calls, transcript
+fetches, template rendering, LLM calls) runs inside a `span`. A span records
+its wall time into a per-stage latency histogram, counts errors, cache hits and
+bytes/tokens moved, and, when a `Trace` is active, appends itself to that
+trace so a single request can be broken down stage by stage.
+
+The aggregated metrics are exported in the Prometheus text format or as JSON,
+optionally over a small built-in HTTP server. Set METRICS_ENABLED=0 to turn
+instrumentation off; `span` then returns a shared no-op object and costs a
+single function call.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Numeric span attributes that are also summed into per-stage counters.
+COUNTED_ATTRIBUTES = ("bytes_in", "bytes_out", "tokens_in", "tokens_out")
+
+_enabled = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def metrics_enabled() -> bool:
+    """Return True if spans are being recorded."""
+    return _enabled
+
+
+def set_metrics_enabled(enabled: bool) -> None:
+    """
+    Turn instrumentation on or off for the whole process.
+
+    Args:
+        enabled (bool): Whether spans should be recorded.
+    """
+    global _enabled
+    _enabled = enabled
+
+
+class Histogram:
+    """
+    A thread-safe cumulative histogram with fixed bucket bounds.
+
+    Attributes:
+        buckets (Tuple[float, ...]): The upper bounds of the buckets, ascending.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Initialize an empty histogram."""
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the histogram's state.
+
+        Returns:
+            Dict[str, Any]: The `count`, `sum` and cumulative `buckets` as
+            (upper bound, count) pairs, the last bound being +Inf.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile by linear interpolation within its bucket.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            Optional[float]: The estimate, or None without observations.
+        """
+        snapshot = self.snapshot()
+        if not snapshot["count"]:
+            return None
+        rank = q * snapshot["count"]
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in snapshot["buckets"]:
+            if count >= rank:
+                if bound == float("inf"):
+                    return lower_bound
+                width = count - lower_count
+                fraction = (rank - lower_count) / width if width else 1.0
+                return lower_bound + (bound - lower_bound) * fraction
+            lower_bound, lower_count = bound, count
+        return lower_bound
+
+
+class MetricsRegistry:
+    """A thread-safe collection of labelled counters and histograms."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> LabelSet:
+        """Turn keyword labels into a hashable, ordered label set."""
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """
+        Add to a counter.
+
+        Args:
+            name (str): The metric name.
+            value (float): The amount to add.
+            **labels: The metric labels.
+        """
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Record an observation in a histogram.
+
+        Args:
+            name (str): The metric name.
+            value (float): The observed value.
+            **labels: The metric labels.
+        """
+        self.histogram(name, **labels).observe(value)
+
+    def histogram(self, name: str, **labels: Any) -> Histogram:
+        """Return the histogram for a name and labels, creating it if needed."""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            return histogram
+
+    def counter_value(self, name: str, **labels: Any) -> float:
+        """Return the current value of a counter (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(self._labels(labels), 0)
+
+    def reset(self) -> None:
+        """Remove every metric."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Export the metrics as JSON-serializable data.
+
+        Returns:
+            Dict[str, Any]: Counters and histograms (with p50/p95/p99 estimates),
+            each as a list of series with their labels.
+        """
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: dict(series) for name, series in self._histograms.items()
+            }
+
+        exported: Dict[str, Any] = {"counters": {}, "histograms": {}}
+        for name, series in counters.items():
+            exported["counters"][name] = [
+                {"labels": dict(labels), "value": value}
+                for labels, value in series.items()
+            ]
+        for name, series in histograms.items():
+            exported["histograms"][name] = []
+            for labels, histogram in series.items():
+                snapshot = histogram.snapshot()
+                exported["histograms"][name].append(
+                    {
+                        "labels": dict(labels),
+                        "count": snapshot["count"],
+                        "sum": snapshot["sum"],
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "p99": histogram.quantile(0.99),
+                    }
+                )
+        return exported
+
+    def to_prometheus(self) -> str:
+        """
+        Export the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: dict(series) for name, series in self._histograms.items()
+            }
+
+        lines: List[str] = []
+        for name in sorted(counters):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in counters[name].items():
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for name in sorted(histograms):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in histograms[name].items():
+                snapshot = histogram.snapshot()
+                for bound, count in snapshot["buckets"]:
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket_labels = labels + (("le", le),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']:g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: LabelSet) -> str:
+    """Format a label set as a Prometheus label list."""
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
+
+
+class Trace:
+    """
+    The spans recorded while handling a single request.
+
+    Attributes:
+        name (str): A label for the traced request.
+        spans (List[Span]): The finished spans, in completion order.
+    """
+
+    def __init__(self, name: str = "request") -> None:
+        """Start an empty trace."""
+        self.name = name
+        self.spans: List["Span"] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        """Append a finished span."""
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """
+        Return the spans as rows ordered by start time.
+
+        Returns:
+            List[Dict[str, Any]]: One row per span with its `stage`, `offset`
+            (seconds since the trace started), `seconds`, `error` and attributes.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        rows = []
+        for span in sorted(spans, key=lambda span: span.started_at):
+            row = {
+                "stage": span.stage,
+                "offset": round(span.started_at - self._origin, 6),
+                "seconds": round(span.duration, 6),
+                "error": span.error,
+            }
+            row.update(span.attributes)
+            rows.append(row)
+        return rows
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+@contextmanager
+def activate_trace(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """
+    Make a trace the destination of spans in the current context.
+
+    Asyncio tasks and `asyncio.to_thread` calls started inside the block inherit
+    the trace, as do thread pool jobs submitted through `contextvars.copy_context`.
+
+    Args:
+        trace (Optional[Trace]): The trace to activate. None keeps the trace
+            that is already active, if any.
+
+    Yields:
+        Optional[Trace]: The active trace.
+    """
+    if trace is None:
+        yield _current_trace.get()
+        return
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+class Span:
+    """
+    A timed pipeline stage; use it through `span()`.
+
+    The span joins the trace that is active when it starts, so it can be
+    finished later from another context, e.g. after a streaming generator has
+    been resumed by a different task.
+
+    Attributes:
+        stage (str): The stage name, e.g. "serper.page".
+        attributes (Dict[str, Any]): Extra data such as bytes, tokens or cache hits.
+        error (Optional[str]): The error that ended the stage, if any.
+        started_at (float): The perf_counter value at the start of the stage.
+        duration (float): The wall time of the stage in seconds.
+    """
+
+    __slots__ = ("stage", "attributes", "error", "started_at", "duration", "_trace")
+
+    def __init__(self, stage: str, attributes: Dict[str, Any]) -> None:
+        """Create an unstarted span."""
+        self.stage = stage
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._trace: Optional[Trace] = None
+
+    def set(self, **attributes: Any) -> None:
+        """Attach attributes such as `cache_hit`, `bytes_in` or `tokens_out`."""
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException) -> None:
+        """Mark the stage as failed with an error that was handled by the caller."""
+        self.error = f"{type(error).__name__}: {error}"
+
+    def start(self) -> "Span":
+        """Start timing the stage; prefer using the span as a context manager."""
+        self._trace = _current_trace.get()
+        self.started_at = time.perf_counter()
+        return self
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """
+        Stop timing and record the stage in the registry and its trace.
+
+        Args:
+            error (Optional[BaseException]): The exception that ended the stage.
+                GeneratorExit (an abandoned stream) is not counted as an error.
+        """
+        self.duration = time.perf_counter() - self.started_at
+        if error is not None and not isinstance(error, GeneratorExit):
+            self.fail(error)
+
+        _registry.observe("agent_stage_duration_seconds", self.duration, stage=self.stage)
+        if self.error is not None:
+            _registry.increment("agent_stage_errors_total", stage=self.stage)
+        cache_hit = self.attributes.get("cache_hit")
+        if cache_hit is not None:
+            _registry.increment(
+                "agent_stage_cache_total",
+                stage=self.stage,
+                result="hit" if cache_hit else "miss",
+            )
+        for name in COUNTED_ATTRIBUTES:
+            value = self.attributes.get(name)
+            if value:
+                _registry.increment(f"agent_stage_{name}_total", value, stage=self.stage)
+
+        if self._trace is not None:
+            self._trace.add(self)
+
+    def __enter__(self) -> "Span":
+        """Start timing the stage."""
+        return self.start()
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        """Record the stage, including the exception that ended it, if any."""
+        self.finish(exc)
+        return False
+
+
+class _NoopSpan:
+    """The span returned while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        """Ignore the attributes."""
+
+    def fail(self, error: BaseException) -> None:
+        """Ignore the error."""
+
+    def start(self) -> "_NoopSpan":
+        """Do nothing."""
+        return self
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Do nothing."""
+
+    def __enter__(self) -> "_NoopSpan":
+        """Do nothing."""
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        """Do nothing."""
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(stage: str, **attributes: Any) -> Any:
+    """
+    Time a pipeline stage.
+
+    Example:
+        with span("serper.page", page=1) as s:
+            response = client.post(...)
+            s.set(bytes_in=len(response.content))
+
+    Args:
+        stage (str): The stage name.
+        **attributes: Initial span attributes.
+
+    Returns:
+        Any: A Span context manager, or a shared no-op span when disabled.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(stage, attributes)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve the registry at /metrics (Prometheus text) and /metrics.json."""
+
+    def do_GET(self) -> None:
+        """Answer a scrape request."""
+        if self.path == "/metrics":
+            body = _registry.to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(_registry.to_json()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep scrapes out of the application log."""
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(
+    port: Optional[int] = None, host: str = "127.0.0.1"
+) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve the metrics over HTTP from a daemon thread, once per process.
+
+    Args:
+        port (Optional[int]): The port to listen on. Defaults to the environment
+            variable 'METRICS_PORT'; without either, no server is started.
+        host (str): The interface to bind.
+
+    Returns:
+        Optional[ThreadingHTTPServer]: The running server, or None if disabled.
+    """
+    global _server
+    port = port if port is not None else int(os.getenv("METRICS_PORT", "0")) or None
+    if port is None:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+            threading.Thread(
+                target=_server.serve_forever, name="metrics-server", daemon=True
+            ).start()
+        return _server
@@ -0,0 +1,278 @@
+"""
+Module for pacing the requests sent to an upstream.
+
+A `RateLimiter` is a token bucket: it holds up to `burst` tokens, refills at
+`rate` tokens per second, and every request takes one token (or `cost` tokens).
+The same bucket models request rates (Serper requests per second) and quotas
+counted in the upstream's own units (YouTube Data API units per day, Groq
+tokens per minute), where a call's cost depends on what it asks for.
+
+Callers have a priority, set for a block of work with `use_priority` and
+carried in a context variable like the deadline:
+
+    interactive  When the bucket is empty the caller reserves its tokens and
+                 sleeps until they have been refilled, so interactive callers
+                 are served in the order they arrived.
+    batch        The caller never borrows from the future and leaves `reserve`
+                 tokens in the bucket; it waits until interactive demand has
+                 been served. Batch work can therefore not starve a user.
+
+Limiters are attached to the `UpstreamPolicy` of an upstream (see
+`utils.resilience`), which takes a token before every attempt, retries
+included. Waiting respects the active deadline: a caller that could not get
+its tokens in time fails with DeadlineExceeded instead of waiting.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.deadline import DeadlineExceeded, current_deadline
+from utils.metrics import get_registry, metrics_enabled
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# The share of a bucket that batch callers leave for interactive ones.
+DEFAULT_RESERVE_SHARE = 0.2
+
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_priority", default=INTERACTIVE
+)
+
+
+def current_priority() -> str:
+    """Return the priority of the work in this context: "interactive" or "batch"."""
+    return _current_priority.get()
+
+
+@contextmanager
+def use_priority(priority: str) -> Iterator[str]:
+    """
+    Set the priority of the work done in a block.
+
+    Args:
+        priority (str): INTERACTIVE or BATCH.
+
+    Yields:
+        str: The priority.
+    """
+    if priority not in (INTERACTIVE, BATCH):
+        raise ValueError(f"Unknown priority: {priority!r}")
+    token = _current_priority.set(priority)
+    try:
+        yield priority
+    finally:
+        _current_priority.reset(token)
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket.
+
+    Attributes:
+        name (str): The upstream it paces, used as the metrics label.
+        rate (float): Tokens added per second.
+        burst (float): The bucket size: tokens that can be spent at once.
+        reserve (float): Tokens batch callers leave for interactive ones.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: Optional[float] = None,
+        reserve: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Initialize a full bucket.
+
+        Args:
+            name (str): The upstream it paces.
+            rate (float): Tokens added per second; must be positive.
+            burst (Optional[float]): The bucket size. Defaults to one second's
+                worth of tokens, and at least one.
+            clock (Callable[[], float]): The monotonic clock to measure against.
+        """
+        if rate <= 0:
+            raise ValueError("The rate must be positive.")
+        self.name = name
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._clock = clock
+        self.reserve = (
+            reserve if reserve is not None else self.burst * DEFAULT_RESERVE_SHARE
+        )
+        self._tokens = self.burst
+        self._consumed = 0.0
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last update; the caller holds the lock."""
+        now = self._clock()
+        earned = (now - self._updated_at) * self.rate
+        self._tokens = min(self.burst, self._tokens + earned)
+        self._updated_at = now
+
+    def _check_wait(self, wait: float) -> None:
+        """Raise if a wait would outlast the active deadline, else count it."""
+        deadline = current_deadline()
+        if deadline is not None and wait > deadline.remaining():
+            raise DeadlineExceeded(
+                f"Deadline exceeded waiting for the '{self.name}' rate limit."
+            )
+        if wait and metrics_enabled():
+            get_registry().increment(
+                "agent_rate_limited_seconds_total", wait, upstream=self.name
+            )
+
+    def _take(self, cost: float) -> None:
+        """Spend tokens; the caller holds the lock."""
+        self._tokens -= cost
+        self._consumed += cost
+
+    def _reserve(self, cost: float) -> float:
+        """
+        Take tokens for an interactive caller, borrowing from the future if needed.
+
+        Returns:
+            float: Seconds to wait until the borrowed tokens have been refilled.
+
+        Raises:
+            DeadlineExceeded: If the wait would outlast the active deadline; no
+                tokens are taken then.
+        """
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (cost - self._tokens) / self.rate)
+            self._check_wait(wait)
+            self._take(cost)
+        return wait
+
+    def _poll(self, cost: float) -> float:
+        """
+        Take tokens for a batch caller if they are spare now.
+
+        Returns:
+            float: 0 if the tokens were taken, else the seconds to wait before
+            asking again.
+
+        Raises:
+            DeadlineExceeded: If the wait would outlast the active deadline.
+        """
+        with self._lock:
+            self._refill()
+            # A call dearer than the spare tokens waits for a full bucket.
+            needed = min(cost + self.reserve, self.burst)
+            if self._tokens >= needed:
+                self._take(cost)
+                return 0.0
+            wait = (needed - self._tokens) / self.rate
+            self._check_wait(wait)
+        return wait
+
+    def release(self, cost: float) -> None:
+        """
+        Give back tokens that were taken but not used.
+
+        A negative cost takes more tokens instead, e.g. when a call turned out
+        dearer than estimated.
+
+        Args:
+            cost (float): The tokens to give back.
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + cost)
+            self._consumed -= cost
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Report the state of the bucket.
+
+        Returns:
+            Dict[str, Any]: The `rate` and `burst`, the tokens `available` now
+            (negative while interactive callers wait for borrowed tokens), the
+            seconds of `backlog` until the bucket is no longer in debt, and the
+            tokens `consumed` since the limiter was created.
+        """
+        with self._lock:
+            self._refill()
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "available": round(self._tokens, 3),
+                "backlog": round(max(0.0, -self._tokens) / self.rate, 3),
+                "consumed": round(self._consumed, 3),
+            }
+
+    def try_acquire(self, cost: float = 1.0) -> bool:
+        """
+        Take tokens only if they are available now.
+
+        Batch callers only take tokens beyond the reserve.
+
+        Args:
+            cost (float): The tokens to take.
+
+        Returns:
+            bool: Whether the tokens were taken.
+        """
+        with self._lock:
+            self._refill()
+            spare = self._tokens - (
+                self.reserve if current_priority() == BATCH else 0.0
+            )
+            if spare < cost:
+                return False
+            self._take(cost)
+            return True
+
+    def acquire(self, cost: float = 1.0) -> None:
+        """
+        Take tokens, sleeping until they are available.
+
+        Args:
+            cost (float): The tokens to take.
+
+        Raises:
+            DeadlineExceeded: If they would not be available before the deadline.
+        """
+        if current_priority() == BATCH:
+            while True:
+                wait = self._poll(cost)
+                if not wait:
+                    return
+                time.sleep(wait)
+        wait = self._reserve(cost)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, cost: float = 1.0) -> None:
+        """
+        Take tokens, waiting without blocking the event loop.
+
+        Args:
+            cost (float): The tokens to take.
+
+        Raises:
+            DeadlineExceeded: If they would not be available before the deadline.
+        """
+        if current_priority() == BATCH:
+            while True:
+                wait = self._poll(cost)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+        wait = self._reserve(cost)
+        if not wait:
+            return
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.release(cost)
+            raise
@@ -0,0 +1,868 @@
+"""
+Module for keeping slow or failing upstreams from stalling a request.
+
+Every call to Serper, Groq or the YouTube Data API goes through the
+`UpstreamPolicy` of that upstream, which combines three controls:
+
+    Retries          Transient failures (timeouts, connection errors and the
+                     status codes in RETRYABLE_STATUS_CODES) are retried a
+                     bounded number of times, with "full jitter" exponential
+                     backoff so that clients do not retry in lockstep.
+    Hedging          Optionally, if an attempt is still running after the p95
+                     latency observed for the upstream, an identical request is
+                     sent and whichever answers first wins. Only use it for
+                     idempotent reads.
+    Circuit breaker  After a run of transient failures the upstream is treated
+                     as down: calls fail at once with CircuitOpenError until a
+                     cool-down has passed, then a single trial call decides
+                     whether it closes again.
+
+A policy can also pace its upstream with `RateLimiter` buckets (see
+`utils.rate_limit`), which every attempt, retries and hedges included, draws
+from: one for requests per second, and a quota counted in the upstream's own
+units, where each call states its cost (100 units for a YouTube search, the
+estimated tokens of a Groq completion). Attempts that fail before their
+request is sent (see UNSENT_ERRORS) get their cost back. When the upstream throttles anyway
+(429 with Retry-After), the whole policy pauses for the time it asked for, so
+concurrent callers do not keep hitting it; throttling does not count against
+the circuit breaker. `UpstreamPolicy.usage` shows what is left of each budget.
+
+All of them respect the request deadline (see `utils.deadline`): attempt
+timeouts are clipped to the time left, no retry is started that could not
+finish in time, and async attempts are cancelled when the deadline passes.
+
+Policies are shared per upstream and process, and configured with environment
+variables named after the upstream, e.g. for "serper":
+
+    SERPER_TIMEOUT             Request timeout in seconds (default 10).
+    SERPER_MAX_ATTEMPTS        Attempts per call, including the first (default 3).
+    SERPER_BACKOFF_BASE        Backoff before the first retry, in seconds (default 0.2).
+    SERPER_BACKOFF_MAX         Upper bound of a single backoff (default 2).
+    SERPER_HEDGE               Set to "1" to hedge slow requests.
+    SERPER_BREAKER_THRESHOLD   Consecutive transient failures that open the circuit (default 5).
+    SERPER_BREAKER_RESET       Seconds the circuit stays open (default 30).
+    SERPER_RATE_LIMIT          Requests per second (default: unlimited).
+    SERPER_RATE_BURST          Requests that can be sent at once (default: one
+                               second's worth).
+    SERPER_QUOTA               Units that may be spent per quota period
+                               (default: unlimited).
+    SERPER_QUOTA_PERIOD        The quota period in seconds (default 60).
+"""
+
+import asyncio
+import contextvars
+import email.utils
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+import httpx
+
+try:
+    from httplib2 import HttpLib2Error, ServerNotFoundError
+except ImportError:  # Only installed with the YouTube client libraries.
+    HttpLib2Error = ServerNotFoundError = None
+
+from utils.deadline import Deadline, DeadlineExceeded, current_deadline
+from utils.log_config import setup_logger
+from utils.metrics import Histogram, get_registry, metrics_enabled
+from utils.rate_limit import RateLimiter
+
+T = TypeVar("T")
+
+# Status codes that signal a temporary condition on the upstream's side.
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# Errors raised when a request never got an answer: timeouts, refused or reset
+# connections and failed name lookups, from httpx or from httplib2 (which the
+# googleapiclient discovery client uses).
+TRANSIENT_ERRORS = (
+    httpx.TransportError,
+    ConnectionError,
+    TimeoutError,
+    socket.gaierror,
+) + ((HttpLib2Error,) if HttpLib2Error is not None else ())
+
+# Below this many seconds of budget, a failed attempt is put down to the deadline.
+_DEADLINE_SLACK = 0.01
+
+logger = setup_logger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling an upstream whose circuit is open.
+
+    Attributes:
+        upstream (str): The name of the upstream.
+        retry_after (float): Seconds until the circuit lets a trial call through.
+    """
+
+    def __init__(self, upstream: str, retry_after: float) -> None:
+        """Initialize the error for an upstream and its remaining cool-down."""
+        super().__init__(
+            f"Circuit for '{upstream}' is open; retry in {retry_after:.1f}s."
+        )
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+# Errors raised before a request reached the upstream, which therefore never
+# spent any of its quota: failed connects and name lookups, an exhausted
+# connection pool, or a circuit that refused the call.
+UNSENT_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    ConnectionRefusedError,
+    socket.gaierror,
+    CircuitOpenError,
+) + ((ServerNotFoundError,) if ServerNotFoundError is not None else ())
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """
+    Return the HTTP status code carried by an error, if any.
+
+    Understands httpx.HTTPStatusError, the Groq SDK's APIStatusError and
+    googleapiclient's HttpError.
+
+    Args:
+        error (BaseException): The error raised by an upstream call.
+
+    Returns:
+        Optional[int]: The status code, or None for errors without a response.
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status
+    # googleapiclient.errors.HttpError keeps an httplib2 response in `resp`.
+    status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _causes(error: BaseException) -> Iterator[BaseException]:
+    """Yield an error and the chain of errors it was raised from."""
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__ or current.__context__
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Decide whether a failed call is worth retrying.
+
+    Errors with a retryable status code and the TRANSIENT_ERRORS (timeouts,
+    connection and name lookup failures) are transient. The chain of causes is
+    followed, since SDKs wrap the underlying transport error in their own
+    exception types.
+
+    Args:
+        error (BaseException): The error raised by an upstream call.
+
+    Returns:
+        bool: True for transient failures.
+    """
+    for current in _causes(error):
+        status = status_code_of(current)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        if isinstance(current, TRANSIENT_ERRORS):
+            return True
+    return False
+
+
+def never_sent(error: BaseException) -> bool:
+    """Whether a call failed before its request reached the upstream."""
+    return any(isinstance(current, UNSENT_ERRORS) for current in _causes(error))
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Whether an upstream refused a call because of its rate limits (429)."""
+    return any(status_code_of(current) == 429 for current in _causes(error))
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """
+    Return the seconds an upstream asked to wait with a Retry-After header.
+
+    Understands the headers of httpx responses (also kept by the Groq SDK's
+    errors) and of googleapiclient's httplib2 responses, in seconds or as an
+    HTTP date.
+
+    Args:
+        error (BaseException): The error raised by an upstream call.
+
+    Returns:
+        Optional[float]: The delay, or None if no error in the chain carries one.
+    """
+    for current in _causes(error):
+        headers = getattr(getattr(current, "response", None), "headers", None)
+        if headers is None:
+            # httplib2 responses are dicts with lower-cased header names.
+            headers = getattr(current, "resp", None)
+        value = headers.get("retry-after") if hasattr(headers, "get") else None
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            continue
+        return max(0.0, retry_at.timestamp() - time.time())
+    return None
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker for one upstream.
+
+    The circuit is "closed" while calls succeed. `failure_threshold`
+    consecutive failures open it; calls are then refused until `reset_timeout`
+    seconds have passed. The circuit is then "half_open": one trial call is let
+    through, and its outcome closes the circuit or opens it for another period.
+
+    Attributes:
+        name (str): The upstream the breaker protects.
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize a closed circuit."""
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """The current state: "closed", "open" or "half_open"."""
+        with self._lock:
+            if self._state == self.OPEN and self._cool_down_over():
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently refused, without claiming a trial call."""
+        with self._lock:
+            if self._state == self.OPEN:
+                return not self._cool_down_over()
+            return self._state == self.HALF_OPEN and self._trial_in_flight
+
+    def retry_after(self) -> float:
+        """Return the seconds left until the circuit lets a trial call through."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        """
+        Ask whether a call may go ahead.
+
+        In the half-open state only the first caller is allowed, as the trial;
+        it must report its outcome with `record_success` or `record_failure`,
+        or give it up with `abandon`.
+
+        Returns:
+            bool: True if the call may be made.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if not self._cool_down_over():
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        """Record a call the upstream answered, closing the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """Record a transient failure, opening the circuit past the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = self._clock()
+                self._transition(self.OPEN)
+
+    def abandon(self) -> None:
+        """Give up a call without an outcome (e.g. it was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def reset(self) -> None:
+        """Close the circuit and forget past failures."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def _cool_down_over(self) -> bool:
+        """Whether an open circuit has waited long enough for a trial call."""
+        return self._clock() - self._opened_at >= self.reset_timeout
+
+    def _transition(self, state: str) -> None:
+        """Move to a new state; the caller holds the lock."""
+        self._state = state
+        if state == self.OPEN:
+            logger.warning(
+                f"Circuit for '{self.name}' opened after {self._failures} failures; "
+                f"refusing calls for {self.reset_timeout:.0f}s."
+            )
+        else:
+            logger.info(f"Circuit for '{self.name}' is now {state}.")
+        if metrics_enabled():
+            get_registry().increment(
+                "agent_circuit_transitions_total", upstream=self.name, state=state
+            )
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool that runs hedged synchronous attempts."""
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=32, thread_name_prefix="hedge"
+            )
+        return _hedge_executor
+
+
+class UpstreamPolicy:
+    """
+    Retries, hedging and a circuit breaker for calls to one upstream.
+
+    Attributes:
+        name (str): The upstream, e.g. "serper".
+        timeout (float): The request timeout handlers should use, in seconds.
+        max_attempts (int): Attempts per call, including the first.
+        backoff_base (float): The backoff cap before the first retry, in seconds.
+        backoff_max (float): The upper bound of any single backoff.
+        hedge (bool): Whether slow attempts are hedged with a duplicate request.
+        hedge_quantile (float): The latency quantile after which to hedge.
+        hedge_min_samples (int): Observed calls needed before hedging starts.
+        breaker (CircuitBreaker): The upstream's circuit breaker.
+        rate_limiter (Optional[RateLimiter]): Paces the attempts; None means no limit.
+        quota (Optional[RateLimiter]): The budget in the upstream's units that
+            attempts are charged their cost against; None means no limit.
+        latency (Histogram): Latency of successful attempts, used for hedging.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 10.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+        rng: Optional[random.Random] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        quota: Optional[RateLimiter] = None,
+    ) -> None:
+        """Initialize the policy of an upstream."""
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker(name)
+        self.rate_limiter = rate_limiter
+        self.quota = quota
+        self.latency = Histogram()
+        self._random = rng or random.Random()
+        self._resume_at = 0.0
+        self._resume_lock = threading.Lock()
+
+    def set_rate_limit(
+        self, rate: Optional[float], burst: Optional[float] = None
+    ) -> None:
+        """
+        Pace the upstream at a number of requests per second.
+
+        Args:
+            rate (Optional[float]): Requests per second. None removes the limit.
+            burst (Optional[float]): Requests that can be sent at once.
+        """
+        self.rate_limiter = (
+            RateLimiter(self.name, rate, burst) if rate is not None else None
+        )
+
+    def set_quota(self, units: Optional[float], period: float = 60.0) -> None:
+        """
+        Budget the upstream's units, e.g. YouTube units per day.
+
+        Args:
+            units (Optional[float]): Units that may be spent per period. None
+                removes the quota.
+            period (float): The period in seconds over which the units refill.
+        """
+        self.quota = (
+            RateLimiter(f"{self.name}.quota", units / period, burst=units)
+            if units is not None
+            else None
+        )
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back every call to the upstream for a while, e.g. after a 429.
+
+        Args:
+            seconds (float): How long to wait before the next attempt.
+        """
+        with self._resume_lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def paused_for(self) -> float:
+        """Return the seconds left before the upstream may be called again."""
+        return max(0.0, self._resume_at - time.monotonic())
+
+    def _pause_left(self, deadline: Optional[Deadline]) -> float:
+        """Return the seconds an attempt must wait out a pause, if it can in time."""
+        pause = self.paused_for()
+        if pause and deadline is not None and pause > deadline.remaining():
+            raise DeadlineExceeded(
+                f"Deadline exceeded waiting for '{self.name}' to stop throttling."
+            )
+        return pause
+
+    def _acquire(self, cost: float) -> None:
+        """Take a request token and the call's cost from the quota, or wait for them."""
+        if self.quota is not None and cost:
+            self.quota.acquire(cost)
+        if self.rate_limiter is not None:
+            try:
+                self.rate_limiter.acquire()
+            except DeadlineExceeded:
+                if self.quota is not None and cost:
+                    self.quota.release(cost)
+                raise
+
+    async def _acquire_async(self, cost: float) -> None:
+        """Take a request token and the call's cost without blocking the loop."""
+        if self.quota is not None and cost:
+            await self.quota.acquire_async(cost)
+        if self.rate_limiter is not None:
+            try:
+                await self.rate_limiter.acquire_async()
+            except (DeadlineExceeded, asyncio.CancelledError):
+                if self.quota is not None and cost:
+                    self.quota.release(cost)
+                raise
+
+    def _refund_unsent(self, error: Exception, cost: float) -> None:
+        """Give back what an attempt was charged if its request was never sent."""
+        if not never_sent(error):
+            return
+        if self.quota is not None and cost:
+            self.quota.release(cost)
+        if self.rate_limiter is not None:
+            self.rate_limiter.release(1)
+
+    def _can_hedge(self, cost: float) -> bool:
+        """Whether the limits leave room for a duplicate request right now."""
+        if self.paused_for():
+            return False
+        if self.quota is not None and cost and not self.quota.try_acquire(cost):
+            return False
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+            if self.quota is not None and cost:
+                self.quota.release(cost)
+            return False
+        return True
+
+    def settle_cost(self, estimated: float, actual: float) -> None:
+        """
+        Correct the quota once a call reports what it really cost.
+
+        Args:
+            estimated (float): The cost the call was charged.
+            actual (float): The cost the upstream reported.
+        """
+        if self.quota is not None and actual != estimated:
+            self.quota.release(estimated - actual)
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Report how much of the upstream's budgets is in use.
+
+        Returns:
+            Dict[str, Any]: The circuit state, the seconds left in a pause
+            requested by the upstream, and the usage of the request rate limit
+            and of the quota (see `RateLimiter.usage`), None when unlimited.
+        """
+        return {
+            "circuit": self.breaker.state,
+            "paused_for": round(self.paused_for(), 3),
+            "requests": self.rate_limiter.usage() if self.rate_limiter else None,
+            "quota": self.quota.usage() if self.quota else None,
+        }
+
+    def backoff(self, retry: int) -> float:
+        """
+        Return the delay before a retry, using "full jitter".
+
+        Args:
+            retry (int): The 0-based number of the retry.
+
+        Returns:
+            float: A delay drawn uniformly between 0 and the capped exponential bound.
+        """
+        bound = min(self.backoff_max, self.backoff_base * (2**retry))
+        return self._random.uniform(0, bound)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Return how long to wait before hedging an attempt.
+
+        Returns:
+            Optional[float]: The observed latency quantile, or None if hedging is
+            off or too few calls have been observed to estimate it.
+        """
+        if not self.hedge or self.latency.snapshot()["count"] < self.hedge_min_samples:
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    def attempt_timeout(self, timeout: Optional[float] = None) -> float:
+        """
+        Return the timeout for one request, clipped to the active deadline.
+
+        Args:
+            timeout (Optional[float]): A caller's timeout. Defaults to the policy's.
+
+        Returns:
+            float: The seconds the request may take.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = current_deadline()
+        return deadline.timeout(timeout) if deadline is not None else timeout
+
+    def _check_circuit(self) -> None:
+        """Raise CircuitOpenError if the circuit refuses the call."""
+        if not self.breaker.allow():
+            if metrics_enabled():
+                get_registry().increment(
+                    "agent_upstream_rejected_total", upstream=self.name
+                )
+            raise CircuitOpenError(self.name, self.breaker.retry_after())
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """Record a failed attempt and decide whether to try again."""
+        if not is_retryable(error):
+            # The request itself was at fault, which says nothing either way
+            # about the upstream's health.
+            self.breaker.abandon()
+            return False
+        if is_throttled(error):
+            # The upstream is healthy, only busy; the pause takes care of it.
+            self.breaker.record_success()
+            if metrics_enabled():
+                get_registry().increment(
+                    "agent_upstream_throttled_total", upstream=self.name
+                )
+        else:
+            self.breaker.record_failure()
+        if attempt + 1 >= self.max_attempts or not self.breaker.allow():
+            return False
+        logger.warning(
+            f"Attempt {attempt + 1}/{self.max_attempts} to '{self.name}' failed: "
+            f"{error}. Retrying."
+        )
+        if metrics_enabled():
+            get_registry().increment("agent_upstream_retries_total", upstream=self.name)
+        return True
+
+    def _retry_delay(
+        self, error: Exception, attempt: int, deadline: Optional[Deadline]
+    ) -> float:
+        """Handle a failed attempt: return the backoff before the next one, or raise."""
+        if deadline is not None and deadline.remaining() < _DEADLINE_SLACK:
+            # The attempt ran out of the request's budget, which says nothing
+            # about the upstream's health.
+            self.breaker.abandon()
+            raise DeadlineExceeded(
+                f"Deadline exceeded while calling '{self.name}'."
+            ) from error
+        retry_after = retry_after_of(error)
+        if retry_after is not None:
+            self.pause(retry_after)
+        if not self._should_retry(error, attempt):
+            raise error
+        delay = self.backoff(attempt)
+        wait = max(delay, self.paused_for())
+        if deadline is not None and wait >= deadline.remaining():
+            raise error
+        return delay
+
+    def _record_hedge(self) -> None:
+        """Count a hedged request."""
+        logger.debug(f"Hedging a slow request to '{self.name}'.")
+        if metrics_enabled():
+            get_registry().increment("agent_upstream_hedges_total", upstream=self.name)
+
+    def _hedged(self, call: Callable[[], T], cost: float) -> T:
+        """Run a call, racing a duplicate against it once it becomes slow."""
+        delay = self.hedge_delay()
+        if delay is None:
+            return call()
+        executor = _get_hedge_executor()
+        pending = {executor.submit(contextvars.copy_context().run, call)}
+        done, _ = wait(pending, timeout=delay)
+        if not done and self._can_hedge(cost):
+            self._record_hedge()
+            pending.add(executor.submit(contextvars.copy_context().run, call))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # A synchronous request cannot be cancelled; the loser
+                    # finishes in the background and is discarded.
+                    return future.result()
+                error = future.exception()
+        assert error is not None
+        raise error
+
+    async def _hedged_async(self, call: Callable[[], Awaitable[T]], cost: float) -> T:
+        """Await a call, racing a duplicate against it once it becomes slow."""
+        delay = self.hedge_delay()
+        if delay is None:
+            return await call()
+        pending = {asyncio.ensure_future(call())}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and self._can_hedge(cost):
+                self._record_hedge()
+                pending.add(asyncio.ensure_future(call()))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def call(self, fn: Callable[[], T], hedge: bool = True, cost: float = 1.0) -> T:
+        """
+        Call the upstream with retries, optional hedging and the circuit breaker.
+
+        Args:
+            fn (Callable[[], T]): Performs one attempt and raises on failure.
+            hedge (bool): Set to False for calls that must not be duplicated.
+            cost (float): The quota units one attempt spends.
+
+        Returns:
+            T: The result of the first successful attempt.
+
+        Raises:
+            CircuitOpenError: If the circuit is open.
+            DeadlineExceeded: If the active deadline passed.
+            Exception: The last error once retries are exhausted, or the first
+                error that is not transient.
+        """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check(f"calling '{self.name}'")
+        self._check_circuit()
+        attempt = 0
+        while True:
+            time.sleep(self._pause_left(deadline))
+            self._acquire(cost)
+            started_at = time.perf_counter()
+            try:
+                result = self._hedged(fn, cost) if hedge else fn()
+            except Exception as e:
+                self._refund_unsent(e, cost)
+                time.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            self.latency.observe(time.perf_counter() - started_at)
+            self.breaker.record_success()
+            return result
+
+    async def call_async(
+        self, fn: Callable[[], Awaitable[T]], hedge: bool = True, cost: float = 1.0
+    ) -> T:
+        """
+        Await the upstream with retries, optional hedging and the circuit breaker.
+
+        Args:
+            fn (Callable[[], Awaitable[T]]): Starts one attempt and raises on failure.
+            hedge (bool): Set to False for calls that must not be duplicated.
+            cost (float): The quota units one attempt spends.
+
+        Returns:
+            T: The result of the first successful attempt.
+
+        Raises:
+            CircuitOpenError: If the circuit is open.
+            DeadlineExceeded: If the active deadline passed; a running attempt
+                is cancelled.
+            Exception: The last error once retries are exhausted, or the first
+                error that is not transient.
+        """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check(f"calling '{self.name}'")
+        self._check_circuit()
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._pause_left(deadline))
+            await self._acquire_async(cost)
+            started_at = time.perf_counter()
+            try:
+                pending = self._hedged_async(fn, cost) if hedge else fn()
+                if deadline is not None:
+                    pending = asyncio.wait_for(pending, deadline.remaining())
+                result = await pending
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                self._refund_unsent(e, cost)
+                await asyncio.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            self.latency.observe(time.perf_counter() - started_at)
+            self.breaker.record_success()
+            return result
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a number from the environment, falling back to a default."""
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}: {os.getenv(name)!r}")
+        return default
+
+
+def build_policy(name: str) -> UpstreamPolicy:
+    """
+    Build the policy of an upstream from environment variables.
+
+    The variables are prefixed with the upstream's name in upper case (see the
+    module docstring).
+
+    Args:
+        name (str): The upstream, e.g. "serper".
+
+    Returns:
+        UpstreamPolicy: The configured policy.
+    """
+    prefix = name.upper()
+    rate = os.getenv(f"{prefix}_RATE_LIMIT")
+    burst = os.getenv(f"{prefix}_RATE_BURST")
+    quota = os.getenv(f"{prefix}_QUOTA")
+    policy = UpstreamPolicy(
+        name=name,
+        timeout=_env_float(f"{prefix}_TIMEOUT", 10.0),
+        max_attempts=int(_env_float(f"{prefix}_MAX_ATTEMPTS", 3)),
+        backoff_base=_env_float(f"{prefix}_BACKOFF_BASE", 0.2),
+        backoff_max=_env_float(f"{prefix}_BACKOFF_MAX", 2.0),
+        hedge=os.getenv(f"{prefix}_HEDGE", "").lower() in ("1", "true", "yes"),
+        breaker=CircuitBreaker(
+            name,
+            failure_threshold=int(_env_float(f"{prefix}_BREAKER_THRESHOLD", 5)),
+            reset_timeout=_env_float(f"{prefix}_BREAKER_RESET", 30.0),
+        ),
+        rate_limiter=(
+            RateLimiter(name, float(rate), float(burst) if burst else None)
+            if rate
+            else None
+        ),
+    )
+    if quota:
+        policy.set_quota(float(quota), _env_float(f"{prefix}_QUOTA_PERIOD", 60.0))
+    return policy
+
+
+_policies: Dict[str, UpstreamPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(name: str) -> UpstreamPolicy:
+    """
+    Return the process-wide policy of an upstream, building it on first use.
+
+    Args:
+        name (str): The upstream, e.g. "serper", "groq" or "youtube".
+
+    Returns:
+        UpstreamPolicy: The shared policy.
+    """
+    with _policies_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            policy = _policies[name] = build_policy(name)
+        return policy
+
+
+def reset_policies() -> None:
+    """Forget every policy, e.g. after changing their environment variables."""
+    with _policies_lock:
+        _policies.clear()
@@ -0,0 +1,195 @@
+"""
+Module for coalescing identical calls that are in flight at the same time.
+
+When several sessions ask the same question at once, each would otherwise run
+its own web search, YouTube search, transcript fetches and completion. A
+single-flight group runs the first call for a key (the leader) and makes every
+call for the same key that arrives while it is running (a follower) wait for
+and share its outcome: the result, or the exception it raised.
+
+Nothing is remembered once the leader finishes; the next call for the key runs
+again. Caching finished results is left to `utils.cache`. Shared results are
+handed to every caller, so callers must treat them as read-only.
+
+`SingleFlight` coalesces blocking calls made from several threads and
+`AsyncSingleFlight` coalesces coroutines running on an event loop.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from utils.deadline import DeadlineExceeded, remaining_time
+from utils.metrics import get_registry, metrics_enabled
+
+T = TypeVar("T")
+
+
+def _record_coalesced(group: str) -> None:
+    """Count a call that shared another call's outcome."""
+    if metrics_enabled():
+        get_registry().increment("agent_coalesced_calls_total", group=group)
+
+
+class _Call:
+    """The outcome of a blocking leader call, once `done` is set."""
+
+    def __init__(self) -> None:
+        """Initialize a call that has not finished."""
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent blocking calls with the same key.
+
+    Attributes:
+        name (str): The group name, used as the metrics label.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize an empty group."""
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Run `fn`, or wait for the call already running for the same key.
+
+        A follower waits at most until the active deadline.
+
+        Args:
+            key (Hashable): Identifies calls that are interchangeable.
+            fn (Callable[[], T]): The call to run if none is in flight.
+
+        Returns:
+            Tuple[T, bool]: The result, and whether it was shared by another call.
+
+        Raises:
+            DeadlineExceeded: If a follower's deadline passes while it waits.
+            Exception: Whatever the leader's call raised.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            joined = call is not None
+            if not joined:
+                call = self._calls[key] = _Call()
+
+        if joined:
+            _record_coalesced(self.name)
+            if not call.done.wait(timeout=remaining_time()):
+                raise DeadlineExceeded(
+                    f"Deadline exceeded waiting for a shared '{self.name}' call."
+                )
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """Return the number of keys with a running call."""
+        with self._lock:
+            return len(self._calls)
+
+
+class _Flight:
+    """A leader task and the number of callers awaiting it."""
+
+    def __init__(self, task: "asyncio.Task[Any]") -> None:
+        """Track a task with no callers yet."""
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent coroutines with the same key.
+
+    The leader's coroutine runs as its own task, created in the leader's context
+    (so it follows the leader's trace and deadline). Callers await it shielded:
+    a caller that is cancelled stops waiting without affecting the others, and
+    the task is only cancelled once nobody is waiting for it any more.
+
+    Attributes:
+        name (str): The group name, used as the metrics label.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize an empty group."""
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        """Drop a flight, unless a newer one has taken its key."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _abandon(self, key: Hashable, flight: _Flight) -> None:
+        """Cancel a flight that its last remaining caller stopped waiting for."""
+        if flight.waiters == 1 and not flight.task.done():
+            # Nobody else wants the result; new callers start afresh.
+            self._forget(key, flight)
+            flight.task.cancel()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Await `fn()`, or the call already running for the same key.
+
+        A follower waits at most until the active deadline.
+
+        Args:
+            key (Hashable): Identifies calls that are interchangeable.
+            fn (Callable[[], Awaitable[T]]): Starts the call if none is in flight.
+
+        Returns:
+            Tuple[T, bool]: The result, and whether it was shared by another call.
+
+        Raises:
+            DeadlineExceeded: If a follower's deadline passes while it waits.
+            Exception: Whatever the leader's call raised.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self._flights.get(key)
+        joined = flight is not None and flight.task.get_loop() is loop
+        if joined:
+            _record_coalesced(self.name)
+        else:
+            flight = self._flights[key] = _Flight(loop.create_task(fn()))
+            flight.task.add_done_callback(
+                lambda _, key=key, flight=flight: self._forget(key, flight)
+            )
+
+        flight.waiters += 1
+        try:
+            if joined:
+                # Unlike awaiting the task, waiting on it never cancels it.
+                done, _ = await asyncio.wait({flight.task}, timeout=remaining_time())
+                if not done:
+                    self._abandon(key, flight)
+                    raise DeadlineExceeded(
+                        f"Deadline exceeded waiting for a shared '{self.name}' call."
+                    )
+                return flight.task.result(), True
+            return await asyncio.shield(flight.task), False
+        except asyncio.CancelledError:
+            self._abandon(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def in_flight(self) -> int:
+        """Return the number of keys with a running call."""
+        return len(self._flights)